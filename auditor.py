@@ -0,0 +1,182 @@
+"""Economic invariants, checked with set-based SQL.
+
+Each check is a single query that returns the offending rows. ``audit`` runs them all
+inside one read transaction, so every check sees the same snapshot and a command
+committing halfway through cannot produce a false report. ``repair`` fixes everything
+in one write transaction. The repairs re-select their targets instead of trusting an
+earlier report. Checks with no repair, such as closed ownership cycles, need an
+admin to untangle them.
+"""
+
+# Whether a 'user:<id>' or 'company:<id>' ledger account still exists
+ACCOUNT_EXISTS = """CASE WHEN {0} LIKE 'user:%'
+    THEN EXISTS (SELECT 1 FROM users u WHERE u.user_id = CAST(substr({0}, 6) AS INTEGER))
+    ELSE EXISTS (SELECT 1 FROM companies c WHERE c.company_id = CAST(substr({0}, 9) AS INTEGER)) END"""
+
+# Shares of each company held, counting the ones escrowed by open asks
+HELD_SQL = """SELECT company_id, SUM(shares) AS held FROM (
+        SELECT company_id, shares FROM holdings
+        UNION ALL
+        SELECT company_id, shares FROM share_orders WHERE status = 'open' AND side = 'ask'
+    ) GROUP BY company_id"""
+
+# Members of closed ownership cycles: strongly connected groups of companies whose
+# shares are all held inside the group. valuation.py values them without their stakes
+# in one another, since the cross-holdings have no finite value.
+CLOSED_CYCLES_SQL = """
+WITH RECURSIVE edges(holder, held, shares) AS (
+    SELECT h.holder_id, h.company_id, h.shares
+    FROM holdings h
+    JOIN companies c ON c.company_id = h.holder_id
+    WHERE h.shares > 0
+),
+reach(source, target) AS (
+    SELECT holder, held FROM edges
+    UNION
+    SELECT r.source, e.held FROM reach r JOIN edges e ON e.holder = r.target
+),
+member(company_id, cycle) AS (
+    SELECT r.source, MIN(r.target)
+    FROM reach r
+    JOIN reach back ON back.source = r.target AND back.target = r.source
+    GROUP BY r.source
+),
+held_inside(company_id, cycle, shares) AS (
+    SELECT m.company_id, m.cycle, COALESCE(SUM(e.shares), 0)
+    FROM member m
+    LEFT JOIN edges e ON e.held = m.company_id
+        AND e.holder IN (SELECT company_id FROM member WHERE cycle = m.cycle)
+    GROUP BY m.company_id
+),
+closed(cycle) AS (
+    SELECT hi.cycle
+    FROM held_inside hi
+    JOIN companies c ON c.company_id = hi.company_id
+    GROUP BY hi.cycle
+    HAVING MIN(c.total_shares > 0 AND hi.shares >= c.total_shares)
+)
+SELECT hi.cycle, c.company_id, c.name
+FROM held_inside hi
+JOIN companies c ON c.company_id = hi.company_id
+WHERE hi.cycle IN (SELECT cycle FROM closed)
+ORDER BY hi.cycle, c.company_id
+"""
+
+# name -> (description, query returning the violating rows)
+CHECKS = {
+    "empty_holdings": (
+        "Holdings with no shares, or held by a user or company that no longer exists",
+        """
+        SELECT h.holder_id, h.company_id, h.shares
+        FROM holdings h
+        WHERE h.shares <= 0
+           OR (NOT EXISTS (SELECT 1 FROM users u WHERE u.user_id = h.holder_id)
+               AND NOT EXISTS (SELECT 1 FROM companies c WHERE c.company_id = h.holder_id))
+        """,
+    ),
+    "share_mismatch": (
+        "Shares held (or escrowed by open asks) differ from total_shares - shares_available",
+        f"""
+        SELECT c.company_id, c.name, c.total_shares - c.shares_available, COALESCE(h.held, 0)
+        FROM companies c
+        LEFT JOIN ({HELD_SQL}) h ON h.company_id = c.company_id
+        WHERE c.total_shares - c.shares_available != COALESCE(h.held, 0)
+        """,
+    ),
+    "negative_stockpiles": (
+        "Company or district stockpiles below zero",
+        """
+        SELECT 'company', comp_id, resource, stockpile FROM company_resources WHERE stockpile < 0
+        UNION ALL
+        SELECT 'district', district, resource, stockpile FROM resources WHERE stockpile < 0
+        """,
+    ),
+    "orphaned_resources": (
+        "Company stockpiles of companies that no longer exist",
+        """
+        SELECT cr.comp_id, cr.resource, cr.stockpile
+        FROM company_resources cr
+        WHERE NOT EXISTS (SELECT 1 FROM companies c WHERE c.company_id = cr.comp_id)
+        """,
+    ),
+    "orphaned_listings": (
+        "Market listings of companies that no longer exist",
+        """
+        SELECT nm.comp_id, nm.resource, nm.amount
+        FROM national_market nm
+        WHERE NOT EXISTS (SELECT 1 FROM companies c WHERE c.company_id = nm.comp_id)
+        """,
+    ),
+    "dangling_loans": (
+        "Open loans whose lender or borrower is gone",
+        f"""
+        SELECT l.loan_id, l.lender, l.borrower, l.balance
+        FROM loans l
+        WHERE l.status = 'open'
+          AND (NOT {ACCOUNT_EXISTS.format("l.lender")} OR NOT {ACCOUNT_EXISTS.format("l.borrower")})
+        """,
+    ),
+    "closed_cycles": (
+        "Companies whose shares are all held within a cycle of companies; valued without those stakes",
+        CLOSED_CYCLES_SQL,
+    ),
+}
+
+# Applied in order: holdings are cleaned before share counts are reconciled with them.
+# Holdings are the record of who owns what, so a company's share counts follow them.
+REPAIRS = [
+    ("empty_holdings", """
+        DELETE FROM holdings
+        WHERE shares <= 0
+           OR (NOT EXISTS (SELECT 1 FROM users u WHERE u.user_id = holdings.holder_id)
+               AND NOT EXISTS (SELECT 1 FROM companies c WHERE c.company_id = holdings.holder_id))
+    """),
+    ("share_mismatch", f"""
+        UPDATE companies
+        SET total_shares = MAX(total_shares, held.shares),
+            shares_available = MAX(total_shares, held.shares) - held.shares
+        FROM (SELECT c.company_id, COALESCE(h.held, 0) AS shares
+              FROM companies c
+              LEFT JOIN ({HELD_SQL}) h ON h.company_id = c.company_id) AS held
+        WHERE held.company_id = companies.company_id
+          AND companies.total_shares - companies.shares_available != held.shares
+    """),
+    ("negative_stockpiles", "UPDATE company_resources SET stockpile = 0 WHERE stockpile < 0"),
+    ("negative_stockpiles", "UPDATE resources SET stockpile = 0 WHERE stockpile < 0"),
+    ("orphaned_resources", """
+        DELETE FROM company_resources
+        WHERE NOT EXISTS (SELECT 1 FROM companies c WHERE c.company_id = company_resources.comp_id)
+    """),
+    ("orphaned_listings", """
+        DELETE FROM national_market
+        WHERE NOT EXISTS (SELECT 1 FROM companies c WHERE c.company_id = national_market.comp_id)
+    """),
+    ("dangling_loans", f"""
+        DELETE FROM loans
+        WHERE status = 'open'
+          AND (NOT {ACCOUNT_EXISTS.format("loans.lender")} OR NOT {ACCOUNT_EXISTS.format("loans.borrower")})
+    """),
+]
+
+
+def _run_checks(cur):
+    return {name: cur.execute(sql).fetchall() for name, (_, sql) in CHECKS.items()}
+
+
+def _apply_repairs(cur):
+    fixed = dict.fromkeys(CHECKS, 0)
+    for name, sql in REPAIRS:
+        fixed[name] += cur.execute(sql).rowcount
+    return fixed
+
+
+async def audit(db):
+    """Run every check against one snapshot; returns {check name: violating rows}, omitting clean checks."""
+    results = await db.snapshot(_run_checks)
+    return {name: rows for name, rows in results.items() if rows}
+
+
+async def repair(db):
+    """Fix every violation in one transaction; returns {check name: rows repaired}, omitting clean checks."""
+    fixed = await db.transaction(_apply_repairs)
+    return {name: count for name, count in fixed.items() if count}
@@ -1,15 +1,34 @@
 import asyncio
+import datetime
 import discord
-import sqlite3
 import os
 import random
 from discord.ext import commands
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from dotenv import load_dotenv
+from database import Database
+from migrations import migrate
+from query_plans import check_query_plans
+from valuation import refresh_valuations
+from leaderboard import LeaderboardCache
+from paginator import PageCache
+from directory import CompanyDirectory
+from auditor import CHECKS, audit, repair
+from treasury import Treasury
+from ledger import Ledger, company_account, nation_account
+from checkpoints import take_checkpoint
+from payouts import distribute_ubi as pay_ubi, resume_payouts
+from loans import run_loan_day
+from price_models import reprice, top_movers
+from price_history import prune as prune_ticks, record as record_prices, resource_series
+from share_orders import ShareBook
+from international import buy_tick
+from news import NewsPublisher
 
 # Load environment variables
 load_dotenv()
 TOKEN = os.getenv("DISCORD_BOT_TOKEN")
+PRICE_MODEL = os.getenv("PRICE_MODEL", "random_walk")  # A name from price_models.MODELS
 if not TOKEN:
     raise ValueError("Bot token is missing. Make sure DISCORD_BOT_TOKEN is set in the .env file.")
 
@@ -22,85 +41,99 @@ intents.message_content = True  # Ensures bot can read messages
 # Ensure database setup for users
 
 class MyBot(commands.Bot):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.db = Database("game.db")  # Shared by every cog
+        self.leaderboards = LeaderboardCache(self.db)
+        self.pages = PageCache(self.db)
+        self.directory = CompanyDirectory(self.db)
+        self.ledger = Ledger(self.db)
+        self.treasury = Treasury(self.db, self.ledger)
+        self.share_book = ShareBook(self.db, self.ledger, self.treasury)
+        self.news = NewsPublisher(self)
+
     async def setup_hook(self):
         """Ensure cogs load correctly."""
-        try:
-            await self.load_extension("economy")
-            await self.load_extension("politics")
-            await self.load_extension("companies")
-            await self.load_extension("resources")
-            await self.load_extension("news")
-            print("Cogs loaded successfully.")
-        except Exception as e:
-            print(f"Error loading cogs: {e}")
+        await self.db.configure()
+        await migrate(self.db)
+        await resume_payouts(self.db)
+        for name, scans in await check_query_plans(self.db):
+            print(f"⚠️ Hot query '{name}' is not using an index: {'; '.join(scans)}")
+        await refresh_valuations(self.db)
+        await self.directory.load()
+        await self.share_book.load()
+        for extension in ("economy", "politics", "companies", "resources", "news"):
+            # Each cog on its own, so one that fails to load cannot take the rest down with it
+            try:
+                await self.load_extension(extension)
+                print(f"Loaded cog {extension}.")
+            except Exception as e:
+                print(f"Error loading cog {extension}: {e}")
+
+    async def close(self):
+        await super().close()
+        await self.share_book.flush()  # Settling fills collects tax and posts entries, so it goes first
+        await self.treasury.flush()
+        await self.ledger.flush()
+        await self.db.close()
 
 bot = MyBot(command_prefix=".", intents=intents)
 bot.remove_command("help")  # Remove default help command
-# Database setup
-conn = sqlite3.connect("game.db")
-c = conn.cursor()
-
-def setup_database():
-    c.execute("""
-    CREATE TABLE IF NOT EXISTS users (
-        user_id INTEGER PRIMARY KEY,
-        balance REAL DEFAULT 0.0,
-        district TEXT,
-        party TEXT,
-        senator INTEGER DEFAULT 0,
-        chancellor INTEGER DEFAULT 0,
-        vote_senate INTEGER DEFAULT 0,
-        vote_chancellor INTEGER DEFAULT 0,
-        last_move TEXT
-    )
-    """)
-    c.execute("""
-    CREATE TABLE IF NOT EXISTS foreign_nations(
-        nation TEXT PRIMARY KEY,
-        balance REAL DEFAULT 0.0
-    )
-    """)
-    conn.commit()
-
-    nations = [
-        ("Switzerland", 20000.0),
-        ("France", 35000.0),
-        ("Germany", 30000.0),
-        ("Italy", 25000.0),
-        ("Spain", 20000.0)
-    ]
-    c.executemany("INSERT OR IGNORE INTO foreign_nations (nation, balance) VALUES (?, ?)", nations)
-    conn.commit()
-
-setup_database()
 # Initialize APScheduler
 scheduler = AsyncIOScheduler()
 
-async def distribute_ubi():
+async def refresh_company_valuations():
+    """Recompute the materialized valuations of companies changed since the last run."""
+    await refresh_valuations(bot.db)
+
+async def flush_treasury():
+    """Write the government revenue collected since the last flush."""
+    await bot.treasury.flush()
+
+async def settle_share_orders():
+    """Settle the share order fills matched since the last run."""
+    await bot.share_book.flush()
+
+async def flush_ledger():
+    """Write the ledger entries posted since the last flush."""
+    await bot.ledger.flush()
+
+async def checkpoint_balances():
+    """Checkpoint the balance of every ledger account that moved since the last checkpoint."""
+    await take_checkpoint(bot.db, bot.ledger)
+
+async def collect_loans():
+    """Accrue a day of interest on every open loan and collect the installments that are due."""
+    await run_loan_day(bot.db)
+
+async def prune_price_history():
+    """Drop raw price ticks past the retention window; candles are kept."""
+    removed = await prune_ticks(bot.db)
+    if removed:
+        print(f"🧹 Pruned {removed} old price ticks")
+
+async def audit_invariants():
+    """Log any economic invariant violations; an admin repairs them with `audit fix`."""
+    for name, rows in (await audit(bot.db)).items():
+        print(f"⚠️ Audit: {len(rows)} × {CHECKS[name][0]}")
+
+async def distribute_ubi(run_id=None):
     """Function to distribute Universal Basic Income (UBI) daily."""
-    c.execute("UPDATE users SET balance = balance + 500")
-    conn.commit()
+    await pay_ubi(bot.db, 500, run_id)
 
 async def update_prices():
     """track price changes over a 12 hour period and post news about the 5 biggest movers"""
-    c.execute("SELECT district, price_per_unit FROM resources")
-    rows = c.fetchall()
-    price_change = []
-    for district, price in rows:
-        fluctuation = random.uniform(-0.10, 0.15)  # Prices change by -10% to +15%
-        new_price = max(5, price * (1 + fluctuation))  # Ensure price never drops below $5
-        price_change.append((district, new_price - price))
-        c.execute("UPDATE resources SET price_per_unit = ? WHERE district = ?", (new_price, district))
-    conn.commit()
-    price_change.sort(key=lambda x: x[1], reverse=True)
+    districts, old, new = await reprice(bot.db, PRICE_MODEL)
+    await record_prices(bot.db, [(resource_series(district), price) for district, price in zip(districts, new.tolist())])
+    changes = new - old
     channel = bot.get_channel(1345074664850067527)
     embed = discord.Embed(
         title="📈 **Market News** 📉",
         description="Here are the top 5 biggest price movers for resources:",
         color=discord.Color.blue()
     )
-    for i in range(5):
-        district, change = price_change[i]
+    for i in top_movers(changes, 5):
+        district, change = districts[i], changes[i]
         if change > 0:
             embed.add_field(name=f"📈 **{district}**", value=f"Increased by ${change:.2f}", inline=False)
         else:
@@ -109,63 +142,33 @@ async def update_prices():
        
     
 async def random_international_buyers():
-    """Randomly selects a foreign nation to buy a resource from the national market."""
-    c.execute("SELECT nation FROM foreign_nations")
-    nations = c.fetchall()
-
-    for nation in nations:
-        if random.random() < 0.125:  # 12.5% chance
-            c.execute("SELECT comp_id, resource, amount, price_per_unit FROM national_market")
-            market_items = c.fetchall()
-            item = random.choice(market_items)
-            comp_id, resource, amount, price_per_unit = item
-            purchase_amount = random.randint(1, amount)
-            total_cost = purchase_amount * price_per_unit
-            
-            #takes the price of the good not listed on market and compares it to the market price if the market price is higher the nation will not buy the good
-            c.execute("SELECT price_per_unit FROM resources WHERE resource = ?", (resource,))
-            print('here')
-            base_price = c.fetchone()[0]
-            if price_per_unit > (4*base_price):
-                channel = bot.get_channel(1345074664850067527)
-                embed = discord.Embed(
-                    title="🌍 **International Trade** 🌍",
-                    description=f"{nation[0]} is horrified by the price of {resource} from {company[0]} as the price of ${price_per_unit:.2f} is too high compared to the market price of ${base_price:.2f}.",
-                    color=discord.Color.red()
-                )
-                await channel.send(embed=embed)
-                continue
-            
-
-            # Update the market
-            c.execute("UPDATE national_market SET amount = amount - ? WHERE comp_id = ? AND resource = ?", (purchase_amount, comp_id, resource))
-            c.execute("DELETE FROM national_market WHERE amount <= 0")
-
-            # Update the company's balance
-            c.execute("UPDATE companies SET balance = balance + ? WHERE company_id = ?", (total_cost, comp_id))
-
-            # Update the foreign nation's balance
-            c.execute("UPDATE foreign_nations SET balance = balance - ? WHERE nation = ?", (total_cost, nation[0]))
-
-            conn.commit()
-            c.execute("SELECT name FROM companies WHERE company_id = ?", (comp_id,))
-            company = c.fetchone()
-            
-            channel = bot.get_channel(1345074664850067527)
-            embed = discord.Embed(
+    """Lets each foreign nation maybe buy from the national market, settled as one batch."""
+    events = await buy_tick(bot.db)
+    embeds = []
+    for kind, nation, comp_id, company, resource, *details in events:
+        if kind == "refused":
+            price_per_unit, base_price = details
+            embeds.append(discord.Embed(
                 title="🌍 **International Trade** 🌍",
-                description=f"{nation[0]} has purchased {purchase_amount} units of {resource} from {company[0]} for ${total_cost:.2f}.",
-                color=discord.Color.green()
-            )
-            await channel.send(embed=embed)
+                description=f"{nation} is horrified by the price of {resource} from {company} as the price of ${price_per_unit:.2f} is too high compared to the market price of ${base_price:.2f}.",
+                color=discord.Color.red()
+            ))
+            continue
+        purchase_amount, total_cost = details
+        bot.ledger.post(company_account(comp_id), nation_account(nation), total_cost, "international purchase", "random_international_buyers")
+        embeds.append(discord.Embed(
+            title="🌍 **International Trade** 🌍",
+            description=f"{nation} has purchased {purchase_amount} units of {resource} from {company} for ${total_cost:.2f}.",
+            color=discord.Color.green()
+        ))
+    if embeds:
+        await bot.news.publish(embeds)
 
 
 async def international_add_resouce():
     """A foregin company can randomly add resources to the national market with a 40% chance to undercut current prices and 60% to post at an average costs."""
-    c.execute("SELECT nation FROM foreign_nations")
-    nations = c.fetchall()
-    c.execute("SELECT comp_id, resource, amount, price_per_unit FROM national_market")
-    market_items = c.fetchall()
+    nations = await bot.db.fetchall("SELECT nation FROM foreign_nations")
+    market_items = await bot.db.fetchall("SELECT comp_id, resource, amount, price_per_unit FROM national_market")
 
     if not market_items:
         return  # No items in the market
@@ -175,16 +178,14 @@ async def international_add_resouce():
             item = random.choice(market_items)
             comp_id, resource, amount, price_per_unit = item
             list_amount = random.randint(1, 25)
-            c.execute("SELECT AVG(price_per_unit) FROM national_market WHERE resource = ?", (resource,))
-            average_price = c.fetchone()[0]
+            average_price = (await bot.db.fetchone("SELECT AVG(price_per_unit) FROM national_market WHERE resource = ?", (resource,)))[0]
             if random.random() < 0.40:  # 40% chance to undercut
                 new_price = average_price * (2 / 3)  # Undercut by 1/3rd
             else:
                 new_price = average_price  # Post at average cost
 
-            c.execute("INSERT INTO national_market (comp_id, resource, amount, price_per_unit) VALUES (?, ?, ?, ?)",
-                      (comp_id, resource, list_amount, new_price))
-            conn.commit()
+            await bot.db.execute("INSERT INTO national_market (comp_id, resource, amount, price_per_unit, listed_at) VALUES (?, ?, ?, ?, ?)",
+                                 (comp_id, resource, list_amount, new_price, datetime.datetime.now(datetime.timezone.utc).isoformat()))
 
             channel = bot.get_channel(1345074664850067527)
             embed = discord.Embed(
@@ -201,20 +202,44 @@ async def clear(ctx):
     await ctx.channel.purge()
 
 
+@bot.command(name="audit")
+@commands.has_permissions(administrator=True)
+async def audit_economy(ctx, action: str = None):
+    """Checks the economy's invariants. `audit fix` repairs every violation in one batch."""
+    if action == "fix":
+        fixed = await repair(bot.db)
+        if not fixed:
+            await ctx.send("✅ Nothing to repair.")
+            return
+        embed = discord.Embed(title="🛠️ Economy Repaired", color=discord.Color.green())
+        for name, count in fixed.items():
+            embed.add_field(name=CHECKS[name][0], value=f"{count} rows repaired", inline=False)
+        await ctx.send(embed=embed)
+        return
+
+    violations = await audit(bot.db)
+    if not violations:
+        await ctx.send("✅ Every economic invariant holds.")
+        return
+    embed = discord.Embed(title="⚠️ Economic Invariant Violations", description="Run `audit fix` to repair them.", color=discord.Color.red())
+    for name, rows in violations.items():
+        sample = "\n".join(str(tuple(row)) for row in rows[:5])
+        embed.add_field(name=f"{CHECKS[name][0]} ({len(rows)})", value=f"```{sample}```", inline=False)
+    await ctx.send(embed=embed)
+
+
 @bot.command()
 @commands.has_permissions(administrator=True)
-async def clean_ownership(ctx):
-    """Removes any company in the ownership table that no longer exists."""
-    c.execute("SELECT name FROM companies")
-    companies = c.fetchall()
-    c.execute("SELECT company_name FROM ownership")
-    ownership = c.fetchall()
-    print("here")
-    for company in ownership:
-        if (company[0],) not in companies:
-            c.execute("DELETE FROM ownership WHERE company_name = ?", (company[0],))
-            conn.commit()
-    await ctx.send("Ownership table cleaned.")
+async def query_plans(ctx):
+    """Checks that every hot query is still served by an index."""
+    regressions = await check_query_plans(bot.db)
+    if not regressions:
+        await ctx.send("✅ Every hot query uses an index.")
+        return
+    embed = discord.Embed(title="⚠️ Query Plan Regressions", color=discord.Color.red())
+    for name, scans in regressions:
+        embed.add_field(name=name, value="\n".join(scans), inline=False)
+    await ctx.send(embed=embed)
     
 
 @bot.command()
@@ -259,8 +284,8 @@ async def help(ctx, menu: str = None):
             value=(
                 "`join [District]` → Join a district.\n"
                 "`propose_bill [Name] [Desc] [Link]` → Senator-only: Propose a law.\n"
-                "`bills` → View all proposed bills.\n"
-                "`laws` → See all passed laws.\n"
+                "`bills [Page number]` → View all proposed bills.\n"
+                "`laws [Page number]` → See all passed laws.\n"
                 "`start_election` → Admin-only: Start elections.\n"
                 "`set_tax [Corporate Rate] [Trade Rate]` → Chancellor-only: Set tax rates.\n"
                 "`mp [Party Name]` → Create a new political party.\n"
@@ -378,7 +403,7 @@ async def help(ctx, menu: str = None):
 @commands.has_permissions(administrator=True)
 async def force_ubi(ctx):
     """Manually triggers the UBI distribution."""
-    await distribute_ubi()
+    await distribute_ubi(f"ubi-manual-{datetime.datetime.now(datetime.timezone.utc).isoformat()}")
     await update_prices()
     await ctx.send("Universal Basic Income distributed.")
 
@@ -398,6 +423,14 @@ async def on_ready():
         scheduler.add_job(random_international_buyers, "cron", hour=11, minute=0)
         scheduler.add_job(random_international_buyers, "cron", hour=17, minute=0)
         scheduler.add_job(random_international_buyers, "cron", hour=23, minute=0)
+        scheduler.add_job(refresh_company_valuations, "interval", seconds=10)
+        scheduler.add_job(flush_treasury, "interval", seconds=5)
+        scheduler.add_job(flush_ledger, "interval", seconds=5)
+        scheduler.add_job(settle_share_orders, "interval", seconds=2)
+        scheduler.add_job(audit_invariants, "interval", hours=1)
+        scheduler.add_job(checkpoint_balances, "interval", hours=1)
+        scheduler.add_job(collect_loans, "cron", hour=0, minute=10)
+        scheduler.add_job(prune_price_history, "cron", hour=0, minute=20)
         scheduler.start()
 
 # Test Ping Command
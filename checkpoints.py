@@ -0,0 +1,91 @@
+"""Point-in-time account balances over the ledger.
+
+``take_checkpoint`` records, for every account that moved since the previous
+checkpoint, its balance as of that moment. A balance at time ``at`` is then the
+account's latest checkpoint at or before ``at``, plus the ledger entries between that
+checkpoint and ``at``. The (account, posted_at) indexes serve both reads, so the cost
+depends on the activity since the checkpoint, not on the length of the history.
+"""
+import datetime
+
+CHECKPOINT_SQL = """
+INSERT INTO balance_checkpoints (account, taken_at, balance)
+SELECT moves.account, :taken_at,
+       COALESCE((SELECT b.balance FROM balance_checkpoints b
+                 WHERE b.account = moves.account ORDER BY b.taken_at DESC LIMIT 1), 0)
+       + SUM(moves.delta)
+FROM (
+    SELECT debit AS account, amount AS delta FROM ledger WHERE posted_at > :since AND posted_at <= :taken_at
+    UNION ALL
+    SELECT credit, -amount FROM ledger WHERE posted_at > :since AND posted_at <= :taken_at
+) moves
+GROUP BY moves.account
+"""
+
+LAST_CHECKPOINT_SQL = """
+SELECT taken_at, balance FROM balance_checkpoints
+WHERE account = ? AND taken_at <= ?
+ORDER BY taken_at DESC LIMIT 1
+"""
+
+TAIL_SQL = """
+SELECT COALESCE((SELECT SUM(amount) FROM ledger WHERE debit = :account AND posted_at > :since AND posted_at <= :at), 0)
+     - COALESCE((SELECT SUM(amount) FROM ledger WHERE credit = :account AND posted_at > :since AND posted_at <= :at), 0)
+"""
+
+DAILY_MOVES_SQL = """
+SELECT substr(posted_at, 1, 10), SUM(delta) FROM (
+    SELECT posted_at, amount AS delta FROM ledger WHERE debit = :account AND posted_at > :since AND posted_at <= :at
+    UNION ALL
+    SELECT posted_at, -amount FROM ledger WHERE credit = :account AND posted_at > :since AND posted_at <= :at
+) moves
+GROUP BY 1
+"""
+
+
+def _now():
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+def _checkpoint(cur, taken_at):
+    since = cur.execute("SELECT MAX(taken_at) FROM balance_checkpoints").fetchone()[0] or ""
+    return cur.execute(CHECKPOINT_SQL, {"taken_at": taken_at, "since": since}).rowcount
+
+
+async def take_checkpoint(db, ledger):
+    """Checkpoint every account that moved since the last checkpoint; returns how many were written."""
+    taken_at = _now().isoformat()
+    await ledger.flush()  # Every entry posted before taken_at is in the table before the checkpoint reads it
+    return await db.transaction(_checkpoint, taken_at)
+
+
+def _balance_at(cur, account, at):
+    row = cur.execute(LAST_CHECKPOINT_SQL, (account, at)).fetchone()
+    since, balance = row if row else ("", 0)
+    return balance + cur.execute(TAIL_SQL, {"account": account, "since": since, "at": at}).fetchone()[0]
+
+
+async def balance_at(db, account, at=None):
+    """Balance of a ledger account at a datetime (default: now), from one checkpoint and the entries after it."""
+    at = (at or _now()).isoformat()
+    return await db.snapshot(_balance_at, account, at)
+
+
+def _history(cur, account, start, end):
+    opening = _balance_at(cur, account, start)
+    moves = dict(cur.execute(DAILY_MOVES_SQL, {"account": account, "since": start, "at": end}).fetchall())
+    return opening, moves
+
+
+async def balance_history(db, account, days=30):
+    """[(date, closing balance)] for each of the last ``days`` days, oldest first, today last."""
+    end = _now()
+    first_day = end.date() - datetime.timedelta(days=days - 1)
+    start = datetime.datetime.combine(first_day, datetime.time.min, datetime.timezone.utc) - datetime.timedelta(microseconds=1)
+    balance, moves = await db.snapshot(_history, account, start.isoformat(), end.isoformat())
+    history = []
+    for offset in range(days):
+        day = (first_day + datetime.timedelta(days=offset)).isoformat()
+        balance += moves.get(day, 0)
+        history.append((day, balance))
+    return history
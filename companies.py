@@ -1,113 +1,93 @@
 import discord
-import sqlite3
 import json
 import asyncio
 from discord.ext import commands
 import matplotlib.pyplot as plt
 import io
+from ledger import MINT, company_account, user_account
+from pagination import COMPANIES
+from paginator import paginate
+from payouts import pay_dividend
+from pricing import buy_cost, sell_proceeds, share_price
+from share_orders import ASK, BID
+from valuation import company_values, materialized_values
 
 class Companies(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.conn = sqlite3.connect("game.db", check_same_thread=False)
-        self.c = self.conn.cursor()
-        self.setup_companies()
-
-    def setup_companies(self):
-        """Create required database tables if they don't exist."""
-        self.c.execute("""
-        CREATE TABLE IF NOT EXISTS companies (
-            company_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            owner_id INTEGER,
-            name TEXT UNIQUE,
-            balance REAL DEFAULT 0.0,
-            shares_available INTEGER DEFAULT 100,
-            total_shares INTEGER DEFAULT 100,
-            board_members TEXT DEFAULT '[]',
-            is_public INTEGER DEFAULT 0,
-            ticker TEXT UNIQUE
-        )
-        """)
-        self.c.execute("""
-        CREATE TABLE IF NOT EXISTS ownership (
-            owner_id INTEGER,
-            company_name TEXT,
-            shares INTEGER DEFAULT 0,
-            PRIMARY KEY (owner_id, company_name),
-            FOREIGN KEY (owner_id) REFERENCES users(user_id),
-            FOREIGN KEY (company_name) REFERENCES companies(name)
-        )
-        """)
-        self.conn.commit()
-
+        self.db = bot.db
+        self.directory = bot.directory
+        self.treasury = bot.treasury
+        self.ledger = bot.ledger
+        self.book = bot.share_book
+        self.pages = bot.pages
 
     @commands.command(aliases=["cc"])
     async def create_company(self, ctx, company_name: str):
         """Creates a new company for the user."""
         owner_id = ctx.author.id
         
-        self.c.execute("SELECT balance FROM users WHERE user_id = ?", (owner_id,))
-        user_balance = self.c.fetchone()
+        user_balance = await self.db.fetchone("SELECT balance FROM users WHERE user_id = ?", (owner_id,))
         
         if not user_balance or user_balance[0] < 1000:
             await ctx.send("⚠️ You need at least $1000 to create a company.")
             return
         
-        self.c.execute("SELECT name FROM companies WHERE owner_id = ?", (owner_id,))
-        existing_company = self.c.fetchone()
+        existing_company = await self.db.fetchone("SELECT name FROM companies WHERE owner_id = ?", (owner_id,))
         
         if existing_company:
             await ctx.send("⚠️ You already own a company.")
             return
         
-        self.c.execute("INSERT INTO companies (owner_id, name, balance) VALUES (?, ?, ?)", (owner_id, company_name, 1000))
-        self.c.execute("UPDATE users SET balance = balance - 1000 WHERE user_id = ?", (owner_id,))
-        self.c.execute("INSERT INTO ownership (owner_id, company_name, shares) VALUES (?, ?, ?)", (owner_id, company_name, 100))
-        self.conn.commit()
-        self.c.execute("UPDATE companies SET shares_available = shares_available - 100 WHERE name = ?", (company_name,))
-        self.conn.commit()
+        def create(cur):
+            company_id = cur.execute("INSERT INTO companies (owner_id, name, balance) VALUES (?, ?, ?)", (owner_id, company_name, 1000)).lastrowid
+            cur.execute("UPDATE users SET balance = balance - 1000 WHERE user_id = ?", (owner_id,))
+            cur.execute("INSERT INTO ownership (owner_id, company_name, shares) VALUES (?, ?, ?)", (owner_id, company_name, 100))
+            cur.execute("UPDATE companies SET shares_available = shares_available - 100 WHERE name = ?", (company_name,))
+            return company_id
+
+        company_id = await self.db.transaction(create)
+        self.directory.add(company_id, company_name, owner_id)
+        self.ledger.post(company_account(company_id), user_account(owner_id), 1000, "founding capital", ctx.command.name)
         
         await ctx.send(f"🏢 **{company_name}** has been created successfully with an initial balance of $1000!")
 
     @commands.command()
     async def companies(self, ctx, page: int=1):
         """Lists all registered companies and the total outstanding shares."""
-        self.c.execute("SELECT name, balance, shares_available, is_public, total_shares FROM companies")
-        companies = self.c.fetchall()
-
-        if not companies:
+        if not await paginate(ctx, self.pages, ("companies",), COMPANIES, self.companies_page, page):
             await ctx.send("📜 There are currently no registered companies.")
-            return
 
-        items_per_page = 5
-        offset = (page - 1) * items_per_page
+    async def companies_page(self, page, page_companies):
+        """Renders one page of the companies listing."""
+        offset = (page - 1) * COMPANIES.page_size
         emb = discord.Embed(title="📢 Registered Companies", color=discord.Color.blue())
+        # Companies created since the last valuation refresh have no NAV yet
+        values = await self.calc_stock_values([comp[0] for comp in page_companies if not comp[7]])
         
-        for i, comp in enumerate(companies[offset:offset + items_per_page], start=offset + 1):
-            self.c.execute("SELECT owner_id, ticker FROM companies WHERE name = ?", (comp[0],))
-            owner_id, ticker = self.c.fetchone()
+        for i, comp in enumerate(page_companies, start=offset + 1):
+            name, owner_id, ticker, floating_shares, is_public, total_shares, nav, version = comp
             owner = self.bot.get_user(owner_id)
             owner_name = owner.name if owner else f"User {owner_id}"
-            comp_val = await self.calc_stock_value(comp[0])
-            name = comp[0]
+            comp_val = nav if version else values[name]
             if ticker == None:
                 ticker = ""
             else: 
                 ticker = f": {ticker}"
-            if comp[3]:
+            if is_public:
                 # If the company is public
                 if comp_val > 0:
-                    price_per_share = comp_val / comp[4]
+                    price_per_share = comp_val / total_shares
                 else:
                     price_per_share = 0
                 emb.add_field(
-                    name=f"🏢 {comp[0]}{ticker}",
+                    name=f"🏢 {name}{ticker}",
                     value=(
                     f"👤 Owner: {owner_name}\n"
                     f"💰 Value: ${comp_val:,.2f}\n"
                     f"📈 Price per Share: ${price_per_share:.2f}\n"
-                    f"📊 Total Shares: {comp[4]}\n"
-                    f"📊 Floating Shares: {comp[2]}\n"
+                    f"📊 Total Shares: {total_shares}\n"
+                    f"📊 Floating Shares: {floating_shares}\n"
                     f"📈 Publicly Traded\n"
                     ),
                     inline=False
@@ -115,29 +95,25 @@ class Companies(commands.Cog):
             else:  
                 # If the company is private
                 emb.add_field(
-                    name=f"🏢 {comp[0]}{ticker}",
+                    name=f"🏢 {name}{ticker}",
                     value=(
                     f"👤 Owner: {owner_name}\n"
                     f"💰 Value: ${comp_val:,.2f}\n"
-                    f"📊 Privately Held Shares: {comp[4]}\n"
+                    f"📊 Privately Held Shares: {total_shares}\n"
                     f"🔒 Privately Owned\n"
                     ),
                     inline=False
                 )
-        await ctx.send(embed=emb)
+        emb.set_footer(text=f"Page {page}")
+        return emb
     
     @commands.command(aliases=["isp"])
     async def issue_private_shares(self, ctx, company_name: str, new_shares: int):
         """Issues new shares to a private company."""
-        self.c.execute("SELECT name FROM companies WHERE ticker = ?", (company_name,))
-        ticker_result = self.c.fetchone()
-        
-        if ticker_result:
-            company_name = ticker_result[0]
+        company_name = self.directory.resolve(company_name)
         sender_id = ctx.author.id      
         
-        self.c.execute("SELECT balance, total_shares, is_public FROM companies WHERE name = ? AND owner_id = ?", (company_name, sender_id))
-        company = self.c.fetchone()
+        company = await self.db.fetchone("SELECT balance, total_shares, is_public FROM companies WHERE name = ? AND owner_id = ?", (company_name, sender_id))
         
         if not company:
             await ctx.send("⚠️ You do not own this company or it does not exist.")
@@ -153,9 +129,11 @@ class Companies(commands.Cog):
             await ctx.send("⚠️ You must issue a positive amount of shares.")
             return
         
-        self.c.execute("UPDATE companies SET total_shares = total_shares + ? WHERE name = ?", (new_shares, company_name))
-        self.c.execute("UPDATE ownership SET shares = shares + ? WHERE owner_id = ? AND company_name = ?", (new_shares, sender_id, company_name))
-        self.conn.commit()
+        def issue(cur):
+            cur.execute("UPDATE companies SET total_shares = total_shares + ? WHERE name = ?", (new_shares, company_name))
+            cur.execute("UPDATE ownership SET shares = shares + ? WHERE owner_id = ? AND company_name = ?", (new_shares, sender_id, company_name))
+
+        await self.db.transaction(issue)
         
         embed = discord.Embed(title="📈 Shares Issued", color=discord.Color.blue())
         embed.add_field(name="Company", value=company_name, inline=False)
@@ -165,11 +143,7 @@ class Companies(commands.Cog):
     @commands.command(aliases=["ps"])
     async def private_sale(self, ctx, company: str, shares: int, price: float, user: discord.Member):
         """Proposes a private sale of shares of a company to another user."""
-        self.c.execute("SELECT name FROM companies WHERE ticker = ?", (company,))
-        ticker_result = self.c.fetchone()
-        
-        if ticker_result:
-            company = ticker_result[0]
+        company = self.directory.resolve(company)
         
         owner_id = ctx.author.id
         if shares <= 0:
@@ -180,21 +154,18 @@ class Companies(commands.Cog):
             await ctx.send("⚠️ You must sell shares for a positive price.")
             return
 
-        self.c.execute("SELECT name FROM companies WHERE owner_id = ? AND name = ?", (owner_id, company))
-        company_data = self.c.fetchone()
+        company_data = await self.db.fetchone("SELECT name FROM companies WHERE owner_id = ? AND name = ?", (owner_id, company))
         
         if not company_data:
             await ctx.send("⚠️ You do not own this company or it does not exist.")
             return
         
-        self.c.execute("SELECT shares FROM ownership WHERE owner_id = ? AND company_name = ?", (owner_id, company))
-        owner_shares = self.c.fetchone()
+        owner_shares = await self.db.fetchone("SELECT shares FROM ownership WHERE owner_id = ? AND company_name = ?", (owner_id, company))
         
         if not owner_shares or owner_shares[0] < shares:
             await ctx.send(f"⚠️ You do not own enough shares to sell {shares} shares.")
             return
-        self.c.execute("SELECT balance FROM users WHERE user_id = ?", (user.id,))
-        user_balance = self.c.fetchone()
+        user_balance = await self.db.fetchone("SELECT balance FROM users WHERE user_id = ?", (user.id,))
         
         total_price = shares * price
         if not user_balance or user_balance[0] < total_price:
@@ -227,18 +198,32 @@ class Companies(commands.Cog):
             await ctx.send(embed=embed)
             return
         
-        self.c.execute("SELECT capital_gains_rate FROM tax_rate")
-        capital_gains_rate = self.c.fetchone()[0]
+        capital_gains_rate = await self.treasury.rate("capital_gains_rate")
         tax = (total_price * capital_gains_rate)
         user_gain = total_price - tax
         
-        # Transfer shares and update balances
-        self.c.execute("UPDATE ownership SET shares = shares - ? WHERE owner_id = ? AND company_name = ?", (shares, owner_id, company))
-        self.c.execute("INSERT INTO ownership (owner_id, company_name, shares) VALUES (?, ?, ?) ON CONFLICT(owner_id, company_name) DO UPDATE SET shares = shares + ?", (user.id, company, shares, shares))
-        self.c.execute("UPDATE users SET balance = balance - ? WHERE user_id = ?", (total_price, user.id))
-        self.c.execute("UPDATE users SET balance = balance + ? WHERE user_id = ?", (user_gain, owner_id))
-        self.c.execute("UPDATE tax_rate SET government_balance = government_balance + ?", (tax,))
-        self.conn.commit()
+        company_id = self.directory.company_id(company)
+
+        # Transfer shares and update balances, checking both sides again now that the buyer has answered
+        def transfer_shares(cur):
+            held = cur.execute("SELECT shares FROM holdings WHERE holder_id = ? AND company_id = ?", (owner_id, company_id)).fetchone()
+            if not held or held[0] < shares:
+                return f"⚠️ You do not own enough shares to sell {shares} shares."
+            balance = cur.execute("SELECT balance FROM users WHERE user_id = ?", (user.id,)).fetchone()
+            if not balance or balance[0] < total_price:
+                return f"⚠️ {user.mention} does not have enough funds to purchase these shares."
+            cur.execute("UPDATE holdings SET shares = shares - ? WHERE holder_id = ? AND company_id = ?", (shares, owner_id, company_id))
+            cur.execute("INSERT INTO holdings (holder_id, company_id, shares) VALUES (?, ?, ?) ON CONFLICT(holder_id, company_id) DO UPDATE SET shares = shares + excluded.shares", (user.id, company_id, shares))
+            cur.execute("UPDATE users SET balance = balance - ? WHERE user_id = ?", (total_price, user.id))
+            cur.execute("UPDATE users SET balance = balance + ? WHERE user_id = ?", (user_gain, owner_id))
+            return None
+
+        problem = await self.db.transaction(transfer_shares)
+        if problem:
+            await ctx.send(problem)
+            return
+        self.ledger.post(user_account(owner_id), user_account(user.id), total_price, "private share sale", ctx.command.name)
+        self.treasury.collect(tax, user_account(owner_id), "capital gains tax", ctx.command.name)
         
         embed = discord.Embed(title="✅ Private Sale Accepted", color=discord.Color.green())
         embed.add_field(name="Buyer", value=user.mention, inline=True)
@@ -257,8 +242,8 @@ class Companies(commands.Cog):
     async def spawn_money(self, ctx, member: discord.Member, amount: int):
         """Spawns money to a user's balance."""
         user = member.id
-        self.c.execute("UPDATE users SET balance = balance + ? WHERE user_id = ?", (amount, user))
-        self.conn.commit()
+        await self.db.execute("UPDATE users SET balance = balance + ? WHERE user_id = ?", (amount, user))
+        self.ledger.post(user_account(user), MINT, amount, "spawned", ctx.command.name)
         
         await ctx.send(f"✅ {amount} has been spawned to user ID {user}.")
     
@@ -272,15 +257,11 @@ class Companies(commands.Cog):
             await ctx.send("⚠️ The ticker symbol must be a maximum of 4 letters.")
             return
         
-        self.c.execute("SELECT ticker FROM companies WHERE ticker = ?", (ticker,))
-        existing_ticker = self.c.fetchone()
-        
-        if existing_ticker:
+        if self.directory.has_ticker(ticker):
             await ctx.send("⚠️ This ticker symbol is already in use.")
             return
         
-        self.c.execute("SELECT is_public, shares_available, total_shares FROM companies WHERE name = ? AND owner_id = ?", (company_name, sender_id))
-        company = self.c.fetchone()
+        company = await self.db.fetchone("SELECT is_public, shares_available, total_shares FROM companies WHERE name = ? AND owner_id = ?", (company_name, sender_id))
         
         if not company:
             await ctx.send("⚠️ You do not own this company or it does not exist.")
@@ -293,10 +274,15 @@ class Companies(commands.Cog):
         shares_available = company[1]
         total_shares = company[2]
         
-        self.c.execute("UPDATE companies SET is_public = 1, shares_available = 0 WHERE name = ?", (company_name,))
-        self.c.execute("INSERT INTO ownership (owner_id, company_name, shares) VALUES (?, ?, ?) ON CONFLICT(owner_id, company_name) DO UPDATE SET shares = shares + ?", (sender_id, company_name, shares_available, shares_available))
-        self.c.execute("UPDATE companies SET ticker = ? WHERE name = ?", (ticker, company_name))
-        self.conn.commit()
+        company_id = self.directory.company_id(company_name)
+
+        def go_public(cur):
+            cur.execute("UPDATE companies SET is_public = 1, shares_available = 0 WHERE name = ?", (company_name,))
+            cur.execute("INSERT INTO holdings (holder_id, company_id, shares) VALUES (?, ?, ?) ON CONFLICT(holder_id, company_id) DO UPDATE SET shares = shares + excluded.shares", (sender_id, company_id, shares_available))
+            cur.execute("UPDATE companies SET ticker = ? WHERE name = ?", (ticker, company_name))
+
+        await self.db.transaction(go_public)
+        self.directory.set_ticker(company_name, ticker)
         
         embed = discord.Embed(title="📊 Company Publicly Listed", color=discord.Color.green())
         embed.add_field(name="Company", value=company_name, inline=False)
@@ -312,10 +298,7 @@ class Companies(commands.Cog):
         
         owner_id = ctx.author.id
         
-        self.c.execute("SELECT owner_id FROM companies WHERE name = ?", (company,))
-        company_owner = self.c.fetchone()
-        
-        if not company_owner or company_owner[0] != owner_id:
+        if company not in self.directory or self.directory.owner(company) != owner_id:
             await ctx.send("⚠️ You do not own this company.")
             return
         
@@ -323,15 +306,12 @@ class Companies(commands.Cog):
             await ctx.send("⚠️ The ticker symbol must be a maximum of 4 letters.")
             return
         
-        self.c.execute("SELECT ticker FROM companies WHERE ticker = ?", (ticker,))
-        existing_ticker = self.c.fetchone()
-        
-        if existing_ticker:
+        if self.directory.has_ticker(ticker):
             await ctx.send("⚠️ This ticker symbol is already in use.")
             return
         
-        self.c.execute("UPDATE companies SET ticker = ? WHERE name = ?", (ticker, company))
-        self.conn.commit()
+        await self.db.execute("UPDATE companies SET ticker = ? WHERE name = ?", (ticker, company))
+        self.directory.set_ticker(company, ticker)
         
         await ctx.send(f"✅ Ticker symbol for **{company}** has been set to **{ticker}**.")
         
@@ -340,26 +320,30 @@ class Companies(commands.Cog):
     async def send_to_company(self, ctx, company: str, amount: float):
         """Send money from a user to a company."""
         sender_id = ctx.author.id
-        self.c.execute("SELECT name FROM companies WHERE ticker = ?", (company,))
-        ticker_result = self.c.fetchone()
-        
-        if ticker_result:
-            company = ticker_result[0]
-        # Check if the sender has enough balance
-        self.c.execute("SELECT balance FROM users WHERE user_id = ?", (sender_id,))
-        sender_balance = self.c.fetchone()
-
-        if not sender_balance or sender_balance[0] < amount:
-            await ctx.send("⚠️ You do not have enough funds to send this amount.")
+        company = self.directory.resolve(company)
+        company_id = self.directory.company_id(company)
+        if not company_id:
+            await ctx.send("⚠️ Company not found.")
             return
 
-        # Update user balance
-        self.c.execute("UPDATE users SET balance = balance - ? WHERE user_id = ?", (amount, sender_id))
-        
-        # Update company balance
-        self.c.execute("UPDATE companies SET balance = balance + ? WHERE name = ?", (amount, company))
-        
-        self.conn.commit()
+        def transfer(cur):
+            # Both guards are checked before anything is written; the company may be deleted meanwhile
+            if not cur.execute("SELECT 1 FROM companies WHERE company_id = ?", (company_id,)).fetchone():
+                return "⚠️ Company not found."
+            balance = cur.execute("SELECT balance FROM users WHERE user_id = ?", (sender_id,)).fetchone()
+            if not balance or balance[0] < amount:
+                return "⚠️ You do not have enough funds to send this amount."
+            cur.execute("UPDATE users SET balance = balance - ? WHERE user_id = ?", (amount, sender_id))
+
+            # Update company balance
+            cur.execute("UPDATE companies SET balance = balance + ? WHERE company_id = ?", (amount, company_id))
+            return None
+
+        problem = await self.db.transaction(transfer)
+        if problem:
+            await ctx.send(problem)
+            return
+        self.ledger.post(company_account(company_id), user_account(sender_id), amount, "transfer", ctx.command.name)
         
         embed = discord.Embed(title="💸 Transfer Successful", color=discord.Color.green())
         embed.add_field(name="Sender", value=ctx.author.mention, inline=True)
@@ -371,32 +355,27 @@ class Companies(commands.Cog):
     async def sendc(self, ctx, company: str, recipient: discord.Member, amount: float):
         """Send money from a company to a user while applying tax to government balance."""
         sender_id = ctx.author.id
-        self.c.execute("SELECT name FROM companies WHERE ticker = ?", (company,))
-        ticker_result = self.c.fetchone()
-        
-        if ticker_result:
-            company = ticker_result[0]
+        company = self.directory.resolve(company)
         # Check if the sender owns the company
-        self.c.execute("SELECT balance FROM companies WHERE name = ? AND owner_id = ?", (company, sender_id))
-        company_data = self.c.fetchone()
-
-        if not company_data:
+        if company not in self.directory or self.directory.owner(company) != sender_id:
             await ctx.send("⚠️ You do not own this company or it does not exist.")
             return
 
-        company_balance = company_data[0]
+        def transfer(cur):
+            # Debit the company only if it can cover it, checked in the same statement
+            debited = cur.execute("UPDATE companies SET balance = balance - ? WHERE name = ? AND owner_id = ? AND balance >= ?",
+                                  (amount, company, sender_id, amount)).rowcount
+            if not debited:
+                return False
+
+            # Update recipient balance
+            cur.execute("UPDATE users SET balance = balance + ? WHERE user_id = ?", (amount, recipient.id))
+            return True
 
-        if company_balance < amount:
+        if not await self.db.transaction(transfer):
             await ctx.send("⚠️ The company does not have enough funds to send this amount.")
             return
-
-        # Update company balance
-        self.c.execute("UPDATE companies SET balance = balance - ? WHERE name = ?", (amount, company))
-        
-        # Update recipient balance
-        self.c.execute("UPDATE users SET balance = balance + ? WHERE user_id = ?", (amount, recipient.id))
-        
-        self.conn.commit()
+        self.ledger.post(user_account(recipient.id), company_account(self.directory.company_id(company)), amount, "transfer", ctx.command.name)
         
         embed = discord.Embed(title="💸 Transfer Successful", color=discord.Color.green())
         embed.add_field(name="Company", value=f"**{company}**", inline=True)
@@ -404,42 +383,90 @@ class Companies(commands.Cog):
         embed.add_field(name="Amount", value=f"${amount:,.2f}", inline=True)
         await ctx.send(embed=embed)
 
+    @commands.command(aliases=["div"])
+    async def dividend(self, ctx, company: str, per_share: float):
+        """Pay every shareholder of your company a dividend per share out of the company's balance."""
+        company = self.directory.resolve(company)
+        company_id = self.directory.company_id(company)
+        if not company_id or self.directory.owner(company) != ctx.author.id:
+            await ctx.send("⚠️ You do not own this company or it does not exist.")
+            return
+        if per_share <= 0:
+            await ctx.send("⚠️ The dividend must be positive.")
+            return
+
+        balance, held = await self.db.fetchone(
+            "SELECT c.balance, COALESCE((SELECT SUM(shares) FROM holdings WHERE company_id = c.company_id), 0) FROM companies c WHERE c.company_id = ?",
+            (company_id,)
+        )
+        if per_share * held > balance:
+            await ctx.send(f"⚠️ Paying ${per_share:,.2f} on {held} shares needs ${per_share * held:,.2f}, but the company only has ${balance:,.2f}.")
+            return
+
+        stats = await pay_dividend(self.db, f"dividend-{ctx.message.id}", company_id, per_share)
+
+        embed = discord.Embed(title="💵 Dividend Paid", color=discord.Color.green())
+        embed.add_field(name="Company", value=f"**{company}**", inline=True)
+        embed.add_field(name="Per Share", value=f"${per_share:,.2f}", inline=True)
+        embed.add_field(name="Shareholders Paid", value=stats["paid"], inline=True)
+        embed.add_field(name="Total", value=f"${stats['total']:,.2f}", inline=True)
+        await ctx.send(embed=embed)
+
     @commands.command()
     async def delete_company(self, ctx, company_name: str):
         """Deletes a company and liquidates its assets."""
         sender_id = ctx.author.id
-        self.c.execute("SELECT name FROM companies WHERE ticker = ?", (company_name,))
-        ticker_result = self.c.fetchone()
-        
-        if ticker_result:
-            company_name = ticker_result[0]
+        company_name = self.directory.resolve(company_name)
         # Check if the sender owns the company
-        self.c.execute("SELECT balance, is_public, shares_available, total_shares FROM companies WHERE name = ? AND owner_id = ?", (company_name, sender_id))
-        company = self.c.fetchone()
+        company = await self.db.fetchone("SELECT is_public, total_shares FROM companies WHERE name = ? AND owner_id = ?", (company_name, sender_id))
 
         if not company:
             await ctx.send("⚠️ You do not own this company or it does not exist.")
             return
 
-        balance, is_public, shares_available, total_shares = company
+        is_public, total_shares = company
+        company_id = self.directory.company_id(company_name)
+        # Open orders hand their cash and shares back before the shareholders are paid out
+        await self.book.cancel_company(company_id)
 
-        if is_public:
-            # Cash out all shareholders
-            self.c.execute("SELECT owner_id, shares FROM ownership WHERE company_name = ?", (company_name,))
-            ownerships = self.c.fetchall()
+        def liquidate(cur):
+            # Read the balance here, after the refunds above and any trade since the check
+            balance = cur.execute("SELECT balance FROM companies WHERE company_id = ?", (company_id,)).fetchone()[0]
+            payouts = []
+            if is_public:
+                # Cash out all shareholders; a company holding shares is paid into its own balance
+                holders = cur.execute(
+                    "SELECT h.holder_id, h.shares, c.company_id IS NOT NULL FROM holdings h "
+                    "LEFT JOIN companies c ON c.company_id = h.holder_id WHERE h.company_id = ?",
+                    (company_id,)
+                ).fetchall()
+
+                for holder_id, shares, is_company in holders:
+                    share_value = (balance / total_shares) * shares
+                    if is_company:
+                        cur.execute("UPDATE companies SET balance = balance + ? WHERE company_id = ?", (share_value, holder_id))
+                        payouts.append((company_account(holder_id), share_value))
+                    else:
+                        cur.execute("UPDATE users SET balance = balance + ? WHERE user_id = ?", (share_value, holder_id))
+                        payouts.append((user_account(holder_id), share_value))
 
-            for owner_id, shares in ownerships:
-                share_value = (balance / total_shares) * shares
-                self.c.execute("UPDATE users SET balance = balance + ? WHERE user_id = ?", (share_value, owner_id))
-                self.c.execute("DELETE FROM ownership WHERE owner_id = ? AND company_name = ?", (owner_id, company_name))
+            else:
+                # Liquidate all funds to the owner
+                cur.execute("UPDATE users SET balance = balance + ? WHERE user_id = ?", (balance, sender_id))
+                payouts.append((user_account(sender_id), balance))
 
-        else:
-            # Liquidate all funds to the owner
-            self.c.execute("UPDATE users SET balance = balance + ? WHERE user_id = ?", (balance, sender_id))
+            # Delete the company; the holdings of its shares go with it
+            cur.execute("DELETE FROM company_resources WHERE comp_id = ?", (company_id,))
+            cur.execute("DELETE FROM national_market WHERE comp_id = ?", (company_id,))
+            cur.execute("DELETE FROM companies WHERE company_id = ?", (company_id,))
+            return balance, payouts
 
-        # Delete the company
-        self.c.execute("DELETE FROM companies WHERE name = ?", (company_name,))
-        self.conn.commit()
+        balance, payouts = await self.db.transaction(liquidate)
+        self.directory.remove(company_name)
+        for account, amount in payouts:
+            self.ledger.post(account, company_account(company_id), amount, "liquidation", ctx.command.name)
+        # Whatever was not paid out (unsold shares' part of the balance) leaves the economy
+        self.ledger.post(MINT, company_account(company_id), balance - sum(amount for _, amount in payouts), "liquidation", ctx.command.name)
 
         embed = discord.Embed(title="🏢 Company Deleted", color=discord.Color.red())
         embed.add_field(name="Company", value=company_name, inline=False)
@@ -450,18 +477,13 @@ class Companies(commands.Cog):
     async def issue_shares(self, ctx, company_name: str, new_shares: int):
         """Dilutes a company's shares by increasing the total amount, only if public."""
         sender_id = ctx.author.id
-        self.c.execute("SELECT name FROM companies WHERE ticker = ?", (company_name,))
-        ticker_result = self.c.fetchone()
-        
-        if ticker_result:
-            company_name = ticker_result[0]
+        company_name = self.directory.resolve(company_name)
         
         if new_shares <= 0:
             await ctx.send("⚠️ You must issue a positive amount of shares.")
             return
         
-        self.c.execute("SELECT balance, total_shares, is_public FROM companies WHERE name = ? AND owner_id = ?", (company_name, sender_id))
-        company = self.c.fetchone()
+        company = await self.db.fetchone("SELECT balance, total_shares, is_public FROM companies WHERE name = ? AND owner_id = ?", (company_name, sender_id))
         
         if not company:
             await ctx.send("⚠️ You do not own this company or it does not exist.")
@@ -476,8 +498,7 @@ class Companies(commands.Cog):
         # Calculate the new stock value after issuing new shares
         new_total_shares = total_shares + new_shares
 
-        self.c.execute("UPDATE companies SET total_shares = ?, shares_available = shares_available + ? WHERE name = ?", (new_total_shares, new_shares, company_name))
-        self.conn.commit()
+        await self.db.execute("UPDATE companies SET total_shares = ?, shares_available = shares_available + ? WHERE name = ?", (new_total_shares, new_shares, company_name))
         
         value = await self.calc_stock_value(company_name)
         price_per_share = value / new_total_shares if new_total_shares > 0 else 0
@@ -496,14 +517,9 @@ class Companies(commands.Cog):
         """Appoints a board member to a company."""
         sender_id = ctx.author.id
         
-        self.c.execute("SELECT name FROM companies WHERE ticker = ?", (company_name,))
-        ticker_result = self.c.fetchone()
+        company_name = self.directory.resolve(company_name)
         
-        if ticker_result:
-            company_name = ticker_result[0]
-        
-        self.c.execute("SELECT owner_id, board_members FROM companies WHERE name = ? AND owner_id = ?", (company_name, sender_id))
-        company = self.c.fetchone()
+        company = await self.db.fetchone("SELECT owner_id, board_members FROM companies WHERE name = ? AND owner_id = ?", (company_name, sender_id))
         
         if not company:
             await ctx.send("⚠️ You do not own this company or it does not exist.")
@@ -525,8 +541,7 @@ class Companies(commands.Cog):
             return
 
         board_members.append(member.id)
-        self.c.execute("UPDATE companies SET board_members = ? WHERE name = ?", (json.dumps(board_members), company_name))
-        self.conn.commit()
+        await self.db.execute("UPDATE companies SET board_members = ? WHERE name = ?", (json.dumps(board_members), company_name))
         
         embed = discord.Embed(title="🏛️ Board Member Appointed", color=discord.Color.blue())
         embed.add_field(name="Company", value=company_name, inline=False)
@@ -540,31 +555,27 @@ class Companies(commands.Cog):
         user = member if member else ctx.author  # Default to the command sender if no user is mentioned
         user_id = user.id
         
-        self.c.execute("SELECT company_name, shares FROM ownership WHERE owner_id = ?", (user_id,))
-        ownerships = self.c.fetchall()
+        ownerships = await self.db.fetchall("SELECT c.name, h.shares, c.total_shares FROM holdings h JOIN companies c ON c.company_id = h.company_id WHERE h.holder_id = ?", (user_id,))
         
         if not ownerships:
             await ctx.send("📜 You do not own any stocks.")
             return
         
         embed = discord.Embed(title="📈 Your Stock Ownership", color=discord.Color.blue())
+        values = await self.calc_stock_values([company_name for company_name, _, _ in ownerships])
         
-        for company_name, shares in ownerships:
-            self.c.execute("SELECT balance, total_shares FROM companies WHERE name = ?", (company_name,))
-            company = self.c.fetchone()
-            if company:
-                value = await self.calc_stock_value(company_name)
-                balance, total_shares = company
-                price_per_share = value / total_shares if total_shares > 0 else 0
-                embed.add_field(
-                    name=f"🏢 {company_name}",
-                    value=(
-                    f"📊 Shares Owned: {shares}\n"
-                    f"💰 Value per Share: ${price_per_share:.2f}\n"
-                    f"💸 Total Value: ${shares * price_per_share:.2f}"
-                    ),
-                    inline=False
-                )
+        for company_name, shares, total_shares in ownerships:
+            value = values[company_name]
+            price_per_share = value / total_shares if total_shares > 0 else 0
+            embed.add_field(
+                name=f"🏢 {company_name}",
+                value=(
+                f"📊 Shares Owned: {shares}\n"
+                f"💰 Value per Share: ${price_per_share:.2f}\n"
+                f"💸 Total Value: ${shares * price_per_share:.2f}"
+                ),
+                inline=False
+            )
         
         await ctx.send(embed=embed)
 
@@ -572,16 +583,11 @@ class Companies(commands.Cog):
     async def stock_price(self, ctx, company_name: str):
         """Checks a company's stock value if they are public and displays an ownership pie chart."""
         # Check if the input is a ticker symbol
-        self.c.execute("SELECT name FROM companies WHERE ticker = ?", (company_name,))
-        ticker_result = self.c.fetchone()
-        
-        if ticker_result:
-            company_name = ticker_result[0]
+        company_name = self.directory.resolve(company_name)
             
         orig_company_name = company_name
         # Fetch company information
-        self.c.execute("SELECT owner_id, balance, shares_available, total_shares, is_public, board_members, ticker FROM companies WHERE name = ?", (company_name,))
-        company = self.c.fetchone()
+        company = await self.db.fetchone("SELECT owner_id, balance, shares_available, total_shares, is_public, board_members, ticker FROM companies WHERE name = ?", (company_name,))
         
         if not company:
             await ctx.send("⚠️ Company not found.")
@@ -611,8 +617,7 @@ class Companies(commands.Cog):
         price_per_share = float(value) / float(total_shares) if total_shares > 0 else 0.0
         
         # Fetch ownership data
-        self.c.execute("SELECT owner_id, shares FROM ownership WHERE company_name = ?", (company_name,))
-        ownership_data = self.c.fetchall()
+        ownership_data = await self.db.fetchall("SELECT owner_id, shares FROM ownership WHERE company_name = ?", (company_name,))
         
         # Prepare data for pie chart
         labels = []
@@ -620,10 +625,9 @@ class Companies(commands.Cog):
         for shareholder_id, shares in ownership_data:
             if shares > 0:
                 user = self.bot.get_user(shareholder_id)
-                self.c.execute("SELECT name FROM companies WHERE company_id = ?", (shareholder_id,))
-                shareholder_company_name = self.c.fetchone()
+                shareholder_company_name = self.directory.name(shareholder_id)
             if shareholder_company_name:
-                labels.append(shareholder_company_name[0])
+                labels.append(shareholder_company_name)
             else:
                 labels.append(user.name if user else f"User {shareholder_id}")
             sizes.append(shares)
@@ -674,65 +678,30 @@ class Companies(commands.Cog):
         await ctx.send(embed=embed, file=file)
 
     async def calc_stock_value(self, company_name: str):
-        """Calculates the value of a stock based on its holdings of other companies and balance and returns a float."""
-        self.c.execute("SELECT balance, total_shares FROM companies WHERE name = ?", (company_name,))
-        company = self.c.fetchone()
-        if company:
-            balance, total_shares = company
-            total_stock_value = 0
-            
-            # Check if the company owns shares in other companies
-            self.c.execute("SELECT company_name, shares FROM ownership WHERE owner_id = (SELECT company_id FROM companies WHERE name = ?)", (company_name,))
-            owned_stocks = self.c.fetchall()
-            
-            # Add the value of resources owned by the company to the total stock value
-            try:
-                self.c.execute("SELECT resource, stockpile FROM company_resources WHERE comp_id = (SELECT company_id FROM companies WHERE name = ?)", (company_name,))
-                resources = self.c.fetchall()
-                for resource, stockpile in resources:
-                    self.c.execute("SELECT price_per_unit FROM resources WHERE resource = ?", (resource,))
-                    resource_value = self.c.fetchone()
-                    if resource_value:
-                        total_stock_value += stockpile * resource_value[0]
-                        
-                self.c.execute("SELECT resource, amount FROM national_market WHERE comp_id = (SELECT company_id FROM companies WHERE name = ?)", (company_name,))
-                market_resources = self.c.fetchall()
-                for resource, amount in market_resources:
-                    self.c.execute("SELECT price_per_unit FROM resources WHERE resource = ?", (resource,))
-                    resource_value = self.c.fetchone()
-                    if resource_value:
-                        total_stock_value += amount * resource_value[0]
-            except sqlite3.OperationalError:
-                pass  # Table does not exist, skip this part
-            
-            for owned_company_name, shares in owned_stocks:
-                self.c.execute("SELECT balance, total_shares FROM companies WHERE name = ?", (owned_company_name,))
-                owned_company = self.c.fetchone()
-                if owned_company:
-                    owned_balance, owned_total_shares = owned_company
-                    owned_price_per_share = owned_balance / owned_total_shares if owned_total_shares > 0 else 0
-                    total_stock_value += shares * owned_price_per_share
-            
-            return balance + total_stock_value
-        return 0
+        """Calculates the value of a stock based on its balance, resources and holdings of other companies and returns a float.
+
+        Always computed live, so trades are priced off the current state.
+        """
+        return (await company_values(self.db, [company_name]))[company_name]
+
+    async def calc_stock_values(self, company_names=None):
+        """Values many companies at once for listings; returns {name: value}, with 0 for unknown names.
+
+        Reads the materialized valuations, which trail writes by one refresh (see valuation.py).
+        Passing None values every company.
+        """
+        return await materialized_values(self.db, company_names)
         
     @commands.command(aliases=['cboard'])
     async def company_leader_board(self, ctx):
         """displays a leader board based on total value of a company's assets"""
-        self.c.execute("SELECT name FROM companies")
-        rows = self.c.fetchall()
-        if not rows:
+        company_values = await self.bot.leaderboards.top_companies(5)
+        if not company_values:
             await ctx.send("⚠️ No companies found.")
             return
-        company_values = []
-        for row in rows:
-            company_name = row[0]
-            value = await self.calc_stock_value(company_name)
-            company_values.append((company_name, value))
         
-        company_values.sort(key=lambda x: x[1], reverse=True)
         embed = discord.Embed(title="💰 Top 5 Wealthiest Companies", color=discord.Color.green())
-        for i, (company_name, value) in enumerate(company_values[:5], start=1):
+        for i, (company_name, value) in enumerate(company_values, start=1):
             embed.add_field(name=f"{i}. {company_name}", value=f"${value:.2f}", inline=False)
         await ctx.send(embed=embed)
         
@@ -740,38 +709,25 @@ class Companies(commands.Cog):
     async def company_buy_shares(self, ctx, purchaser_company: str, stock: str, amount: int):
         """Allows companies to buy shares in another company."""
         new_owner = False
-        self.c.execute("SELECT name FROM companies WHERE ticker = ?", (purchaser_company,))
-        ticker_result = self.c.fetchone()
-        
-        if ticker_result:
-            purchaser_company = ticker_result[0]
+        purchaser_company = self.directory.resolve(purchaser_company)
             
-        self.c.execute("SELECT name FROM companies WHERE ticker = ?", (stock,))
-        ticker_result = self.c.fetchone()
-        
-        if ticker_result:
-            stock = ticker_result[0]
+        stock = self.directory.resolve(stock)
     
         if(amount <= 0):
             await ctx.send("⚠️ You must buy a positive amount of shares.")
             return
         
-        self.c.execute("SELECT company_id FROM companies WHERE name = ?", (purchaser_company,))
-        purchaser_id = self.c.fetchone()[0]
+        purchaser_id = self.directory.company_id(purchaser_company)
         if not purchaser_id:
             await ctx.send("⚠️ Purchaser company not found.")
             return
         
-        self.c.execute("SELECT owner_id FROM companies WHERE name = ?", (purchaser_company,))
-        owner_id = self.c.fetchone()
-        
-        if not owner_id or owner_id[0] != ctx.author.id:
+        if self.directory.owner(purchaser_company) != ctx.author.id:
             await ctx.send("⚠️ You do not own this company.")
             return
         
         
-        self.c.execute("SELECT balance, total_shares, is_public FROM companies WHERE name = ?", (stock,))
-        company = self.c.fetchone()
+        company = await self.db.fetchone("SELECT balance, total_shares, is_public FROM companies WHERE name = ?", (stock,))
         
         
         if not company:
@@ -784,36 +740,37 @@ class Companies(commands.Cog):
             await ctx.send("⚠️ This company is private and does not sell shares.")
             return
         
-        self.c.execute("SELECT balance FROM companies WHERE name = ?", (purchaser_company,))
-        purchaser_balance = self.c.fetchone()
-        
         value = await self.calc_stock_value(stock)
         
-        price_per_share = value / total_shares if total_shares > 0 else 0
-        total_cost = price_per_share * amount
+        price_per_share = share_price(value, total_shares)
+        total_cost = buy_cost(value, total_shares, amount)
         
-        if purchaser_balance[0] < total_cost:
-            await ctx.send("⚠️ The purchaser company does not have enough funds to buy this amount of shares.")
+        stock_id = self.directory.company_id(stock)
+
+        def settle(cur):
+            # Both guards are checked before anything is written, so a failed purchase leaves no trace
+            available = cur.execute("SELECT shares_available FROM companies WHERE company_id = ?", (stock_id,)).fetchone()
+            if not available or available[0] < amount:
+                return "⚠️ There are not enough shares available to buy this amount."
+            purchaser_balance = cur.execute("SELECT balance FROM companies WHERE company_id = ?", (purchaser_id,)).fetchone()
+            if not purchaser_balance or purchaser_balance[0] < total_cost:
+                return "⚠️ The purchaser company does not have enough funds to buy this amount of shares."
+            cur.execute("UPDATE companies SET balance = balance - ? WHERE company_id = ?", (total_cost, purchaser_id))
+            cur.execute("UPDATE companies SET balance = balance + ?, shares_available = shares_available - ? WHERE company_id = ?", (total_cost, amount, stock_id))
+            cur.execute("INSERT INTO holdings (holder_id, company_id, shares) VALUES (?, ?, ?) ON CONFLICT(holder_id, company_id) DO UPDATE SET shares = shares + excluded.shares", (purchaser_id, stock_id, amount))
+            return None
+
+        problem = await self.db.transaction(settle)
+        if problem:
+            await ctx.send(problem)
             return
-        
-        value = await self.calc_stock_value(stock)
-        
-        price_per_share = value / total_shares if total_shares > 0 else 0
-        
-        self.c.execute("UPDATE companies SET balance = balance - ? WHERE name = ?", (price_per_share, purchaser_company))
-        self.c.execute("UPDATE companies SET balance = balance + ? WHERE name = ?", (price_per_share, stock))
-        self.c.execute("UPDATE companies SET shares_available = shares_available - ? WHERE name = ?", (amount, stock))
-        self.c.execute("INSERT INTO ownership (owner_id, company_name, shares) VALUES (?, ?, ?) ON CONFLICT(owner_id, company_name) DO UPDATE SET shares = shares + ?", (purchaser_id, stock, amount, amount))
-        self.conn.commit()
-        self.c.execute("SELECT owner_id, shares FROM ownership WHERE company_name = ? ORDER BY shares DESC LIMIT 1", (stock,))
-        largest_shareholder = self.c.fetchone()
+        self.ledger.post(company_account(stock_id), company_account(purchaser_id), total_cost, "share purchase", ctx.command.name)
+        largest_shareholder = await self.db.fetchone("SELECT owner_id, shares FROM ownership WHERE company_name = ? ORDER BY shares DESC LIMIT 1", (stock,))
         if largest_shareholder and largest_shareholder[0] == purchaser_id:
-            self.c.execute("UPDATE companies SET owner_id = ? WHERE name = ?", (purchaser_id, stock))
-            self.conn.commit()
+            await self.db.execute("UPDATE companies SET owner_id = ? WHERE name = ?", (purchaser_id, stock))
+            self.directory.set_owner(stock, purchaser_id)
             new_owner = True
         
-        price_per_share = value / total_shares if total_shares > 0 else 0
-        
         embed = discord.Embed(title="📈 Shares Purchased", color=discord.Color.green())
         embed.add_field(name="Company", value=stock, inline=False)
         embed.add_field(name="Purchaser", value=purchaser_company, inline=False)
@@ -830,24 +787,15 @@ class Companies(commands.Cog):
         """Allows companies to sell shares in another company."""
         new_owner = False
         
-        self.c.execute("SELECT name FROM companies WHERE ticker = ?", (seller_company,))
-        ticker_result = self.c.fetchone()
-        
-        if ticker_result:
-            seller_company = ticker_result[0]
+        seller_company = self.directory.resolve(seller_company)
             
-        self.c.execute("SELECT name FROM companies WHERE ticker = ?", (stock,))
-        ticker_result = self.c.fetchone()
-        
-        if ticker_result:
-            stock = ticker_result[0]
+        stock = self.directory.resolve(stock)
         
         if(amount <= 0):
             await ctx.send("⚠️ You must sell a positive amount of shares.")
             return
         
-        self.c.execute("SELECT balance, shares_available, total_shares, is_public FROM companies WHERE name = ?", (stock,))
-        company = self.c.fetchone()
+        company = await self.db.fetchone("SELECT balance, shares_available, total_shares, is_public FROM companies WHERE name = ?", (stock,))
         
         if not company:
             await ctx.send("⚠️ Company not found.")
@@ -859,46 +807,49 @@ class Companies(commands.Cog):
             await ctx.send("⚠️ This company is private and does not allow share selling.")
             return
         
-        self.c.execute("SELECT balance FROM companies WHERE name = ?", (seller_company,))
-        seller_balance = self.c.fetchone()
+        seller_balance = await self.db.fetchone("SELECT balance FROM companies WHERE name = ?", (seller_company,))
         
         if not seller_balance:
             await ctx.send("⚠️ Seller company not found.")
             return
         
-        self.c.execute("SELECT shares FROM ownership WHERE owner_id = (SELECT company_id FROM companies WHERE name = ?) AND company_name = ?", (seller_company, stock))
-        seller_shares = self.c.fetchone()
+        seller_id = self.directory.company_id(seller_company)
+        stock_id = self.directory.company_id(stock)
         
-        if not seller_shares or seller_shares[0] < amount:
-            await ctx.send("⚠️ The seller company does not own enough shares to sell this amount.")
-            return
-        
-        self.c.execute("SELECT capital_gains_rate FROM tax_rate")
-        capital_gains_rate = self.c.fetchone()[0]
+        capital_gains_rate = await self.treasury.rate("capital_gains_rate")
         
         value = await self.calc_stock_value(stock)
         
-        price_per_share = value / total_shares if total_shares > 0 else 0
-        tax = (price_per_share * amount) * capital_gains_rate
-        total_earnings = (price_per_share * amount) - tax
+        proceeds = sell_proceeds(value, total_shares, amount)
+        tax = proceeds * capital_gains_rate
+        total_earnings = proceeds - tax
         
         if seller_balance[0] < total_earnings:
             await ctx.send("⚠️ The seller company does not have enough funds to sell shares.")
             return
         
-        self.c.execute("UPDATE companies SET balance = balance - ? WHERE name = ?", (total_earnings, stock))
-        self.c.execute("UPDATE companies SET balance = balance + ? WHERE name = ?", (total_earnings, seller_company))
-        self.c.execute("UPDATE tax_rate SET government_balance = government_balance + ?", (tax,))
-        self.c.execute("UPDATE companies SET shares_available = shares_available + ? WHERE name = ?", (amount, stock))
-        self.c.execute("UPDATE ownership SET shares = shares - ? WHERE owner_id = (SELECT company_id FROM companies WHERE name = ?) AND company_name = ?", (amount, seller_company, stock))
-        self.c.execute("DELETE FROM ownership WHERE owner_id = (SELECT company_id FROM companies WHERE name = ?) AND company_name = ? AND shares = 0", (seller_company, stock))
-        self.conn.commit()
+        def settle(cur):
+            # Take the shares only if the seller still holds them, checked in the same statement
+            taken = cur.execute("UPDATE holdings SET shares = shares - ? WHERE holder_id = ? AND company_id = ? AND shares >= ?",
+                                (amount, seller_id, stock_id, amount)).rowcount
+            if not taken:
+                return False
+            cur.execute("DELETE FROM holdings WHERE holder_id = ? AND company_id = ? AND shares = 0", (seller_id, stock_id))
+            cur.execute("UPDATE companies SET balance = balance - ?, shares_available = shares_available + ? WHERE company_id = ?", (total_earnings, amount, stock_id))
+            cur.execute("UPDATE companies SET balance = balance + ? WHERE company_id = ?", (total_earnings, seller_id))
+            return True
+
+        if not await self.db.transaction(settle):
+            await ctx.send("⚠️ The seller company does not own enough shares to sell this amount.")
+            return
+        self.ledger.post(company_account(seller_id), company_account(stock_id), total_earnings, "share sale", ctx.command.name)
+        # The issuer only pays out the after-tax proceeds, so the tax is new money
+        self.treasury.collect(tax, MINT, "capital gains tax", ctx.command.name)
         
-        self.c.execute("SELECT owner_id, shares FROM ownership WHERE company_name = ? ORDER BY shares DESC LIMIT 1", (stock,))
-        largest_shareholder = self.c.fetchone()
+        largest_shareholder = await self.db.fetchone("SELECT owner_id, shares FROM ownership WHERE company_name = ? ORDER BY shares DESC LIMIT 1", (stock,))
         if largest_shareholder and largest_shareholder[0] != ctx.author.id:
-            self.c.execute("UPDATE companies SET owner_id = ? WHERE name = ?", (largest_shareholder[0], stock))
-            self.conn.commit()
+            await self.db.execute("UPDATE companies SET owner_id = ? WHERE name = ?", (largest_shareholder[0], stock))
+            self.directory.set_owner(stock, largest_shareholder[0])
             new_owner = self.bot.get_user(largest_shareholder[0])
         
         embed = discord.Embed(title="📉 Shares Sold", color=discord.Color.red())
@@ -917,44 +868,35 @@ class Companies(commands.Cog):
     @commands.command(aliases=["co"])
     async def company_ownership(self, ctx, company_name: str):
         """Shows all shares that a company owns"""
-        self.c.execute("SELECT name FROM companies WHERE ticker = ?", (company_name,))
-        ticker_result = self.c.fetchone()
-        
-        if ticker_result:
-            company_name = ticker_result[0]
+        company_name = self.directory.resolve(company_name)
         
-        self.c.execute("SELECT company_id FROM companies WHERE name = ?", (company_name,))
-        company_id = self.c.fetchone()
+        company_id = self.directory.company_id(company_name)
         
         if not company_id:
             await ctx.send("⚠️ Company not found.")
             return
         
-        self.c.execute("SELECT company_name, shares FROM ownership WHERE owner_id = ?", (company_id[0],))
-        ownerships = self.c.fetchall()
+        ownerships = await self.db.fetchall("SELECT c.name, h.shares, c.total_shares FROM holdings h JOIN companies c ON c.company_id = h.company_id WHERE h.holder_id = ?", (company_id,))
         
         if not ownerships:
             await ctx.send("📜 No ownership data found for this company.")
             return
         
         embed = discord.Embed(title=f"📈 {company_name} Stock Ownership", color=discord.Color.blue())
+        values = await self.calc_stock_values([owned_company_name for owned_company_name, _, _ in ownerships])
         
-        for owned_company_name, shares in ownerships:
-            self.c.execute("SELECT balance, total_shares FROM companies WHERE name = ?", (owned_company_name,))
-            company = self.c.fetchone()
-            if company:
-                value = await self.calc_stock_value(owned_company_name)
-                balance, total_shares = company
-                price_per_share = value / total_shares if total_shares > 0 else 0
-                embed.add_field(
-                    name=f"🏢 {owned_company_name}",
-                    value=(
-                    f"📊 Shares Owned: {shares}\n"
-                    f"💰 Value per Share: ${price_per_share:.2f}\n"
-                    f"💸 Total Value: ${shares * price_per_share:.2f}"
-                    ),
-                    inline=False
-                )
+        for owned_company_name, shares, total_shares in ownerships:
+            value = values[owned_company_name]
+            price_per_share = value / total_shares if total_shares > 0 else 0
+            embed.add_field(
+                name=f"🏢 {owned_company_name}",
+                value=(
+                f"📊 Shares Owned: {shares}\n"
+                f"💰 Value per Share: ${price_per_share:.2f}\n"
+                f"💸 Total Value: ${shares * price_per_share:.2f}"
+                ),
+                inline=False
+            )
         await ctx.send(embed=embed)
 
     @commands.command(aliases=["buyshares","bs"])
@@ -963,14 +905,9 @@ class Companies(commands.Cog):
         user_id = ctx.author.id
         new_owner = False
 
-        self.c.execute("SELECT name FROM companies WHERE ticker = ?", (company_name,))
-        ticker_result = self.c.fetchone()
-        
-        if ticker_result:
-            company_name = ticker_result[0]
+        company_name = self.directory.resolve(company_name)
             
-        self.c.execute("SELECT balance, shares_available, total_shares, is_public FROM companies WHERE name = ?", (company_name,))
-        company = self.c.fetchone()
+        company = await self.db.fetchone("SELECT balance, shares_available, total_shares, is_public FROM companies WHERE name = ?", (company_name,))
         
         if not company:
             await ctx.send("⚠️ Company not found.")
@@ -986,37 +923,35 @@ class Companies(commands.Cog):
             await ctx.send("⚠️ You must buy a positive amount of shares.")
             return
         
-        if(amount > shares_available):
-            await ctx.send("⚠️ There are not enough shares available to buy this amount.")
-            return
-        
-        total_cost = 0
-        for _ in range(amount):
-            value = await self.calc_stock_value(company_name)
-            price_per_share = value / total_shares if total_shares > 0 else 0
-            total_cost += price_per_share
-            balance += price_per_share
-            shares_available -= 1
+        value = await self.calc_stock_value(company_name)
+        total_cost = buy_cost(value, total_shares, amount)
         
-        self.c.execute("SELECT balance FROM users WHERE user_id = ?", (user_id,))
-        user_balance = self.c.fetchone()
+        company_id = self.directory.company_id(company_name)
+
+        def settle(cur):
+            # Both guards are checked before anything is written, so a failed purchase leaves no trace
+            available = cur.execute("SELECT shares_available FROM companies WHERE company_id = ?", (company_id,)).fetchone()
+            if not available or available[0] < amount:
+                return "⚠️ There are not enough shares available to buy this amount."
+            user_balance = cur.execute("SELECT balance FROM users WHERE user_id = ?", (user_id,)).fetchone()
+            if not user_balance or user_balance[0] < total_cost:
+                return "⚠️ You do not have enough funds to pay for the shares"
+            cur.execute("UPDATE users SET balance = balance - ? WHERE user_id = ?", (total_cost, user_id))
+            cur.execute("UPDATE companies SET balance = balance + ?, shares_available = shares_available - ? WHERE company_id = ?", (total_cost, amount, company_id))
+            cur.execute("INSERT INTO holdings (holder_id, company_id, shares) VALUES (?, ?, ?) ON CONFLICT(holder_id, company_id) DO UPDATE SET shares = shares + excluded.shares", (user_id, company_id, amount))
+            return None
 
-        if (total_cost) > user_balance[0]:
-            await ctx.send("⚠️ You do not have enough funds to pay for the shares")
+        problem = await self.db.transaction(settle)
+        if problem:
+            await ctx.send(problem)
             return
+        self.ledger.post(company_account(company_id), user_account(user_id), total_cost, "share purchase", ctx.command.name)
         
-        
-        self.c.execute("UPDATE users SET balance = balance - ? WHERE user_id = ?", (total_cost, user_id))
-        self.c.execute("UPDATE companies SET balance = ?, shares_available = ? WHERE name = ?", (balance, shares_available, company_name))
-        self.c.execute("INSERT INTO ownership (owner_id, company_name, shares) VALUES (?, ?, ?) ON CONFLICT(owner_id, company_name) DO UPDATE SET shares = shares + ?", (user_id, company_name, amount, amount))
-        self.conn.commit()
-        
-        self.c.execute("SELECT owner_id, shares FROM ownership WHERE company_name = ? ORDER BY shares DESC LIMIT 1", (company_name,))
-        largest_shareholder = self.c.fetchone()
+        largest_shareholder = await self.db.fetchone("SELECT owner_id, shares FROM ownership WHERE company_name = ? ORDER BY shares DESC LIMIT 1", (company_name,))
         if largest_shareholder and largest_shareholder[0] == user_id:
-            self.c.execute("UPDATE companies SET owner_id = ? WHERE name = ?", (user_id, company_name))
+            await self.db.execute("UPDATE companies SET owner_id = ? WHERE name = ?", (user_id, company_name))
+            self.directory.set_owner(company_name, user_id)
             new_owner = True
-            self.conn.commit()
         
         
         embed = discord.Embed(title="📈 Shares Purchased", color=discord.Color.green())
@@ -1034,16 +969,9 @@ class Companies(commands.Cog):
     @commands.command(aliases=['board'])
     async def leader_board(self, ctx):
         """displays a leader board based on total value of an individual's assets"""
-        self.c.execute("SELECT user_id FROM users")
-        user_ids = [row[0] for row in self.c.fetchall()]
-        user_values = []
-        for user_id in user_ids:
-            total_value = await self.indv_value(user_id)
-            user_values.append((user_id, total_value))
-        
-        user_values.sort(key=lambda x: x[1], reverse=True)
+        user_values = await self.bot.leaderboards.richest_users(10)
         embed = discord.Embed(title="🏆 Wealth Leader Board", color=discord.Color.gold())
-        for i, (user_id, total_value) in enumerate(user_values[:10], start=1):
+        for i, (user_id, total_value) in enumerate(user_values, start=1):
             user = self.bot.get_user(user_id)
             if user:
                 rank_emoji = "🥇" if i == 1 else "🥈" if i == 2 else "🥉" if i == 3 else "🏅"
@@ -1051,18 +979,37 @@ class Companies(commands.Cog):
         embed.set_footer(text="Keep up the good work and climb the ranks!")
         await ctx.send(embed=embed)
 
+    @commands.command()
+    @commands.has_role("RP Admin")
+    async def leaderboard_stats(self, ctx):
+        """Shows how often the leaderboards were served from cache."""
+        stats = self.bot.leaderboards.stats()
+        embed = discord.Embed(title="📊 Leaderboard Cache", color=discord.Color.blue())
+        embed.add_field(name="Hits", value=stats["hits"], inline=True)
+        embed.add_field(name="Misses", value=stats["misses"], inline=True)
+        embed.add_field(name="Hit Rate", value=f"{stats['hit_rate']:.1%}", inline=True)
+        await ctx.send(embed=embed)
+
+    @commands.command()
+    @commands.has_role("RP Admin")
+    async def page_cache_stats(self, ctx):
+        """Shows how often listing pages were served from cache."""
+        stats = self.pages.stats()
+        embed = discord.Embed(title="📊 Page Cache", color=discord.Color.blue())
+        embed.add_field(name="Hits", value=stats["hits"], inline=True)
+        embed.add_field(name="Misses", value=stats["misses"], inline=True)
+        embed.add_field(name="Hit Rate", value=f"{stats['hit_rate']:.1%}", inline=True)
+        await ctx.send(embed=embed)
+
     async def indv_value(self, user_id: int):
         """Calculates an individuals value based of stock holdings and balance"""
-        self.c.execute("SELECT balance FROM users WHERE user_id = ?", (user_id,))
-        user_balance_row = self.c.fetchone()
+        user_balance_row = await self.db.fetchone("SELECT balance FROM users WHERE user_id = ?", (user_id,))
         user_balance = user_balance_row[0] if user_balance_row else 0
-        self.c.execute("SELECT company_name, shares FROM ownership WHERE owner_id = ?", (user_id,))
-        ownerships = self.c.fetchall()
+        ownerships = await self.db.fetchall("SELECT c.name, h.shares, c.total_shares FROM holdings h JOIN companies c ON c.company_id = h.company_id WHERE h.holder_id = ?", (user_id,))
         total_stock_value = 0
-        for company_name, shares in ownerships:
-            value = await self.calc_stock_value(company_name)
-            self.c.execute("SELECT total_shares FROM companies WHERE name = ?", (company_name,))
-            total_shares = self.c.fetchone()[0]
+        values = await self.calc_stock_values([company_name for company_name, _, _ in ownerships])
+        for company_name, shares, total_shares in ownerships:
+            value = values[company_name]
             price_per_share = value / total_shares if total_shares > 0 else 0
             total_stock_value += (price_per_share * shares)
         return user_balance + total_stock_value  
@@ -1073,14 +1020,9 @@ class Companies(commands.Cog):
         user_id = ctx.author.id
         new_owner = False
         
-        self.c.execute("SELECT name FROM companies WHERE ticker = ?", (company_name,))
-        ticker_result = self.c.fetchone()
-        
-        if ticker_result:
-            company_name = ticker_result[0]
+        company_name = self.directory.resolve(company_name)
         
-        self.c.execute("SELECT balance, shares_available, total_shares, is_public FROM companies WHERE name = ?", (company_name,))
-        company = self.c.fetchone()
+        company = await self.db.fetchone("SELECT balance, shares_available, total_shares, is_public FROM companies WHERE name = ?", (company_name,))
         
         if not company:
             await ctx.send("⚠️ Company not found.")
@@ -1100,38 +1042,36 @@ class Companies(commands.Cog):
             await ctx.send("⚠️ You cannot sell more shares than the total floating shares.")
             return
         
-        self.c.execute("SELECT shares FROM ownership WHERE owner_id = ? AND company_name = ?", (user_id, company_name))
-        user_shares = self.c.fetchone()
+        capital_gains_rate = await self.treasury.rate("capital_gains_rate")
         
-        if not user_shares or user_shares[0] < amount:
-            await ctx.send("⚠️ You do not own enough shares to sell this amount.")
-            return
-        
-        self.c.execute("SELECT capital_gains_rate FROM tax_rate")
-        capital_gains_rate = self.c.fetchone()[0]
-        
-        total_earnings = 0
-        for _ in range(amount):
-            value = await self.calc_stock_value(company_name)
-            price_per_share = value / total_shares if total_shares > 0 else 0
-            total_earnings += price_per_share
-            balance -= price_per_share
-            shares_available += 1
+        value = await self.calc_stock_value(company_name)
+        total_earnings = sell_proceeds(value, total_shares, amount)
         
         tax = total_earnings * capital_gains_rate
         
-        self.c.execute("UPDATE ownership SET shares = shares - ? WHERE owner_id = ? AND company_name = ?", (amount, user_id, company_name))
-        self.c.execute("UPDATE users SET balance = balance + ? WHERE user_id = ?", (total_earnings - tax, user_id))
-        self.c.execute("UPDATE companies SET balance = ?, shares_available = ? WHERE name = ?", (balance, shares_available, company_name))
-        self.c.execute("UPDATE tax_rate SET government_balance = government_balance + ?", (tax,))
-        self.c.execute("DELETE FROM ownership WHERE (owner_id = ? AND company_name = ?) AND shares = 0", (user_id, company_name))
-        self.conn.commit()
+        company_id = self.directory.company_id(company_name)
+
+        def settle(cur):
+            # Take the shares only if the user still holds them, checked in the same statement
+            taken = cur.execute("UPDATE holdings SET shares = shares - ? WHERE holder_id = ? AND company_id = ? AND shares >= ?",
+                                (amount, user_id, company_id, amount)).rowcount
+            if not taken:
+                return False
+            cur.execute("DELETE FROM holdings WHERE holder_id = ? AND company_id = ? AND shares = 0", (user_id, company_id))
+            cur.execute("UPDATE users SET balance = balance + ? WHERE user_id = ?", (total_earnings - tax, user_id))
+            cur.execute("UPDATE companies SET balance = balance - ?, shares_available = shares_available + ? WHERE company_id = ?", (total_earnings, amount, company_id))
+            return True
+
+        if not await self.db.transaction(settle):
+            await ctx.send("⚠️ You do not own enough shares to sell this amount.")
+            return
+        self.ledger.post(user_account(user_id), company_account(company_id), total_earnings, "share sale", ctx.command.name)
+        self.treasury.collect(tax, user_account(user_id), "capital gains tax", ctx.command.name)
         
-        self.c.execute("SELECT owner_id, shares FROM ownership WHERE company_name = ? ORDER BY shares DESC LIMIT 1", (company_name,))
-        largest_shareholder = self.c.fetchone()
+        largest_shareholder = await self.db.fetchone("SELECT owner_id, shares FROM ownership WHERE company_name = ? ORDER BY shares DESC LIMIT 1", (company_name,))
         if largest_shareholder and largest_shareholder[0] != user_id:
-            self.c.execute("UPDATE companies SET owner_id = ? WHERE name = ?", (largest_shareholder[0], company_name))
-            self.conn.commit()
+            await self.db.execute("UPDATE companies SET owner_id = ? WHERE name = ?", (largest_shareholder[0], company_name))
+            self.directory.set_owner(company_name, largest_shareholder[0])
             new_owner = self.bot.get_user(largest_shareholder[0])
             
         
@@ -1148,6 +1088,89 @@ class Companies(commands.Cog):
         channel = self.bot.get_channel(1345074664850067527)
         await channel.send(embed=embed)
 
+    async def public_company_id(self, ctx, ticker: str):
+        """company_id of a public company by ticker or name, or None after telling the user why."""
+        company_name = self.directory.resolve(ticker)
+        company = await self.db.fetchone("SELECT company_id, is_public FROM companies WHERE name = ?", (company_name,))
+        if not company:
+            await ctx.send("⚠️ Company not found.")
+            return None
+        if not company[1]:
+            await ctx.send("⚠️ This company is private and does not trade shares.")
+            return None
+        return company[0]
+
+    async def place_order(self, ctx, side: str, ticker: str, shares: int, price: float):
+        if shares <= 0 or price <= 0:
+            await ctx.send("⚠️ Shares and price must be positive.")
+            return
+        company_id = await self.public_company_id(ctx, ticker)
+        if company_id is None:
+            return
+
+        placed = await self.book.place(user_account(ctx.author.id), company_id, side, price, shares)
+        if placed is None:
+            await ctx.send("⚠️ You do not have enough funds for this bid." if side == BID else "⚠️ You do not own enough shares for this ask.")
+            return
+        order_id, fills = placed
+        await ctx.send(embed=self.order_embed(order_id, side, ticker, shares, price, fills))
+
+    def order_embed(self, order_id, side, ticker, shares, price, fills):
+        filled = sum(count for count, _ in fills)
+        embed = discord.Embed(title=f"📒 {'Bid' if side == BID else 'Ask'} #{order_id}", color=discord.Color.blue())
+        embed.add_field(name="Company", value=self.directory.resolve(ticker), inline=True)
+        embed.add_field(name="Limit", value=f"{shares} @ ${price:,.2f}", inline=True)
+        embed.add_field(name="Filled Now", value=f"{filled} shares" + (f" avg ${sum(c * p for c, p in fills) / filled:,.2f}" if filled else ""), inline=True)
+        if filled < shares:
+            embed.add_field(name="Resting", value=f"{shares - filled} shares in the book", inline=True)
+        return embed
+
+    @commands.command()
+    async def bid(self, ctx, ticker: str, shares: int, price: float):
+        """Places a limit order to buy shares at up to `price` each. The cash is held until it fills or is cancelled."""
+        await self.place_order(ctx, BID, ticker, shares, price)
+
+    @commands.command()
+    async def ask(self, ctx, ticker: str, shares: int, price: float):
+        """Places a limit order to sell shares at `price` or better. The shares are held until they sell or the order is cancelled."""
+        await self.place_order(ctx, ASK, ticker, shares, price)
+
+    @commands.command(aliases=["cxl"])
+    async def cancel_order(self, ctx, order_id: int):
+        """Cancels one of your open share orders and returns what it was holding."""
+        order = await self.book.cancel(order_id, user_account(ctx.author.id))
+        if not order:
+            await ctx.send("⚠️ You have no open order with that number.")
+            return
+        await ctx.send(f"✅ Order #{order_id} cancelled; {order['shares']} unfilled shares released.")
+
+    @commands.command(aliases=["ao"])
+    async def amend_order(self, ctx, order_id: int, shares: int, price: float):
+        """Changes the size or price of an open order. Only shrinking it at the same price keeps its place in line."""
+        if shares <= 0 or price <= 0:
+            await ctx.send("⚠️ Shares and price must be positive.")
+            return
+        order = self.book.order(order_id)
+        amended = await self.book.amend(order_id, user_account(ctx.author.id), price, shares)
+        if amended is None:
+            await ctx.send("⚠️ That is not one of your open orders, or you cannot cover the new size.")
+            return
+        new_id, fills = amended
+        await ctx.send(embed=self.order_embed(new_id, order["side"], self.directory.name(order["company_id"]), shares, price, fills))
+
+    @commands.command(aliases=["ob"])
+    async def order_book(self, ctx, ticker: str):
+        """Shows the best bids and asks resting for a public company's shares."""
+        company_id = await self.public_company_id(ctx, ticker)
+        if company_id is None:
+            return
+        embed = discord.Embed(title=f"📒 {self.directory.resolve(ticker)} Order Book", color=discord.Color.blue())
+        for side, title in ((ASK, "Asks"), (BID, "Bids")):
+            levels = self.book.depth(company_id, side)
+            lines = [f"${price:>10,.2f}  {shares:>6} shares  ({orders})" for price, shares, orders in levels]
+            embed.add_field(name=title, value="```" + ("\n".join(lines) or "none") + "```", inline=False)
+        await ctx.send(embed=embed)
+
 
 async def setup(bot):
     await bot.add_cog(Companies(bot))
\ No newline at end of file
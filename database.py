@@ -0,0 +1,244 @@
+import asyncio
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+DB_PATH = "game.db"
+
+# Applied to every connection; these settings do not persist in the file.
+CONNECTION_PRAGMAS = (
+    "PRAGMA synchronous = NORMAL",  # Safe under WAL; fsync only at checkpoints
+    "PRAGMA busy_timeout = 30000",
+    "PRAGMA cache_size = -16000",  # 16 MB page cache per connection
+    "PRAGMA mmap_size = 268435456",  # Map up to 256 MB of the file for reads
+    "PRAGMA foreign_keys = ON",  # holdings rows are deleted with their company
+)
+
+# Authorizer actions that write rows; the table is the callback's first argument.
+WRITE_ACTIONS = (sqlite3.SQLITE_INSERT, sqlite3.SQLITE_UPDATE, sqlite3.SQLITE_DELETE)
+
+
+class Database:
+    """Shared access to game.db for the bot and every cog.
+
+    Reads run on a small bounded thread pool, one sqlite connection per worker
+    thread, so a slow query never blocks the event loop.
+
+    Writes never touch those connections. ``execute``, ``executemany`` and
+    ``transaction`` queue their work for a single writer task that owns the only
+    write connection. The writer waits ``commit_interval`` seconds for other
+    commands to queue up, runs every pending request inside its own SAVEPOINT and
+    commits the whole group at once (group commit), so one fsync covers many
+    commands and a failing request only rolls back its own changes.
+
+    ``data_version`` goes up every time a group commits changes, so caches can tell
+    whether anything was written since they were filled. ``version(*tables)`` is
+    the data_version of the last commit that wrote any of ``tables``, so a cache
+    that reads only a few tables is not thrown away by writes to the others. The
+    writer learns which tables a statement writes from SQLite's authorizer, which
+    also reports writes made by triggers and foreign key cascades; it therefore
+    runs without a statement cache, as a cached statement is not authorized again.
+
+    Call ``configure`` once at startup to switch the file to WAL, which lets the
+    read connections keep serving commands while the writer commits.
+    """
+
+    def __init__(self, path=DB_PATH, max_workers=4, commit_interval=0.005, max_batch=256):
+        self.path = path
+        self.commit_interval = commit_interval
+        self.max_batch = max_batch
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="game-db")
+        self._writer_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="game-db-writer")
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+        self._writer_conn = None
+        self._queue = None
+        self._writer_task = None
+        self.data_version = 0
+        self._table_versions = {}  # table -> data_version of the last commit that wrote it
+        self._written = set()  # Tables written by the group being committed
+
+    def _connect(self, cached_statements=128):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False,
+                               cached_statements=cached_statements)
+        for pragma in CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        with self._lock:
+            self._connections.append(conn)
+        return conn
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    async def _run(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, fn, *args)
+
+    def _fetchone(self, sql, params):
+        return self._connection().execute(sql, params).fetchone()
+
+    def _fetchall(self, sql, params):
+        return self._connection().execute(sql, params).fetchall()
+
+    def _snapshot(self, fn, args):
+        conn = self._connection()
+        cur = conn.cursor()
+        try:
+            cur.execute("BEGIN")
+            return fn(cur, *args)
+        finally:
+            cur.execute("COMMIT")
+            cur.close()
+
+    def _authorize(self, action, table, *_):
+        if action in WRITE_ACTIONS:
+            self._written.add(table.lower())
+        return sqlite3.SQLITE_OK
+
+    def _writer(self):
+        if self._writer_conn is None:
+            self._writer_conn = self._connect(cached_statements=0)
+            self._writer_conn.set_authorizer(self._authorize)
+        return self._writer_conn
+
+    def _set_journal_mode(self, mode):
+        return self._writer().execute(f"PRAGMA journal_mode = {mode}").fetchone()[0]
+
+    def _explain(self, sql, params):
+        # A fresh connection: cached statements on the pooled ones keep plans from before schema changes
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            return conn.execute("EXPLAIN QUERY PLAN " + sql, params).fetchall()
+        finally:
+            conn.close()
+
+    def _commit_group(self, batch):
+        """Runs on the writer thread: applies every queued request in one transaction."""
+        conn = self._writer()
+        cur = conn.cursor()
+        outcomes = []
+        self._written.clear()
+        try:
+            cur.execute("BEGIN IMMEDIATE")
+            for fn, args, _ in batch:
+                cur.execute("SAVEPOINT request")
+                try:
+                    outcomes.append((True, fn(cur, *args)))
+                    cur.execute("RELEASE request")
+                except Exception as e:
+                    cur.execute("ROLLBACK TO request")
+                    cur.execute("RELEASE request")
+                    outcomes.append((False, e))
+            cur.execute("COMMIT")
+        except Exception as e:
+            if conn.in_transaction:
+                conn.rollback()
+            return [(False, e)] * len(batch)
+        finally:
+            cur.close()
+        return outcomes
+
+    async def _writer_loop(self):
+        loop = asyncio.get_running_loop()
+        running = True
+        while running:
+            item = await self._queue.get()
+            if item is None:
+                break
+            await asyncio.sleep(self.commit_interval)  # Let concurrent commands join this group
+            batch = [item]
+            while len(batch) < self.max_batch and not self._queue.empty():
+                item = self._queue.get_nowait()
+                if item is None:
+                    running = False
+                    break
+                batch.append(item)
+
+            outcomes = await loop.run_in_executor(self._writer_executor, self._commit_group, batch)
+            if any(ok for ok, _ in outcomes):
+                self.data_version += 1
+                for table in self._written:
+                    self._table_versions[table] = self.data_version
+            for (_, _, future), (ok, value) in zip(batch, outcomes):
+                if future.cancelled():
+                    continue
+                if ok:
+                    future.set_result(value)
+                else:
+                    future.set_exception(value)
+
+    def _submit(self, fn, args=()):
+        loop = asyncio.get_running_loop()
+        if self._writer_task is None:
+            self._queue = asyncio.Queue()
+            self._writer_task = loop.create_task(self._writer_loop())
+        future = loop.create_future()
+        self._queue.put_nowait((fn, args, future))
+        return future
+
+    def version(self, *tables):
+        """The data_version of the last commit that wrote any of ``tables``, 0 if none has."""
+        return max((self._table_versions.get(table, 0) for table in tables), default=0)
+
+    async def configure(self):
+        """Switch the database file to write-ahead logging; returns the resulting journal mode."""
+        loop = asyncio.get_running_loop()
+        mode = await loop.run_in_executor(self._writer_executor, self._set_journal_mode, "WAL")
+        if mode.lower() != "wal":
+            print(f"⚠️ Could not enable WAL, database is using journal_mode={mode}.")
+        return mode
+
+    async def fetchone(self, sql, params=()):
+        """Run a query and return its first row (or None)."""
+        return await self._run(self._fetchone, sql, params)
+
+    async def fetchall(self, sql, params=()):
+        """Run a query and return every row."""
+        return await self._run(self._fetchall, sql, params)
+
+    async def snapshot(self, fn, *args):
+        """Run ``fn(cursor, *args)`` on a read connection inside one read transaction.
+
+        Every query ``fn`` makes sees the same committed state, however many writes
+        commit in the meantime. ``fn`` must only read.
+        """
+        return await self._run(self._snapshot, fn, args)
+
+    async def explain(self, sql, params=()):
+        """Return the EXPLAIN QUERY PLAN rows for a query against the current schema."""
+        return await self._run(self._explain, sql, params)
+
+    async def execute(self, sql, params=()):
+        """Queue a single write statement and return the affected row count once it is committed."""
+        return await self._submit(lambda cur: cur.execute(sql, params).rowcount)
+
+    async def executemany(self, sql, seq_of_params):
+        """Queue one statement for every parameter set; all of them commit together."""
+        seq_of_params = list(seq_of_params)
+        return await self._submit(lambda cur: cur.executemany(sql, seq_of_params).rowcount)
+
+    async def transaction(self, fn, *args):
+        """Run ``fn(cursor, *args)`` atomically on the writer connection and return its result.
+
+        ``fn`` runs on the writer thread, so it must only touch the cursor it is given
+        and must not BEGIN or COMMIT itself. Any exception rolls back just this request
+        and is re-raised here.
+        """
+        return await self._submit(fn, args)
+
+    async def close(self):
+        """Flush queued writes, stop the worker threads and close every connection."""
+        if self._writer_task is not None:
+            self._queue.put_nowait(None)
+            await self._writer_task
+            self._writer_task = None
+        self._writer_executor.shutdown(wait=True)
+        self._executor.shutdown(wait=True)
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
@@ -0,0 +1,81 @@
+"""In-memory index of company identities: company_id, name, ticker and owner.
+
+Commands accept either a company name or its ticker. Before this index they spent two or
+three queries turning that argument into a name, a company_id and an owner. The
+directory is loaded once at startup. After that, the code that commits a change to
+these columns (create, ticker, owner and delete) updates the directory too.
+"""
+
+
+class CompanyDirectory:
+    def __init__(self, db):
+        self.db = db
+        self._ids = {}      # name -> company_id
+        self._names = {}    # company_id -> name
+        self._tickers = {}  # ticker -> name
+        self._ticker_of = {}  # name -> ticker
+        self._owners = {}   # name -> owner_id
+
+    async def load(self):
+        rows = await self.db.fetchall("SELECT company_id, name, ticker, owner_id FROM companies")
+        self._ids.clear()
+        self._names.clear()
+        self._tickers.clear()
+        self._ticker_of.clear()
+        self._owners.clear()
+        for company_id, name, ticker, owner_id in rows:
+            self.add(company_id, name, owner_id, ticker)
+        return len(rows)
+
+    def resolve(self, name_or_ticker):
+        """Return the company name for a ticker, or the argument unchanged if it is not a ticker."""
+        return self._tickers.get(name_or_ticker, name_or_ticker)
+
+    def company_id(self, name):
+        """company_id of the named company, or None."""
+        return self._ids.get(name)
+
+    def name(self, company_id):
+        """Name of the company with this id, or None."""
+        return self._names.get(company_id)
+
+    def owner(self, name):
+        """owner_id of the named company, or None."""
+        return self._owners.get(name)
+
+    def ticker(self, name):
+        """Ticker of the named company, or None."""
+        return self._ticker_of.get(name)
+
+    def has_ticker(self, ticker):
+        return ticker in self._tickers
+
+    def __contains__(self, name):
+        return name in self._ids
+
+    def __len__(self):
+        return len(self._ids)
+
+    def add(self, company_id, name, owner_id, ticker=None):
+        self._ids[name] = company_id
+        self._names[company_id] = name
+        self._owners[name] = owner_id
+        self.set_ticker(name, ticker)
+
+    def set_ticker(self, name, ticker):
+        old = self._ticker_of.pop(name, None)
+        if old is not None:
+            self._tickers.pop(old, None)
+        if ticker:
+            self._tickers[ticker] = name
+            self._ticker_of[name] = ticker
+
+    def set_owner(self, name, owner_id):
+        if name in self._ids:
+            self._owners[name] = owner_id
+
+    def remove(self, name):
+        company_id = self._ids.pop(name, None)
+        self._names.pop(company_id, None)
+        self._owners.pop(name, None)
+        self.set_ticker(name, None)
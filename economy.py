@@ -1,57 +1,121 @@
 import discord
-import sqlite3
 import random
 import datetime
 from discord.ext import commands
 import asyncio
+from migrations import insert_default_tax_rate
+from ledger import GOVERNMENT, MINT, company_account, nation_account, user_account
+from checkpoints import balance_at, balance_history
+from payouts import airdrop
+from loans import DEFAULT_TERM_DAYS, issue_loan, repay
+from price_history import candles, record as record_prices, resource_series, share_series
 
 class Economy(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.conn = sqlite3.connect("game.db")
-        self.c = self.conn.cursor()
-        self.setup_economy()  # Ensure tables exist
-
-    def setup_economy(self):
-        """Create the economy-related database tables if they don’t exist."""
-        self.c.execute("""
-        CREATE TABLE IF NOT EXISTS tax_rate (
-            trade_rate REAL DEFAULT 0.05,
-            corporate_rate REAL DEFAULT 0.1,
-            capital_gains_rate REAL DEFAULT 0.15,
-            government_balance REAL DEFAULT 0
-    )
-    """)
-        self.c.execute("""
-        CREATE TABLE IF NOT EXISTS loans (
-            issuer INTEGER,
-            recipient INTEGER,
-            amount REAL,
-            interest REAL,
-            date_issued TEXT,
-            PRIMARY KEY (issuer, recipient)        
-    )
-            
-    """)
-        
-        self.conn.commit()
-        self.c.execute("SELECT COUNT(*) FROM tax_rate")
-        row_count = self.c.fetchone()[0]
-
-        if row_count == 0:
-            print("🔹 No tax rate found, inserting default values.")
-            self.c.execute("INSERT INTO tax_rate (trade_rate, corporate_rate,government_balance) VALUES (0.05, 0.1, 0)")
-            self.conn.commit()
-            
+        self.db = bot.db
+        self.directory = bot.directory
+        self.treasury = bot.treasury
+        self.ledger = bot.ledger
+
     @commands.command()
     @commands.has_role("RP Admin")
     async def reload_tax_table(self,ctx):
         """Reloads the tax table."""
-        self.c.execute("DROP TABLE tax_rate")
-        self.conn.commit()
-        self.setup_economy()
+        await self.treasury.flush()
+
+        def reset(cur):
+            row = cur.execute("SELECT government_balance FROM tax_rate").fetchone()
+            cur.execute("DELETE FROM tax_rate")
+            insert_default_tax_rate(cur)
+            return row[0] if row else 0
+
+        cleared = await self.db.transaction(reset)
+        self.treasury.invalidate()
+        self.ledger.post(MINT, GOVERNMENT, cleared, "tax table reset", ctx.command.name)
         await ctx.send("Tax table reloaded.")        
             
+    def ledger_account(self, holder):
+        """Ledger account for a member, a company name or ticker, 'government', or a foreign nation."""
+        if isinstance(holder, discord.Member):
+            return user_account(holder.id)
+        if holder.lower() == GOVERNMENT:
+            return GOVERNMENT
+        company_id = self.directory.company_id(self.directory.resolve(holder))
+        if company_id:
+            return company_account(company_id)
+        return nation_account(holder)
+
+    @commands.command()
+    @commands.has_role("RP Admin")
+    async def airdrop(self, ctx, amount: float, district: str = None):
+        """Credits every user, or every user in one district, with the same amount."""
+        if amount <= 0:
+            await ctx.send("⚠️ The amount must be positive.")
+            return
+        stats = await airdrop(self.db, f"airdrop-{ctx.message.id}", amount, district)
+        embed = discord.Embed(title="🪂 Airdrop Complete", color=discord.Color.green())
+        embed.add_field(name="Recipients", value=stats["paid"], inline=True)
+        embed.add_field(name="Total", value=f"${stats['total']:,.2f}", inline=True)
+        embed.add_field(name="Throughput", value=f"{stats['per_second']:,.0f} accounts/s", inline=True)
+        await ctx.send(embed=embed)
+
+    @commands.command(aliases=["bat"])
+    @commands.has_role("RP Admin")
+    async def balance_at(self, ctx, holder: discord.Member | str, date: str = None):
+        """Shows a user's, company's, nation's or the government's balance at the end of a day (YYYY-MM-DD)."""
+        at = None
+        if date:
+            try:
+                day = datetime.date.fromisoformat(date)
+            except ValueError:
+                await ctx.send("⚠️ The date must be in YYYY-MM-DD format.")
+                return
+            at = datetime.datetime.combine(day, datetime.time.max, datetime.timezone.utc)
+        account = self.ledger_account(holder)
+        balance = await balance_at(self.db, account, at)
+        embed = discord.Embed(title="🕰️ Historical Balance", color=discord.Color.blue())
+        embed.add_field(name="Account", value=account, inline=True)
+        embed.add_field(name="Date", value=date or "now", inline=True)
+        embed.add_field(name="Balance", value=f"**${balance:,.2f}**", inline=True)
+        await ctx.send(embed=embed)
+
+    @commands.command(aliases=["th"])
+    @commands.has_role("RP Admin")
+    async def treasury_history(self, ctx, days: int = 30):
+        """Shows the government's closing balance for each of the last few days."""
+        if days <= 0 or days > 90:
+            await ctx.send("⚠️ Choose between 1 and 90 days.")
+            return
+        history = await balance_history(self.db, GOVERNMENT, days)
+        lines = [f"{day}: ${balance:,.2f}" for day, balance in history]
+        embed = discord.Embed(title=f"🏛️ Treasury Over the Last {days} Days", description="```" + "\n".join(lines) + "```", color=discord.Color.gold())
+        await ctx.send(embed=embed)
+
+    @commands.command(aliases=["ph"])
+    async def price_history(self, ctx, name: str, resolution: str = "1d", days: int = 30):
+        """Shows open/high/low/close candles for a district's resource or a company's shares."""
+        if resolution not in ("1h", "1d", "1w") or days <= 0 or days > 90:
+            await ctx.send("⚠️ Use a resolution of 1h, 1d or 1w and between 1 and 90 days.")
+            return
+        if await self.db.fetchone("SELECT 1 FROM resources WHERE district = ?", (name,)):
+            series = resource_series(name)
+        else:
+            company_id = self.directory.company_id(self.directory.resolve(name))
+            if not company_id:
+                await ctx.send("⚠️ No district or company by that name.")
+                return
+            series = share_series(company_id)
+
+        end = datetime.datetime.now(datetime.timezone.utc)
+        rows = await candles(self.db, series, resolution, end - datetime.timedelta(days=days), end)
+        if not rows:
+            await ctx.send("⚠️ No prices recorded for that period yet.")
+            return
+        lines = [f"{bucket[:13].replace('T', ' ')}  O {o:,.2f}  H {h:,.2f}  L {l:,.2f}  C {c:,.2f}" for bucket, o, h, l, c in rows[-25:]]
+        embed = discord.Embed(title=f"📊 {name} ({resolution})", description="```" + "\n".join(lines) + "```", color=discord.Color.blue())
+        await ctx.send(embed=embed)
+
     @commands.command(aliases=['balance', 'bal'])
     async def b(self, ctx, member: discord.Member = None):
         """Check your balance or another user's balance."""
@@ -59,8 +123,7 @@ class Economy(commands.Cog):
         user = member if member else ctx.author  # Default to the command sender if no user is mentioned
         user_id = user.id
         # Fetch user balance
-        self.c.execute("SELECT balance FROM users WHERE user_id = ?", (user_id,))
-        row = self.c.fetchone()
+        row = await self.db.fetchone("SELECT balance FROM users WHERE user_id = ?", (user_id,))
         if row:
             embed = discord.Embed(title="Balance Check", color=discord.Color.green())
             embed.add_field(name="User", value=f"{user}", inline=True)
@@ -74,8 +137,7 @@ class Economy(commands.Cog):
         """Play a game of roulette with your balance."""
         user_id = ctx.author.id
         # Fetch user balance
-        self.c.execute("SELECT balance FROM users WHERE user_id = ?", (user_id,))
-        row = self.c.fetchone()
+        row = await self.db.fetchone("SELECT balance FROM users WHERE user_id = ?", (user_id,))
         if not row:
             await ctx.send("You need to join a district before playing roulette.")
             return
@@ -106,64 +168,39 @@ class Economy(commands.Cog):
             if number < 0 or number > 36:
                 await ctx.send("⚠️ The number must be between 0 and 36.")
                 return
-            # Deduct the bet amount from the user's balance
-            self.c.execute("UPDATE users SET balance = ? WHERE user_id = ?", (balance - amount, user_id))
-            self.conn.commit()
-            self.c.execute("SELECT balance FROM users WHERE user_id = ?", (user_id,))
-            row = self.c.fetchone()
-            balance = row[0]
+            balance -= amount
             winning_number = random.randint(0, 36)
             if winning_number == number and number != 0:
                 winnings = amount * 35
                 new_balance = balance + winnings
-                self.c.execute("UPDATE users SET balance = ? WHERE user_id = ?", (new_balance, user_id))
-                self.c.execute("UPDATE tax_rate SET government_balance = government_balance - ?", (winnings,))
-                self.conn.commit()
+                await self.settle_bet(ctx, user_id, winnings - amount, -winnings)
                 result_message = f"🎰 The ball landed on {winning_number}. You won ${winnings}! Your new balance is ${new_balance:.2f}."
             elif winning_number == number and number == 0:
                 winnings = amount * 100
                 new_balance = balance + winnings
-                self.c.execute("UPDATE users SET balance = ? WHERE user_id = ?", (new_balance, user_id))
-                self.c.execute("UPDATE tax_rate SET government_balance = government_balance - ?", (winnings,))
-                self.conn.commit()
+                await self.settle_bet(ctx, user_id, winnings - amount, -winnings)
                 result_message = f"🎰 The ball landed on {winning_number}. You won ${winnings}! Your new balance is ${new_balance:.2f}."
             else:
                 result_message = f"🎰 The ball landed on {winning_number}. You lost ${amount}! Your new balance is ${balance:.2f}."
-                self.c.execute("SELECT government_balance FROM tax_rate")
-                government_balance = self.c.fetchone()[0]
-                new_government_balance = government_balance + amount
-                self.c.execute("UPDATE tax_rate SET government_balance = ?", (new_government_balance,))
-                self.conn.commit()
+                await self.settle_bet(ctx, user_id, -amount, amount)
         elif color is not None:
-            self.c.execute("UPDATE users SET balance = ? WHERE user_id = ?", (balance - amount, user_id))
-            self.conn.commit()
-            self.c.execute("SELECT balance FROM users WHERE user_id = ?", (user_id,))
-            row = self.c.fetchone()
-            balance = row[0]
+            balance -= amount
             winning_color = random.choices(["red", "black", "green"], weights=[18, 18, 2], k=1)[0]
             if winning_color == color.lower() and winning_color != "green":
                 winnings = amount * 2
                 new_balance = balance + winnings
-                self.c.execute("UPDATE users SET balance = ? WHERE user_id = ?", (new_balance, user_id))
-                self.c.execute("UPDATE tax_rate SET government_balance = government_balance - ?", (winnings,))
-                self.conn.commit()
+                await self.settle_bet(ctx, user_id, winnings - amount, -winnings)
                 result_message = f"🎰 The ball landed on {winning_color}. You won ${winnings}! Your new balance is ${new_balance:.2f}."
             elif winning_color == color.lower() and winning_color == "green":
                 winnings = amount * 10
                 new_balance = balance + winnings
-                self.c.execute("UPDATE users SET balance = ? WHERE user_id = ?", (new_balance, user_id))
-                self.c.execute("UPDATE tax_rate SET government_balance = government_balance - ?", (winnings,))
-                self.conn.commit()
+                await self.settle_bet(ctx, user_id, winnings - amount, -winnings)
                 result_message = f"🎰 The ball landed on {winning_color}. You won ${winnings}! Your new balance is ${new_balance:.2f}."
             else:
-                new_balance = balance - amount
+                new_balance = balance
                 result_message = f"🎰 The ball landed on {winning_color}. You lost ${amount}! Your new balance is ${balance:.2f}."
                 # Add the lost amount to the government balance
-                self.c.execute("SELECT government_balance FROM tax_rate")
-                government_balance = self.c.fetchone()[0]
-                new_government_balance = government_balance + amount
-                self.c.execute("UPDATE tax_rate SET government_balance = ?", (new_government_balance,))
-                self.conn.commit()
+                await self.settle_bet(ctx, user_id, -amount, amount)
         else:
             await ctx.send("⚠️ You must bet on either a number or a color.")
             return
@@ -173,13 +210,19 @@ class Economy(commands.Cog):
         embed.add_field(name="Result", value=result_message, inline=False)
         await ctx.send(embed=embed)
         
+    async def settle_bet(self, ctx, user_id, user_delta, government_delta):
+        """Applies the whole outcome of a bet to the user in one write and credits the government its side."""
+        await self.db.execute("UPDATE users SET balance = balance + ? WHERE user_id = ?", (user_delta, user_id))
+        self.treasury.collect(government_delta, user_account(user_id), "bet", ctx.command.name)
+        # Whatever the government does not cover is paid by (or to) the house
+        self.ledger.post(user_account(user_id), MINT, user_delta + government_delta, "bet", ctx.command.name)
+
     @commands.command()
     async def slots(self, ctx, bet: float):
         """Plays a game of slots."""
         user_id = ctx.author.id
         # Fetch user balance
-        self.c.execute("SELECT balance FROM users WHERE user_id = ?", (user_id,))
-        row = self.c.fetchone()
+        row = await self.db.fetchone("SELECT balance FROM users WHERE user_id = ?", (user_id,))
         if not row:
             await ctx.send("You need to join a district before playing slots.")
             return
@@ -191,12 +234,7 @@ class Economy(commands.Cog):
             await ctx.send("⚠️ You don't have enough balance to bet that amount.")
             return
 
-        # Deduct the bet amount from the user's balance
-        self.c.execute("UPDATE users SET balance = ? WHERE user_id = ?", (balance - bet, user_id))
-        self.conn.commit()
-        self.c.execute("SELECT balance FROM users WHERE user_id = ?", (user_id,))
-        row = self.c.fetchone()
-        balance = row[0]
+        balance -= bet
 
         # Slot machine logic
         emojis = ["🍒", "🍋", "🍉", "🍇", "🍓", "⭐"]
@@ -206,22 +244,16 @@ class Economy(commands.Cog):
         if slots[0] == slots[1] == slots[2]:
             winnings = bet * 10
             new_balance = balance + winnings
-            self.c.execute("UPDATE users SET balance = ? WHERE user_id = ?", (new_balance, user_id))
-            self.conn.commit()
+            await self.settle_bet(ctx, user_id, winnings - bet, 0)
             result_message += f"🎉 You won ${winnings}! Your new balance is ${new_balance:.2f}."
         elif slots[0] == slots[1] or slots[1] == slots[2] or slots[0] == slots[2]:
             winnings = bet * 2
             new_balance = balance + winnings
-            self.c.execute("UPDATE users SET balance = ? WHERE user_id = ?", (new_balance, user_id))
-            self.conn.commit()
+            await self.settle_bet(ctx, user_id, winnings - bet, 0)
             result_message += f"🎉 You won ${winnings}! Your new balance is ${new_balance:.2f}."
         else:
             result_message += f"😢 You lost ${bet}. Your new balance is ${balance:.2f}."
-            self.c.execute("SELECT government_balance FROM tax_rate")
-            government_balance = self.c.fetchone()[0]
-            new_government_balance = government_balance + bet
-            self.c.execute("UPDATE tax_rate SET government_balance = ?", (new_government_balance,))
-            self.conn.commit()
+            await self.settle_bet(ctx, user_id, -bet, bet)
 
         # Send result in an embed
         embed = discord.Embed(title="Slots Result", color=discord.Color.green())
@@ -231,16 +263,14 @@ class Economy(commands.Cog):
     @commands.command(aliases=['balgov','bg'])
     async def government_balance(self, ctx):
         """Check the government's balance."""
-        self.c.execute("SELECT government_balance FROM tax_rate")
-        row = self.c.fetchone()
-        if row:
+        balance = await self.treasury.balance()
+        if balance is not None:
             embed = discord.Embed(title="Government Balance and Tax Rates", color=discord.Color.green())
-            embed.add_field(name="Balance", value=f"**${row[0]:.2f}** 💰", inline=True)
-            self.c.execute("SELECT trade_rate, corporate_rate, capital_gains_rate FROM tax_rate")
-            rates = self.c.fetchone()
-            embed.add_field(name="Trade Rate", value=f"{rates[0] * 100:.2f}%", inline=True)
-            embed.add_field(name="Corporate Rate", value=f"{rates[1] * 100:.2f}%", inline=True)
-            embed.add_field(name="Capital Gains Rate", value=f"{rates[2] * 100:.2f}%", inline=True)
+            embed.add_field(name="Balance", value=f"**${balance:.2f}** 💰", inline=True)
+            rates = await self.treasury.rates()
+            embed.add_field(name="Trade Rate", value=f"{rates['trade_rate'] * 100:.2f}%", inline=True)
+            embed.add_field(name="Corporate Rate", value=f"{rates['corporate_rate'] * 100:.2f}%", inline=True)
+            embed.add_field(name="Capital Gains Rate", value=f"{rates['capital_gains_rate'] * 100:.2f}%", inline=True)
             await ctx.send(embed=embed)
         else:
             await ctx.send("No government balance found.")
@@ -259,39 +289,31 @@ class Economy(commands.Cog):
             await ctx.send("⚠️ You must send a positive amount of money.")
             return
 
-        # Check if sender has enough balance
-        self.c.execute("SELECT balance FROM users WHERE user_id = ?", (sender_id,))
-        sender_balance = self.c.fetchone()
-        if not sender_balance or sender_balance[0] < amount:
-            await ctx.send("⚠️ You don't have enough balance to send that amount.")
-            return
-
         # Calculate tax
-        self.c.execute("SELECT trade_rate FROM tax_rate")
-        trade_rate = self.c.fetchone()[0]
+        trade_rate = await self.treasury.rate("trade_rate")
         tax_amount = amount * trade_rate
         net_amount = amount - tax_amount
 
-        # Update sender's balance
-        new_sender_balance = sender_balance[0] - amount
-        self.c.execute("UPDATE users SET balance = ? WHERE user_id = ?", (new_sender_balance, sender_id))
+        def transfer(cur):
+            # Debit the sender only if they can cover it, checked in the same statement
+            debited = cur.execute("UPDATE users SET balance = balance - ? WHERE user_id = ? AND balance >= ?",
+                                  (amount, sender_id, amount)).rowcount
+            if not debited:
+                return False
 
-        # Update recipient's balance
-        self.c.execute("SELECT balance FROM users WHERE user_id = ?", (recipient_id,))
-        recipient_balance = self.c.fetchone()
-        if recipient_balance:
-            new_recipient_balance = recipient_balance[0] + net_amount
-            self.c.execute("UPDATE users SET balance = ? WHERE user_id = ?", (new_recipient_balance, recipient_id))
-        else:
-            self.c.execute("INSERT INTO users (user_id, balance) VALUES (?, ?)", (recipient_id, net_amount))
+            cur.execute(
+                "INSERT INTO users (user_id, balance) VALUES (?, ?) "
+                "ON CONFLICT (user_id) DO UPDATE SET balance = balance + excluded.balance",
+                (recipient_id, net_amount)
+            )
+            return True
 
-        # Update government balance
-        self.c.execute("SELECT government_balance FROM tax_rate")
-        government_balance = self.c.fetchone()[0]
-        new_government_balance = government_balance + tax_amount
-        self.c.execute("UPDATE tax_rate SET government_balance = ?", (new_government_balance,))
+        if not await self.db.transaction(transfer):
+            await ctx.send("⚠️ You don't have enough balance to send that amount.")
+            return
 
-        self.conn.commit()
+        self.ledger.post(user_account(recipient_id), user_account(sender_id), net_amount, "transfer", ctx.command.name)
+        self.treasury.collect(tax_amount, user_account(sender_id), "trade tax", ctx.command.name)
 
         embed = discord.Embed(title="Transaction Complete", color=discord.Color.green())
         embed.add_field(name="Sender", value=f"{ctx.author}", inline=True)
@@ -310,15 +332,15 @@ class Economy(commands.Cog):
             await ctx.send("⚠️ The percentage must be positive.")
             return
 
-        self.c.execute("SELECT price_per_unit FROM resources WHERE resource = ?", (resource,))
-        row = self.c.fetchone()
+        row = await self.db.fetchone("SELECT price_per_unit FROM resources WHERE resource = ?", (resource,))
         if not row:
             await ctx.send("⚠️ Invalid resource.")
             return
 
         new_price = row[0] * (1 - percent / 100)
-        self.c.execute("UPDATE resources SET price_per_unit = ? WHERE resource = ?", (new_price, resource))
-        self.conn.commit()
+        await self.db.execute("UPDATE resources SET price_per_unit = ? WHERE resource = ?", (new_price, resource))
+        districts = await self.db.fetchall("SELECT district FROM resources WHERE resource = ?", (resource,))
+        await record_prices(self.db, [(resource_series(district), new_price) for (district,) in districts])
 
         channel = self.bot.get_channel(1345074664850067527)  # Replace with your channel ID
         previous_price = row[0]
@@ -330,11 +352,13 @@ class Economy(commands.Cog):
         await channel.send(embed=embed)
 
     @commands.command()
-    async def loan(self, ctx, sender: discord.Member | str, receiver: discord.Member | str, amount: float, interest: float):
+    async def loan(self, ctx, sender: discord.Member | str, receiver: discord.Member | str, amount: float, interest: float, term_days: int = DEFAULT_TERM_DAYS):
+        """Lends money between users and companies, repaid in weekly installments over term_days with interest accruing daily."""
         scomp = False
         rcomp = False
         suser = False
         ruser = False
+        sender_id = receiver_id = None
         today = datetime.date.today()
         
         if isinstance(sender, discord.Member):
@@ -348,18 +372,12 @@ class Economy(commands.Cog):
             receiver_id = receiver.id
             receiver = receiver_id
         
-        self.c.execute("SELECT company_id FROM companies WHERE ticker = ?", (sender,))
-        ticker_result = self.c.fetchone()
-        
-        if ticker_result:
-            sender_id = ticker_result[0]
+        if self.directory.has_ticker(sender):
+            sender_id = self.directory.company_id(self.directory.resolve(sender))
             scomp = True
         
-        self.c.execute("SELECT company_id FROM companies WHERE ticker = ?", (receiver,))
-        ticker_result = self.c.fetchone()
-        
-        if ticker_result:
-            receiver_id = ticker_result[0]
+        if self.directory.has_ticker(receiver):
+            receiver_id = self.directory.company_id(self.directory.resolve(receiver))
             rcomp = True
         
         print(sender, receiver)
@@ -368,8 +386,8 @@ class Economy(commands.Cog):
             await ctx.send("⚠️ Invalid sender or receiver.")
             return
         
-        if amount <= 0 or interest <= 0:
-            await ctx.send("⚠️ The amount and interest must be positive.")
+        if amount <= 0 or interest <= 0 or term_days <= 0:
+            await ctx.send("⚠️ The amount, interest and term must be positive.")
             return
         
         channel_id = self.bot.get_channel(1343374601631043727)  # Replace with your channel ID
@@ -377,20 +395,18 @@ class Economy(commands.Cog):
         if scomp and rcomp:
             print(1)
             # Check if the sender company has enough balance
-            self.c.execute("SELECT balance FROM companies WHERE company_id = ?", (sender,))
-            sender_balance = self.c.fetchone()[0]
+            sender_balance = (await self.db.fetchone("SELECT balance FROM companies WHERE company_id = ?", (sender_id,)))[0]
             if sender_balance < amount:
                 await ctx.send("⚠️ The sender company doesn't have enough balance to issue the loan.")
                 return
             # Ask the receiver company if they want to proceed with the loan
-            self.c.execute("SELECT owner_id FROM companies WHERE company_id = ?", (receiver,))
-            owner_id = self.c.fetchone()[0]
+            owner_id = self.directory.owner(self.directory.resolve(receiver))
             user = self.bot.get_user(owner_id)
             
             await ctx.send(f"{user.mention}, do you want to proceed with the loan? (yes/no)")
 
             def check(m):
-                return m.author == user and m.channel == channel_id.channel and m.content.lower() in ["yes", "no"]
+                return m.author == user and m.channel == ctx.channel and m.content.lower() in ["yes", "no"]
             
             try:
                 msg = await self.bot.wait_for('message', check=check, timeout=60.0)
@@ -405,13 +421,22 @@ class Economy(commands.Cog):
                 embed.add_field(name="Loan Status", value="The loan has been declined.", inline=False)
                 await channel_id.send(embed=embed)
                 return
-            # Insert the loan into the loans table
-            self.c.execute("INSERT INTO loans (issuer, recipient, amount, interest, date_issued) VALUES (?, ?, ?, ?)", (sender, receiver, amount, interest, today))
-            # Update the sender company's balance
-            self.c.execute("UPDATE companies SET balance = balance - ? WHERE company_id = ?", (amount, sender))
-            # Update the receiver company's balance
-            self.c.execute("UPDATE companies SET balance = balance + ? WHERE company_id = ?", (amount, receiver))
-            self.conn.commit()
+            def record(cur):
+                # Debit the sender company only if it still has the balance after the wait, checked in the same statement
+                debited = cur.execute("UPDATE companies SET balance = balance - ? WHERE company_id = ? AND balance >= ?",
+                                      (amount, sender_id, amount)).rowcount
+                if not debited:
+                    return False
+                # Insert the loan into the loans table
+                issue_loan(cur, company_account(sender_id), company_account(receiver_id), amount, interest, term_days, today)
+                # Update the receiver company's balance
+                cur.execute("UPDATE companies SET balance = balance + ? WHERE company_id = ?", (amount, receiver_id))
+                return True
+
+            if not await self.db.transaction(record):
+                await ctx.send("⚠️ The sender company doesn't have enough balance to issue the loan.")
+                return
+            self.ledger.post(company_account(receiver_id), company_account(sender_id), amount, "loan", ctx.command.name)
             embed = discord.Embed(title="Loan Recorded", color=discord.Color.green())
             embed.add_field(name="Amount", value=f"${amount}", inline=True)
             embed.add_field(name="Interest", value=f"{interest}%", inline=True)
@@ -422,8 +447,7 @@ class Economy(commands.Cog):
         if scomp and ruser:
             print(2)
             # Check if the sender company has enough balance
-            self.c.execute("SELECT balance FROM companies WHERE company_id = ?", (sender,))
-            sender_balance = self.c.fetchone()[0]
+            sender_balance = (await self.db.fetchone("SELECT balance FROM companies WHERE company_id = ?", (sender_id,)))[0]
             if sender_balance < amount:
                 await ctx.send("⚠️ The sender company doesn't have enough balance to issue the loan.")
                 return
@@ -446,13 +470,22 @@ class Economy(commands.Cog):
                 await channel_id.send(embed=embed)
                 return
             
-            # Insert the loan into the loans table
-            self.c.execute("INSERT INTO loans (issuer, recipient, amount, interest, date_issued) VALUES (?, ?, ?, ?)", (sender, receiver, amount, interest, today))
-            # Update the sender company's balance
-            self.c.execute("UPDATE companies SET balance = balance - ? WHERE company_id = ?", (amount, sender))
-            # Update the receiver user's balance
-            self.c.execute("UPDATE users SET balance = balance + ? WHERE user_id = ?", (amount, receiver))
-            self.conn.commit()
+            def record(cur):
+                # Debit the sender company only if it still has the balance after the wait, checked in the same statement
+                debited = cur.execute("UPDATE companies SET balance = balance - ? WHERE company_id = ? AND balance >= ?",
+                                      (amount, sender_id, amount)).rowcount
+                if not debited:
+                    return False
+                # Insert the loan into the loans table
+                issue_loan(cur, company_account(sender_id), user_account(receiver_id), amount, interest, term_days, today)
+                # Update the receiver user's balance
+                cur.execute("UPDATE users SET balance = balance + ? WHERE user_id = ?", (amount, receiver_id))
+                return True
+
+            if not await self.db.transaction(record):
+                await ctx.send("⚠️ The sender company doesn't have enough balance to issue the loan.")
+                return
+            self.ledger.post(user_account(receiver_id), company_account(sender_id), amount, "loan", ctx.command.name)
             embed = discord.Embed(title="Loan Recorded", color=discord.Color.green())
             embed.add_field(name="Amount", value=f"${amount}", inline=True)
             embed.add_field(name="Interest", value=f"{interest}%", inline=True)
@@ -463,14 +496,12 @@ class Economy(commands.Cog):
         if suser and rcomp:
             print(3)
             # Check if the sender user has enough balance
-            self.c.execute("SELECT balance FROM users WHERE user_id = ?", (sender,))
-            sender_balance = self.c.fetchone()[0]
+            sender_balance = (await self.db.fetchone("SELECT balance FROM users WHERE user_id = ?", (sender_id,)))[0]
             if sender_balance < amount:
                 await ctx.send("⚠️ The sender user doesn't have enough balance to issue the loan.")
                 return
             # Ask the receiver company if they want to proceed with the loan
-            self.c.execute("SELECT owner_id FROM companies WHERE company_id = ?", (receiver,))
-            owner_id = self.c.fetchone()[0]
+            owner_id = self.directory.owner(self.directory.resolve(receiver))
             user = self.bot.get_user(owner_id)
             await channel_id.send(f"{user.mention}, do you want to proceed with the loan? (yes/no)")
 
@@ -490,13 +521,22 @@ class Economy(commands.Cog):
                 embed.add_field(name="Loan Status", value="The loan has been declined.", inline=False)
                 await channel_id.send(embed=embed)
                 return
-            # Insert the loan into the loans table
-            self.c.execute("INSERT INTO loans (issuer, recipient, amount, interest, date_issued) VALUES (?, ?, ?, ?)", (sender, receiver, amount, interest, today))
-            # Update the sender user's balance
-            self.c.execute("UPDATE users SET balance = balance - ? WHERE user_id = ?", (amount, sender))
-            # Update the receiver company's balance
-            self.c.execute("UPDATE companies SET balance = balance + ? WHERE company_id = ?", (amount, receiver))
-            self.conn.commit()
+            def record(cur):
+                # Debit the sender user only if they still have the balance after the wait, checked in the same statement
+                debited = cur.execute("UPDATE users SET balance = balance - ? WHERE user_id = ? AND balance >= ?",
+                                      (amount, sender_id, amount)).rowcount
+                if not debited:
+                    return False
+                # Insert the loan into the loans table
+                issue_loan(cur, user_account(sender_id), company_account(receiver_id), amount, interest, term_days, today)
+                # Update the receiver company's balance
+                cur.execute("UPDATE companies SET balance = balance + ? WHERE company_id = ?", (amount, receiver_id))
+                return True
+
+            if not await self.db.transaction(record):
+                await ctx.send("⚠️ The sender user doesn't have enough balance to issue the loan.")
+                return
+            self.ledger.post(company_account(receiver_id), user_account(sender_id), amount, "loan", ctx.command.name)
             embed = discord.Embed(title="Loan Recorded", color=discord.Color.green())
             embed.add_field(name="Amount", value=f"${amount}", inline=True)
             embed.add_field(name="Interest", value=f"{interest}%", inline=True)
@@ -507,8 +547,7 @@ class Economy(commands.Cog):
         if suser and ruser:
             print(4)
             # Check if the sender user has enough balance
-            self.c.execute("SELECT balance FROM users WHERE user_id = ?", (sender,))
-            sender_balance = self.c.fetchone()[0]
+            sender_balance = (await self.db.fetchone("SELECT balance FROM users WHERE user_id = ?", (sender_id,)))[0]
             if sender_balance < amount:
                 await ctx.send("⚠️ The sender user doesn't have enough balance to issue the loan.")
                 return
@@ -532,13 +571,22 @@ class Economy(commands.Cog):
                 embed.add_field(name="Message", value="The loan has been declined.", inline=False)
                 await channel_id.send(embed=embed)
                 return
-            # Insert the loan into the loans table
-            self.c.execute("INSERT INTO loans (issuer, recipient, amount, interest, date_issued) VALUES (?, ?, ?, ?)", (sender, receiver, amount, interest, today))
-            # Update the sender user's balance
-            self.c.execute("UPDATE users SET balance = balance - ? WHERE user_id = ?", (amount, sender))
-            # Update the receiver user's balance
-            self.c.execute("UPDATE users SET balance = balance + ? WHERE user_id = ?", (amount, receiver))
-            self.conn.commit()
+            def record(cur):
+                # Debit the sender user only if they still have the balance after the wait, checked in the same statement
+                debited = cur.execute("UPDATE users SET balance = balance - ? WHERE user_id = ? AND balance >= ?",
+                                      (amount, sender_id, amount)).rowcount
+                if not debited:
+                    return False
+                # Insert the loan into the loans table
+                issue_loan(cur, user_account(sender_id), user_account(receiver_id), amount, interest, term_days, today)
+                # Update the receiver user's balance
+                cur.execute("UPDATE users SET balance = balance + ? WHERE user_id = ?", (amount, receiver_id))
+                return True
+
+            if not await self.db.transaction(record):
+                await ctx.send("⚠️ The sender user doesn't have enough balance to issue the loan.")
+                return
+            self.ledger.post(user_account(receiver_id), user_account(sender_id), amount, "loan", ctx.command.name)
             embed = discord.Embed(title="Loan Recorded", color=discord.Color.green())
             embed.add_field(name="Amount", value=f"${amount}", inline=True)
             embed.add_field(name="Interest", value=f"{interest}%", inline=True)
@@ -547,15 +595,29 @@ class Economy(commands.Cog):
             await channel_id.send(embed=embed) 
          
     @commands.command()
-    async def pay_loan(self, ctx, issuer: str, amount: float):
-        receiver = ctx.author.id
-        today = datetime.date.today()
-        self.c.execute("SELECT company_id FROM companies WHERE ticker = ?", (issuer,))
-        ticker_result = self.c.fetchone()
-        if ticker_result:
-            issuer = ticker_result[0]
-        
-                
+    async def pay_loan(self, ctx, issuer: discord.Member | str, amount: float):
+        """Pays money off your loans from a user or company, interest first and oldest loan first."""
+        if amount <= 0:
+            await ctx.send("⚠️ You must pay a positive amount.")
+            return
+        lender = self.ledger_account(issuer)
+        borrower = user_account(ctx.author.id)
+
+        paid = await repay(self.db, lender, borrower, amount)
+        if paid <= 0:
+            if await self.db.fetchone("SELECT 1 FROM loans WHERE lender = ? AND borrower = ? AND status = 'open'", (lender, borrower)):
+                await ctx.send("⚠️ You don't have any balance to pay with.")
+            else:
+                await ctx.send("⚠️ You have no open loans from that lender.")
+            return
+        remaining = await self.db.fetchone(
+            "SELECT COALESCE(SUM(balance + accrued), 0) FROM loans WHERE borrower = ? AND lender = ? AND status = 'open'", (borrower, lender)
+        )
+        embed = discord.Embed(title="🏦 Loan Payment", color=discord.Color.green())
+        embed.add_field(name="Paid", value=f"${paid:,.2f}", inline=True)
+        embed.add_field(name="Still Owed", value=f"${remaining[0]:,.2f}", inline=True)
+        await ctx.send(embed=embed)
+
 
 async def setup(bot):
     await bot.add_cog(Economy(bot))
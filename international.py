@@ -0,0 +1,76 @@
+"""Foreign nations buying off the national market, one batched tick at a time.
+
+``buy_tick`` runs the whole tick in one transaction: it snapshots the nations, the
+open sell orders and the resource prices with three queries, draws every nation's
+decision at once with NumPy, checks the chosen orders against what earlier buyers
+in the same tick already took, and settles all purchases with one ``executemany``
+per table. The number of round trips is the same for 5 nations or 500, and for 10
+listings or 10,000.
+
+The tick returns its events for the caller to post to the ledger and publish once
+the transaction has committed:
+
+- ``("bought", nation, comp_id, company, resource, units, cost)``
+- ``("refused", nation, comp_id, company, resource, price_per_unit, base_price)``,
+  when the listing costs more than ``PRICE_CAP`` times the resource's price.
+"""
+import numpy as np
+
+BUY_CHANCE = 0.125
+PRICE_CAP = 4.0
+
+MARKET_SQL = """
+SELECT nm.order_id, nm.comp_id, c.name, nm.resource, nm.amount, nm.price_per_unit
+FROM national_market nm JOIN companies c ON c.company_id = nm.comp_id
+ORDER BY nm.order_id
+"""
+
+
+def _buy_tick(cur, rng):
+    nations = [row[0] for row in cur.execute("SELECT nation FROM foreign_nations ORDER BY nation")]
+    orders = cur.execute(MARKET_SQL).fetchall()
+    if not nations or not orders:
+        return []
+    base_prices = {}
+    for resource, price in cur.execute("SELECT resource, price_per_unit FROM resources ORDER BY rowid"):
+        base_prices.setdefault(resource, price)
+
+    # Every nation's draw at once: whether it buys, which order, and what share of it
+    buying = rng.random(len(nations)) < BUY_CHANCE
+    picks = rng.integers(0, len(orders), len(nations))
+    shares = rng.random(len(nations))
+
+    remaining = {order_id: amount for order_id, _, _, _, amount, _ in orders}
+    sold, earned, spent = {}, {}, {}
+    events = []
+    for n in np.flatnonzero(buying):
+        nation = nations[n]
+        order_id, comp_id, company, resource, amount, price_per_unit = orders[picks[n]]
+        base_price = base_prices.get(resource)
+        if base_price is not None and price_per_unit > PRICE_CAP * base_price:
+            events.append(("refused", nation, comp_id, company, resource, price_per_unit, base_price))
+            continue
+        units = min(1 + int(shares[n] * amount), remaining[order_id])
+        if units <= 0:
+            continue  # Bought out earlier in this tick
+        cost = units * price_per_unit
+        remaining[order_id] -= units
+        sold[order_id] = sold.get(order_id, 0) + units
+        earned[comp_id] = earned.get(comp_id, 0.0) + cost
+        spent[nation] = spent.get(nation, 0.0) + cost
+        events.append(("bought", nation, comp_id, company, resource, units, cost))
+
+    if sold:
+        cur.executemany("UPDATE national_market SET amount = amount - ? WHERE order_id = ?",
+                        [(units, order_id) for order_id, units in sold.items()])
+        cur.executemany("DELETE FROM national_market WHERE order_id = ? AND amount <= 0", [(order_id,) for order_id in sold])
+        cur.executemany("UPDATE companies SET balance = balance + ? WHERE company_id = ?",
+                        [(amount, comp_id) for comp_id, amount in earned.items()])
+        cur.executemany("UPDATE foreign_nations SET balance = balance - ? WHERE nation = ?",
+                        [(amount, nation) for nation, amount in spent.items()])
+    return events
+
+
+async def buy_tick(db, rng=None):
+    """Let every foreign nation maybe buy one listing; returns the tick's events."""
+    return await db.transaction(_buy_tick, rng or np.random.default_rng())
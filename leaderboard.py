@@ -0,0 +1,65 @@
+"""Cached top-k rankings for the wealth and company leaderboards.
+
+Each board keeps its ranked list in memory together with the version of the
+tables it ranks (``TABLES``) at the time it was built. A request is served from
+memory while none of those tables has been written since and the entry is younger
+than ``ttl`` seconds; otherwise the board is rebuilt once and cached again. Writes
+elsewhere, such as ledger and treasury flushes, leave the boards alone.
+"""
+import heapq
+import time
+
+from networth import richest_users
+from valuation import materialized_values
+
+# Balances, holdings and valuations: everything net worths and company NAVs are read from.
+TABLES = ("users", "holdings", "companies", "company_valuations")
+
+
+class LeaderboardCache:
+    def __init__(self, db, ttl=60, size=25):
+        self.db = db
+        self.ttl = ttl
+        self.size = size  # Entries kept per board; requests for more bypass the cache
+        self.hits = 0
+        self.misses = 0
+        self._boards = {}
+
+    async def _ranked(self, board, build, k):
+        if k > self.size:
+            self.misses += 1
+            return await build(k)
+        entry = self._boards.get(board)
+        now = time.monotonic()
+        if entry and entry[0] == self.db.version(*TABLES) and now < entry[1]:
+            self.hits += 1
+            return entry[2][:k]
+
+        self.misses += 1
+        version = self.db.version(*TABLES)  # Read before building so a concurrent write invalidates the result
+        ranked = await build(self.size)
+        self._boards[board] = (version, now + self.ttl, ranked)
+        return ranked[:k]
+
+    async def _top_companies(self, k):
+        values = await materialized_values(self.db)
+        return heapq.nlargest(k, values.items(), key=lambda item: item[1])
+
+    async def richest_users(self, k=10):
+        """[(user_id, net_worth)] for the k richest users, richest first."""
+        return await self._ranked("users", lambda n: richest_users(self.db, n), k)
+
+    async def top_companies(self, k=5):
+        """[(company_name, nav)] for the k most valuable companies, most valuable first."""
+        return await self._ranked("companies", self._top_companies, k)
+
+    def invalidate(self):
+        self._boards.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
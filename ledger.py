@@ -0,0 +1,68 @@
+"""Append-only double-entry record of every money movement.
+
+Each entry moves ``amount`` from the ``credit`` account to the ``debit`` account, so
+summing debits minus credits for an account reconstructs its balance changes.
+Accounts are strings:
+
+    user:<user_id>   company:<company_id>   nation:<name>   government   mint   escrow
+
+``mint`` is the world outside the economy. Money the game creates (UBI, starting
+balances, admin grants, house winnings) is credited to it, and money the game
+destroys is debited to it, so the whole ledger always balances. ``escrow`` holds the
+cash behind open share bids until they fill or are cancelled.
+
+Commands post entries after their transaction commits. Entries are buffered in
+memory and written with one ``executemany`` per batch, when the buffer fills, by a
+scheduled job and on shutdown. Posting never waits on the database.
+"""
+import asyncio
+import datetime
+
+GOVERNMENT = "government"
+MINT = "mint"
+ESCROW = "escrow"
+
+INSERT_SQL = "INSERT INTO ledger (posted_at, debit, credit, amount, reason, command) VALUES (?, ?, ?, ?, ?, ?)"
+
+
+def user_account(user_id):
+    return f"user:{user_id}"
+
+
+def company_account(company_id):
+    return f"company:{company_id}"
+
+
+def nation_account(nation):
+    return f"nation:{nation}"
+
+
+class Ledger:
+    def __init__(self, db, batch_size=500):
+        self.db = db
+        self.batch_size = batch_size
+        self._pending = []
+        self._flushing = None
+
+    def post(self, debit, credit, amount, reason, command=None):
+        """Record ``amount`` moving from ``credit`` to ``debit``. Call only once the move has committed."""
+        if not amount:
+            return
+        if amount < 0:
+            debit, credit, amount = credit, debit, -amount
+        posted_at = datetime.datetime.now(datetime.timezone.utc).isoformat()
+        self._pending.append((posted_at, debit, credit, amount, reason, command))
+        if len(self._pending) >= self.batch_size and (self._flushing is None or self._flushing.done()):
+            self._flushing = asyncio.get_running_loop().create_task(self.flush())
+
+    async def flush(self):
+        """Write every buffered entry in one batch; returns the number written."""
+        entries, self._pending = self._pending, []
+        if not entries:
+            return 0
+        try:
+            await self.db.executemany(INSERT_SQL, entries)
+        except Exception:
+            self._pending[:0] = entries  # Keep them, in order, for the next flush
+            raise
+        return len(entries)
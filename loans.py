@@ -0,0 +1,218 @@
+"""Loan book: issuance with an amortization schedule, daily interest accrual and collection.
+
+Lenders and borrowers are ledger accounts (``user:<id>`` or ``company:<id>``). A loan
+of ``principal`` at ``rate`` percent a year is repaid in equal principal installments,
+one every ``INSTALLMENT_DAYS`` days over its term. The schedule is written at
+issuance and indexed by due date. Interest accrues daily on the outstanding
+balance, and each collected installment also settles the interest accrued so far.
+
+``accrue_interest`` prices the whole open book in one NumPy pass. ``collect_due``
+settles every due installment in a single transaction. Both use a fixed number of
+statements however many loans there are.
+"""
+import datetime
+import math
+
+import numpy as np
+
+from ledger import INSERT_SQL, company_account, user_account
+
+INSTALLMENT_DAYS = 7
+DEFAULT_TERM_DAYS = 28
+DAYS_PER_YEAR = 365
+PAID_OFF = 0.005  # Balances below half a cent count as repaid
+
+DUE_SQL = """
+SELECT s.loan_id, s.installment, s.principal, l.lender, l.borrower, l.balance, l.accrued
+FROM loan_schedule s
+JOIN loans l ON l.loan_id = s.loan_id
+WHERE s.due_date <= ? AND s.paid_at IS NULL
+ORDER BY s.due_date, s.loan_id, s.installment
+"""
+
+
+def _today():
+    return datetime.date.today().isoformat()
+
+
+def _split(account):
+    kind, _, key = account.partition(":")
+    return kind, int(key)
+
+
+def schedule(principal, issued, term_days=DEFAULT_TERM_DAYS):
+    """[(installment, due_date, principal part)] for a loan issued on ``issued`` (a date)."""
+    count = max(1, math.ceil(term_days / INSTALLMENT_DAYS))
+    offsets = np.minimum(np.arange(1, count + 1) * INSTALLMENT_DAYS, term_days)
+    due = np.datetime64(issued, "D") + offsets
+    parts = np.full(count, round(principal / count, 2))
+    parts[-1] = principal - parts[:-1].sum()  # The last installment absorbs the rounding
+    return [(i + 1, str(d), float(p)) for i, (d, p) in enumerate(zip(due, parts))]
+
+
+def issue_loan(cur, lender, borrower, principal, rate, term_days=DEFAULT_TERM_DAYS, issued=None):
+    """Record a loan and its repayment schedule inside the caller's transaction; returns the loan_id.
+
+    Moving the principal itself is left to the caller.
+    """
+    issued = issued or datetime.date.today()
+    loan_id = cur.execute(
+        "INSERT INTO loans (lender, borrower, principal, rate, date_issued, term_days, balance, accrued_through) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        (lender, borrower, principal, rate, issued.isoformat(), term_days, principal, issued.isoformat())
+    ).lastrowid
+    cur.executemany(
+        "INSERT INTO loan_schedule (loan_id, installment, due_date, principal) VALUES (?, ?, ?, ?)",
+        [(loan_id, *installment) for installment in schedule(principal, issued, term_days)]
+    )
+    return loan_id
+
+
+def _accrue(cur, today):
+    rows = cur.execute("SELECT loan_id, balance, rate, accrued_through FROM loans WHERE status = 'open'").fetchall()
+    if not rows:
+        return 0
+    loan_ids = np.array([row[0] for row in rows], dtype=np.int64)
+    balance = np.array([row[1] for row in rows], dtype=float)
+    rate = np.array([row[2] for row in rows], dtype=float)
+    through = np.array([row[3] for row in rows], dtype="datetime64[D]")
+    elapsed = (np.datetime64(today, "D") - through).astype(np.int64)
+    due = elapsed > 0
+    interest = balance * rate / 100 / DAYS_PER_YEAR * elapsed
+    cur.executemany(
+        "UPDATE loans SET accrued = accrued + ?, accrued_through = ? WHERE loan_id = ?",
+        zip(interest[due].tolist(), [today] * int(due.sum()), loan_ids[due].tolist())
+    )
+    return int(due.sum())
+
+
+async def accrue_interest(db, today=None):
+    """Accrue interest on every open loan up to ``today``; returns the number of loans updated."""
+    return await db.transaction(_accrue, today or _today())
+
+
+def _balances(cur, accounts):
+    """{account: balance} for a set of user and company accounts, in two queries."""
+    keys = {"user": [], "company": []}
+    for account in accounts:
+        kind, key = _split(account)
+        keys[kind].append(key)
+    balances = {}
+    for user_id, balance in cur.execute(
+        "SELECT user_id, balance FROM users WHERE user_id IN (SELECT value FROM json_each(?))", (str(keys["user"]),)
+    ):
+        balances[user_account(user_id)] = balance
+    for company_id, balance in cur.execute(
+        "SELECT company_id, balance FROM companies WHERE company_id IN (SELECT value FROM json_each(?))", (str(keys["company"]),)
+    ):
+        balances[company_account(company_id)] = balance
+    return balances
+
+
+def _move_money(cur, deltas):
+    """Apply {account: delta} to users and companies with one executemany each."""
+    users, companies = [], []
+    for account, delta in deltas.items():
+        kind, key = _split(account)
+        (users if kind == "user" else companies).append((delta, key))
+    cur.executemany("UPDATE users SET balance = balance + ? WHERE user_id = ?", users)
+    cur.executemany("UPDATE companies SET balance = balance + ? WHERE company_id = ?", companies)
+
+
+def _collect(cur, today):
+    loans = {}
+    for loan_id, installment, part, lender, borrower, balance, accrued in cur.execute(DUE_SQL, (today,)):
+        loan = loans.setdefault(loan_id, {"lender": lender, "borrower": borrower, "balance": balance,
+                                          "accrued": accrued, "principal": 0.0, "installments": []})
+        loan["principal"] += part
+        loan["installments"].append(installment)
+    if not loans:
+        return {"collected": 0, "overdue": 0, "amount": 0.0}
+
+    available = _balances(cur, {loan["borrower"] for loan in loans.values()})
+    posted_at = datetime.datetime.now(datetime.timezone.utc).isoformat()
+    deltas, loan_updates, installments, repaid, entries = {}, [], [], [], []
+    overdue = 0
+    for loan_id, loan in loans.items():
+        principal = min(loan["principal"], loan["balance"])
+        payment = principal + loan["accrued"]
+        if available.get(loan["borrower"], 0) < payment:
+            overdue += 1  # Stays due and is retried on the next run
+            continue
+        available[loan["borrower"]] -= payment
+        deltas[loan["borrower"]] = deltas.get(loan["borrower"], 0) - payment
+        deltas[loan["lender"]] = deltas.get(loan["lender"], 0) + payment
+        loan_updates.append((principal, loan["accrued"], principal, PAID_OFF, loan_id))
+        installments.extend((today, loan_id, installment) for installment in loan["installments"])
+        if loan["balance"] - principal <= PAID_OFF:
+            repaid.append((today, loan_id))
+        entries.append((posted_at, loan["lender"], loan["borrower"], principal, "loan repayment", "collect_loans"))
+        entries.append((posted_at, loan["lender"], loan["borrower"], loan["accrued"], "loan interest", "collect_loans"))
+
+    _move_money(cur, deltas)
+    cur.executemany(
+        "UPDATE loans SET balance = balance - ?, accrued = accrued - ?, "
+        "status = CASE WHEN balance - ? <= ? THEN 'repaid' ELSE status END WHERE loan_id = ?",
+        loan_updates
+    )
+    cur.executemany("UPDATE loan_schedule SET paid_at = ? WHERE loan_id = ? AND installment = ?", installments)
+    # A loan repaid early has nothing left to collect on its later installments
+    cur.executemany("UPDATE loan_schedule SET paid_at = ? WHERE loan_id = ? AND paid_at IS NULL", repaid)
+    cur.executemany(INSERT_SQL, [entry for entry in entries if entry[3] > 0])
+    return {"collected": len(loan_updates), "overdue": overdue, "amount": sum(-d for d in deltas.values() if d < 0)}
+
+
+async def collect_due(db, today=None):
+    """Collect every installment due by ``today`` in one transaction.
+
+    Returns {"collected", "overdue", "amount"}. A borrower who cannot cover a payment in
+    full pays nothing for that loan this run.
+    """
+    return await db.transaction(_collect, today or _today())
+
+
+def _repay(cur, lender, borrower, amount, today):
+    amount = min(amount, max(_balances(cur, {borrower}).get(borrower, 0.0), 0.0))  # Never pay with money the borrower lacks
+    paid = 0.0
+    entries = []
+    posted_at = datetime.datetime.now(datetime.timezone.utc).isoformat()
+    loans = cur.execute(
+        "SELECT loan_id, balance, accrued FROM loans WHERE lender = ? AND borrower = ? AND status = 'open' ORDER BY loan_id",
+        (lender, borrower)
+    ).fetchall()
+    for loan_id, balance, accrued in loans:
+        interest = min(amount - paid, accrued)
+        principal = min(amount - paid - interest, balance)
+        if interest + principal <= 0:
+            break
+        paid += interest + principal
+        cur.execute(
+            "UPDATE loans SET balance = balance - ?, accrued = accrued - ?, "
+            "status = CASE WHEN balance - ? <= ? THEN 'repaid' ELSE status END WHERE loan_id = ?",
+            (principal, interest, principal, PAID_OFF, loan_id)
+        )
+        if balance - principal <= PAID_OFF:
+            cur.execute("UPDATE loan_schedule SET paid_at = ? WHERE loan_id = ? AND paid_at IS NULL", (today, loan_id))
+        entries.append((posted_at, lender, borrower, principal, "loan repayment", "pay_loan"))
+        entries.append((posted_at, lender, borrower, interest, "loan interest", "pay_loan"))
+    _move_money(cur, {borrower: -paid, lender: paid})
+    cur.executemany(INSERT_SQL, [entry for entry in entries if entry[3] > 0])
+    return paid
+
+
+async def repay(db, lender, borrower, amount):
+    """Pay up to ``amount`` off the borrower's open loans from this lender, interest first, oldest loan first.
+
+    The payment is capped at the borrower's balance, read in the same transaction.
+    Returns the amount actually applied.
+    """
+    return await db.transaction(_repay, lender, borrower, amount, _today())
+
+
+async def run_loan_day(db):
+    """The daily loan job: accrue interest to today, then collect what is due."""
+    await accrue_interest(db)
+    result = await collect_due(db)
+    if result["collected"] or result["overdue"]:
+        print(f"🏦 Loans: collected {result['collected']} (${result['amount']:,.2f}), {result['overdue']} overdue")
+    return result
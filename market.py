@@ -0,0 +1,63 @@
+"""The national market's order book: the queries over it and the sweep that fills buys.
+
+Kept apart from the Resources cog so it can be used and tested without discord.
+"""
+
+# Sell orders for a resource, best price first and oldest first within a price.
+# idx_national_market_book serves the order, so a sweep reads only the asks it fills.
+ASKS_SQL = """
+SELECT order_id, comp_id, amount, price_per_unit FROM national_market
+WHERE resource = ? AND price_per_unit <= ? AND comp_id != ?
+ORDER BY price_per_unit, listed_at, order_id
+"""
+BEST_ASK_SQL = """
+SELECT price_per_unit, amount, comp_id FROM national_market
+WHERE resource = ?
+ORDER BY price_per_unit, listed_at, order_id LIMIT 1
+"""
+DEPTH_SQL = """
+SELECT price_per_unit, SUM(amount), COUNT(*) FROM national_market
+WHERE resource = ?
+GROUP BY price_per_unit ORDER BY price_per_unit LIMIT ?
+"""
+
+
+def sweep_asks(cur, buyer_id, resource, amount, max_price, tax_rate):
+    """Match a buy of up to ``amount`` units against the best asks, partially filling the last one.
+
+    Runs inside the caller's transaction and settles every fill there: order amounts,
+    both sides' balances (the buyer also pays ``tax_rate`` on the cost) and the buyer's
+    stockpile. Returns [(seller_id, units, price)], or None without writing anything if
+    the buyer cannot afford the fills. The buyer's own asks are skipped.
+    """
+    fills = []
+    remaining = amount
+    for order_id, seller_id, listed, price in cur.execute(ASKS_SQL, (resource, max_price or float("inf"), buyer_id)):
+        take = min(remaining, listed)
+        fills.append((order_id, seller_id, take, price))
+        remaining -= take
+        if remaining == 0:
+            break
+    if not fills:
+        return []
+
+    cost = sum(units * price for _, _, units, price in fills)
+    balance = cur.execute("SELECT balance FROM companies WHERE company_id = ?", (buyer_id,)).fetchone()
+    if not balance or balance[0] < cost * (1 + tax_rate):
+        return None
+
+    cur.execute("UPDATE companies SET balance = balance - ? WHERE company_id = ?", (cost * (1 + tax_rate), buyer_id))
+    cur.executemany("UPDATE companies SET balance = balance + ? WHERE company_id = ?",
+                    [(units * price, seller_id) for _, seller_id, units, price in fills])
+    cur.executemany("UPDATE national_market SET amount = amount - ? WHERE order_id = ?",
+                    [(units, order_id) for order_id, _, units, _ in fills])
+    cur.executemany("DELETE FROM national_market WHERE order_id = ? AND amount <= 0", [(order_id,) for order_id, *_ in fills])
+
+    bought = amount - remaining
+    if cur.execute("SELECT 1 FROM company_resources WHERE comp_id = ? AND resource = ?", (buyer_id, resource)).fetchone():
+        cur.execute("UPDATE company_resources SET stockpile = stockpile + ? WHERE comp_id = ? AND resource = ?", (bought, buyer_id, resource))
+    else:
+        district = cur.execute("SELECT district FROM resources WHERE resource = ?", (resource,)).fetchone()
+        cur.execute("INSERT INTO company_resources (comp_id, resource, stockpile, district) VALUES (?, ?, ?, ?)",
+                    (buyer_id, resource, bought, district[0] if district else None))
+    return [(seller_id, units, price) for _, seller_id, units, price in fills]
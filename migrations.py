@@ -0,0 +1,563 @@
+"""Versioned schema for game.db.
+
+Every change to the schema is a numbered step in ``MIGRATIONS``. ``migrate`` records
+the highest applied step in the ``schema_version`` table and, at startup, runs only
+the steps a database has not seen yet, each in its own transaction together with
+its version bump. Never edit a step that has shipped; append a new one instead.
+"""
+import datetime
+
+
+def baseline(cur):
+    """Every table the bot and its cogs used to create on load, plus their seed rows.
+
+    Uses IF NOT EXISTS / INSERT OR IGNORE so databases created before versioning
+    adopt version 1 without losing data.
+    """
+    # bot.py
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS users (
+        user_id INTEGER PRIMARY KEY,
+        balance REAL DEFAULT 0.0,
+        district TEXT,
+        party TEXT,
+        senator INTEGER DEFAULT 0,
+        chancellor INTEGER DEFAULT 0,
+        vote_senate INTEGER DEFAULT 0,
+        vote_chancellor INTEGER DEFAULT 0,
+        last_move TEXT
+    )
+    """)
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS foreign_nations(
+        nation TEXT PRIMARY KEY,
+        balance REAL DEFAULT 0.0
+    )
+    """)
+    nations = [
+        ("Switzerland", 20000.0),
+        ("France", 35000.0),
+        ("Germany", 30000.0),
+        ("Italy", 25000.0),
+        ("Spain", 20000.0)
+    ]
+    cur.executemany("INSERT OR IGNORE INTO foreign_nations (nation, balance) VALUES (?, ?)", nations)
+
+    # economy.py
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS tax_rate (
+        trade_rate REAL DEFAULT 0.05,
+        corporate_rate REAL DEFAULT 0.1,
+        capital_gains_rate REAL DEFAULT 0.15,
+        government_balance REAL DEFAULT 0
+    )
+    """)
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS loans (
+        issuer INTEGER,
+        recipient INTEGER,
+        amount REAL,
+        interest REAL,
+        date_issued TEXT,
+        PRIMARY KEY (issuer, recipient)
+    )
+    """)
+    if cur.execute("SELECT COUNT(*) FROM tax_rate").fetchone()[0] == 0:
+        insert_default_tax_rate(cur)
+
+    # politics.py
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS bills (
+        bill_number INTEGER PRIMARY KEY AUTOINCREMENT,
+        bill_name TEXT,
+        description TEXT,
+        link TEXT,
+        proposed_date TEXT,
+        votes INTEGER DEFAULT 0,
+        passed INTEGER DEFAULT 0,
+        senate_number INTEGER DEFAULT 0
+    )
+    """)
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS elections (
+        voter INTEGER PRIMARY KEY DEFAULT 0,
+        candidate INTEGER DEFAULT 0,
+        district TEXT,
+        chancellor_vote INTEGER DEFAULT 0
+    )
+    """)
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS parties(
+        party TEXT PRIMARY KEY,
+        party_head INTEGER,
+        description TEXT
+    )
+    """)
+
+    # companies.py
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS companies (
+        company_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        owner_id INTEGER,
+        name TEXT UNIQUE,
+        balance REAL DEFAULT 0.0,
+        shares_available INTEGER DEFAULT 100,
+        total_shares INTEGER DEFAULT 100,
+        board_members TEXT DEFAULT '[]',
+        is_public INTEGER DEFAULT 0,
+        ticker TEXT UNIQUE
+    )
+    """)
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS ownership (
+        owner_id INTEGER,
+        company_name TEXT,
+        shares INTEGER DEFAULT 0,
+        PRIMARY KEY (owner_id, company_name),
+        FOREIGN KEY (owner_id) REFERENCES users(user_id),
+        FOREIGN KEY (company_name) REFERENCES companies(name)
+    )
+    """)
+
+    # resources.py
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS resources (
+        district TEXT PRIMARY KEY,
+        resource TEXT,
+        stockpile INTEGER DEFAULT 100000,
+        price_per_unit REAL DEFAULT 100.0
+    )
+    """)
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS company_resources (
+        comp_id INTEGER DEFAULT 0,
+        district TEXT,
+        resource TEXT,
+        stockpile INTEGER DEFAULT 0,
+        FOREIGN KEY (comp_id) REFERENCES companies (company_id)
+    )
+    """)
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS national_market(
+        comp_id INTEGER DEFAULT 0,
+        resource TEXT,
+        amount INTEGER DEFAULT 0,
+        price_per_unit REAL DEFAULT 0.0,
+        FOREIGN KEY (comp_id) REFERENCES companies (company_id)
+    )
+    """)
+    initial_resources = {
+        "Corinthia": "Factories",
+        "Vordane": "Metal",
+        "Drakenshire": "Military Strength",
+        "Eldoria": "Silicon",
+        "Caelmont": "Luxury Goods"
+    }
+    cur.executemany("INSERT OR IGNORE INTO resources (district, resource) VALUES (?, ?)", initial_resources.items())
+
+
+def users_senator_column(cur):
+    """Very old databases have a users table without the senator column."""
+    columns = [row[1] for row in cur.execute("PRAGMA table_info(users)")]
+    if "senator" not in columns:
+        cur.execute("ALTER TABLE users ADD COLUMN senator INTEGER DEFAULT 0")
+
+
+def hot_path_indexes(cur):
+    """Indexes for the lookups registered in query_plans.HOT_QUERIES.
+
+    Trailing columns make the common reads covering, so they never touch the table.
+    """
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_users_district ON users (district)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_companies_owner ON companies (owner_id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_ownership_company ON ownership (company_name, shares DESC, owner_id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_national_market_comp ON national_market (comp_id, resource, amount)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_national_market_resource ON national_market (resource, price_per_unit)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_company_resources_comp ON company_resources (comp_id, resource, stockpile)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_resources_resource ON resources (resource, price_per_unit)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_elections_district ON elections (district, candidate)")
+    cur.execute("ANALYZE")
+
+
+def company_valuations(cur):
+    """Materialized company NAVs, kept current by valuation.refresh_valuations.
+
+    ``dirty`` counts changes since the last recompute. Triggers bump it for every
+    company whose own assets change; the refresher extends that to the companies
+    holding them.
+    """
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS company_valuations (
+        company_id INTEGER PRIMARY KEY,
+        nav REAL DEFAULT 0.0,
+        price_per_share REAL DEFAULT 0.0,
+        last_updated TEXT,
+        version INTEGER DEFAULT 0,
+        dirty INTEGER DEFAULT 1
+    )
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_company_valuations_dirty ON company_valuations (dirty) WHERE dirty > 0")
+    cur.execute("INSERT OR IGNORE INTO company_valuations (company_id) SELECT company_id FROM companies")
+
+    mark = "UPDATE company_valuations SET dirty = dirty + 1 WHERE company_id {}"
+    triggers = {
+        "companies_valuation_insert": ("AFTER INSERT ON companies",
+                                       "INSERT OR IGNORE INTO company_valuations (company_id) VALUES (NEW.company_id)"),
+        "companies_valuation_update": ("AFTER UPDATE OF balance, total_shares ON companies",
+                                       mark.format("= NEW.company_id")),
+        "companies_valuation_delete": ("AFTER DELETE ON companies",
+                                       "DELETE FROM company_valuations WHERE company_id = OLD.company_id"),
+        "ownership_valuation_insert": ("AFTER INSERT ON ownership", mark.format("= NEW.owner_id")),
+        "ownership_valuation_update": ("AFTER UPDATE OF shares ON ownership", mark.format("= NEW.owner_id")),
+        "ownership_valuation_delete": ("AFTER DELETE ON ownership", mark.format("= OLD.owner_id")),
+        "company_resources_valuation_insert": ("AFTER INSERT ON company_resources", mark.format("= NEW.comp_id")),
+        "company_resources_valuation_update": ("AFTER UPDATE ON company_resources", mark.format("= NEW.comp_id")),
+        "company_resources_valuation_delete": ("AFTER DELETE ON company_resources", mark.format("= OLD.comp_id")),
+        "national_market_valuation_insert": ("AFTER INSERT ON national_market", mark.format("= NEW.comp_id")),
+        "national_market_valuation_update": ("AFTER UPDATE ON national_market", mark.format("= NEW.comp_id")),
+        "national_market_valuation_delete": ("AFTER DELETE ON national_market", mark.format("= OLD.comp_id")),
+        "resources_valuation_price": ("AFTER UPDATE OF price_per_unit ON resources", mark.format(
+            "IN (SELECT comp_id FROM company_resources WHERE resource = NEW.resource"
+            " UNION SELECT comp_id FROM national_market WHERE resource = NEW.resource)")),
+    }
+    for name, (event, action) in triggers.items():
+        cur.execute(f"CREATE TRIGGER IF NOT EXISTS {name} {event} BEGIN {action}; END")
+
+
+def holdings_by_company_id(cur):
+    """Re-key share ownership on company_id.
+
+    Rows move to ``holdings``, which deletes with its company. ``ownership`` becomes a
+    view with the old columns. INSTEAD OF triggers on the view let name-keyed
+    reads and plain INSERT / UPDATE / DELETE keep working while the cogs move over.
+    Upserts (ON CONFLICT) cannot target a view and must write to holdings.
+    """
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS holdings (
+        holder_id INTEGER NOT NULL,
+        company_id INTEGER NOT NULL REFERENCES companies (company_id) ON DELETE CASCADE,
+        shares INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (holder_id, company_id)
+    )
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_holdings_company ON holdings (company_id, shares DESC, holder_id)")
+    # Rows for companies that no longer exist are dropped here; clean_ownership used to sweep them
+    cur.execute("""
+    INSERT OR IGNORE INTO holdings (holder_id, company_id, shares)
+    SELECT o.owner_id, c.company_id, o.shares
+    FROM ownership o
+    JOIN companies c ON c.name = o.company_name
+    """)
+    for event in ("insert", "update", "delete"):
+        cur.execute(f"DROP TRIGGER IF EXISTS ownership_valuation_{event}")
+    cur.execute("DROP TABLE ownership")
+
+    cur.execute("""
+    CREATE VIEW ownership (owner_id, company_name, shares) AS
+    SELECT h.holder_id, c.name, h.shares
+    FROM holdings h
+    JOIN companies c ON c.company_id = h.company_id
+    """)
+    company_id = "(SELECT company_id FROM companies WHERE name = {}.company_name)"
+    cur.execute(f"""
+    CREATE TRIGGER ownership_insert INSTEAD OF INSERT ON ownership BEGIN
+        INSERT INTO holdings (holder_id, company_id, shares)
+        VALUES (NEW.owner_id, {company_id.format("NEW")}, COALESCE(NEW.shares, 0));
+    END
+    """)
+    cur.execute(f"""
+    CREATE TRIGGER ownership_update INSTEAD OF UPDATE ON ownership BEGIN
+        UPDATE holdings SET holder_id = NEW.owner_id, company_id = {company_id.format("NEW")}, shares = NEW.shares
+        WHERE holder_id = OLD.owner_id AND company_id = {company_id.format("OLD")};
+    END
+    """)
+    cur.execute(f"""
+    CREATE TRIGGER ownership_delete INSTEAD OF DELETE ON ownership BEGIN
+        DELETE FROM holdings WHERE holder_id = OLD.owner_id AND company_id = {company_id.format("OLD")};
+    END
+    """)
+
+    mark = "UPDATE company_valuations SET dirty = dirty + 1 WHERE company_id = {}"
+    cur.execute(f"CREATE TRIGGER holdings_valuation_insert AFTER INSERT ON holdings BEGIN {mark.format('NEW.holder_id')}; END")
+    cur.execute(f"CREATE TRIGGER holdings_valuation_update AFTER UPDATE ON holdings BEGIN {mark.format('NEW.holder_id')}; {mark.format('OLD.holder_id')}; END")
+    cur.execute(f"CREATE TRIGGER holdings_valuation_delete AFTER DELETE ON holdings BEGIN {mark.format('OLD.holder_id')}; END")
+
+    # Foreign keys are enforced from now on; drop rows that already point at deleted companies
+    cur.execute("DELETE FROM company_resources WHERE comp_id NOT IN (SELECT company_id FROM companies)")
+    cur.execute("DELETE FROM national_market WHERE comp_id NOT IN (SELECT company_id FROM companies)")
+
+
+def ledger(cur):
+    """Append-only record of money movements, written by ledger.Ledger."""
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS ledger (
+        entry_id INTEGER PRIMARY KEY,
+        posted_at TEXT NOT NULL,
+        debit TEXT NOT NULL,
+        credit TEXT NOT NULL,
+        amount REAL NOT NULL,
+        reason TEXT,
+        command TEXT
+    )
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_ledger_debit ON ledger (debit)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_ledger_credit ON ledger (credit)")
+
+
+def balance_checkpoints(cur):
+    """Balance checkpoints for point-in-time queries, and an opening balance for every account.
+
+    The ledger only knows movements, so each account gets one opening entry from
+    ``mint``. The entry is dated at the start of the ledger and covers whatever its
+    stored balance had before the ledger existed. After that, debits minus credits
+    give an account's real balance at any time.
+    """
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS balance_checkpoints (
+        account TEXT NOT NULL,
+        taken_at TEXT NOT NULL,
+        balance REAL NOT NULL,
+        PRIMARY KEY (account, taken_at)
+    )
+    """)
+    cur.execute("DROP INDEX IF EXISTS idx_ledger_debit")
+    cur.execute("DROP INDEX IF EXISTS idx_ledger_credit")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_ledger_debit_time ON ledger (debit, posted_at, amount)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_ledger_credit_time ON ledger (credit, posted_at, amount)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_ledger_time ON ledger (posted_at)")
+
+    opened_at = cur.execute("SELECT MIN(posted_at) FROM ledger").fetchone()[0]
+    if opened_at is None:
+        opened_at = datetime.datetime.now(datetime.timezone.utc).isoformat()
+    balances = cur.execute("""
+    SELECT 'user:' || user_id, balance FROM users
+    UNION ALL SELECT 'company:' || company_id, balance FROM companies
+    UNION ALL SELECT 'nation:' || nation, balance FROM foreign_nations
+    UNION ALL SELECT 'government', government_balance FROM tax_rate
+    """).fetchall()
+    net = dict(cur.execute("""
+    SELECT account, SUM(delta) FROM (
+        SELECT debit AS account, amount AS delta FROM ledger
+        UNION ALL
+        SELECT credit, -amount FROM ledger
+    ) GROUP BY account
+    """).fetchall())
+    entries = []
+    for account, balance in balances:
+        opening = (balance or 0) - net.get(account, 0)
+        if opening > 0:
+            entries.append((opened_at, account, "mint", opening, "opening balance"))
+        elif opening < 0:
+            entries.append((opened_at, "mint", account, -opening, "opening balance"))
+    cur.executemany("INSERT INTO ledger (posted_at, debit, credit, amount, reason) VALUES (?, ?, ?, ?, ?)", entries)
+
+
+def payout_runs(cur):
+    """Progress of bulk payouts, so an interrupted run resumes where it stopped instead of paying twice."""
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS payout_runs (
+        run_id TEXT PRIMARY KEY,
+        kind TEXT NOT NULL,
+        amount REAL NOT NULL,
+        company_id INTEGER,
+        district TEXT,
+        last_key INTEGER NOT NULL DEFAULT 0,
+        paid INTEGER NOT NULL DEFAULT 0,
+        total REAL NOT NULL DEFAULT 0,
+        started_at TEXT,
+        finished_at TEXT
+    )
+    """)
+    # Holders of one company in holder order, for paying them in keyset chunks
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_holdings_company_holder ON holdings (company_id, holder_id, shares)")
+
+
+def loan_book(cur):
+    """Rebuild loans around ledger accounts, with accrual state and a repayment schedule.
+
+    The old table keyed loans on (issuer, recipient) ids that could be a user or a
+    company. Existing loans are carried over: a party is a user if such a user exists.
+    Each gets one installment for the full amount, due 28 days after issue.
+    """
+    cur.execute("""
+    CREATE TABLE loans_v2 (
+        loan_id INTEGER PRIMARY KEY,
+        lender TEXT NOT NULL,
+        borrower TEXT NOT NULL,
+        principal REAL NOT NULL,
+        rate REAL NOT NULL,
+        date_issued TEXT NOT NULL,
+        term_days INTEGER NOT NULL,
+        balance REAL NOT NULL,
+        accrued REAL NOT NULL DEFAULT 0,
+        accrued_through TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'open'
+    )
+    """)
+    account = "CASE WHEN EXISTS (SELECT 1 FROM users WHERE user_id = {0}) THEN 'user:' ELSE 'company:' END || {0}"
+    cur.execute(f"""
+    INSERT INTO loans_v2 (lender, borrower, principal, rate, date_issued, term_days, balance, accrued_through)
+    SELECT {account.format("issuer")}, {account.format("recipient")}, amount, interest,
+           date(date_issued), 28, amount, date(date_issued)
+    FROM loans
+    """)
+    cur.execute("DROP TABLE loans")
+    cur.execute("ALTER TABLE loans_v2 RENAME TO loans")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_loans_parties ON loans (borrower, lender) WHERE status = 'open'")
+
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS loan_schedule (
+        loan_id INTEGER NOT NULL REFERENCES loans (loan_id) ON DELETE CASCADE,
+        installment INTEGER NOT NULL,
+        due_date TEXT NOT NULL,
+        principal REAL NOT NULL,
+        paid_at TEXT,
+        PRIMARY KEY (loan_id, installment)
+    )
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_loan_schedule_due ON loan_schedule (due_date, loan_id) WHERE paid_at IS NULL")
+    cur.execute("""
+    INSERT INTO loan_schedule (loan_id, installment, due_date, principal)
+    SELECT loan_id, 1, date(date_issued, '+28 days'), principal FROM loans
+    """)
+
+
+def price_history(cur):
+    """Raw price ticks and the OHLC candles rolled up from them; see price_history.py."""
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS price_ticks (
+        series TEXT NOT NULL,
+        at TEXT NOT NULL,
+        price REAL NOT NULL,
+        PRIMARY KEY (series, at)
+    ) WITHOUT ROWID
+    """)
+    # Retention pruning deletes by age across every series
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_price_ticks_at ON price_ticks (at)")
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS price_candles (
+        series TEXT NOT NULL,
+        resolution TEXT NOT NULL,
+        bucket TEXT NOT NULL,
+        open REAL NOT NULL,
+        high REAL NOT NULL,
+        low REAL NOT NULL,
+        close REAL NOT NULL,
+        ticks INTEGER NOT NULL DEFAULT 1,
+        PRIMARY KEY (series, resolution, bucket)
+    ) WITHOUT ROWID
+    """)
+
+
+def resource_order_book(cur):
+    """Turn national_market into an order book: one row per sell order instead of per (company, resource).
+
+    Orders are matched best price first, then oldest first, straight off
+    idx_national_market_book. Rebuilding the table drops the valuation triggers that
+    touch it, so they are recreated here.
+    """
+    cur.execute("""
+    CREATE TABLE national_market_v2 (
+        order_id INTEGER PRIMARY KEY,
+        comp_id INTEGER NOT NULL REFERENCES companies (company_id) ON DELETE CASCADE,
+        resource TEXT NOT NULL,
+        amount INTEGER NOT NULL,
+        price_per_unit REAL NOT NULL,
+        listed_at TEXT NOT NULL
+    )
+    """)
+    cur.execute("""
+    INSERT INTO national_market_v2 (comp_id, resource, amount, price_per_unit, listed_at)
+    SELECT comp_id, resource, amount, price_per_unit, strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now')
+    FROM national_market
+    WHERE amount > 0 AND comp_id IN (SELECT company_id FROM companies)
+    ORDER BY rowid
+    """)
+    # resources_valuation_price reads national_market and would block the rename
+    cur.execute("DROP TRIGGER IF EXISTS resources_valuation_price")
+    cur.execute("DROP TABLE national_market")
+    cur.execute("ALTER TABLE national_market_v2 RENAME TO national_market")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_national_market_book ON national_market (resource, price_per_unit, listed_at)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_national_market_comp ON national_market (comp_id, resource, amount)")
+
+    mark = "UPDATE company_valuations SET dirty = dirty + 1 WHERE company_id {}"
+    triggers = {
+        "national_market_valuation_insert": ("AFTER INSERT ON national_market", mark.format("= NEW.comp_id")),
+        "national_market_valuation_update": ("AFTER UPDATE ON national_market", mark.format("= NEW.comp_id")),
+        "national_market_valuation_delete": ("AFTER DELETE ON national_market", mark.format("= OLD.comp_id")),
+        "resources_valuation_price": ("AFTER UPDATE OF price_per_unit ON resources", mark.format(
+            "IN (SELECT comp_id FROM company_resources WHERE resource = NEW.resource"
+            " UNION SELECT comp_id FROM national_market WHERE resource = NEW.resource)")),
+    }
+    for name, (event, action) in triggers.items():
+        cur.execute(f"CREATE TRIGGER IF NOT EXISTS {name} {event} BEGIN {action}; END")
+
+
+def share_orders(cur):
+    """Resting limit orders for public company shares; see share_orders.py.
+
+    ``shares`` is what is left unfilled. Open asks hold their shares in escrow, out
+    of holdings.
+    """
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS share_orders (
+        order_id INTEGER PRIMARY KEY,
+        company_id INTEGER NOT NULL REFERENCES companies (company_id) ON DELETE CASCADE,
+        account TEXT NOT NULL,
+        side TEXT NOT NULL CHECK (side IN ('bid', 'ask')),
+        price REAL NOT NULL,
+        shares INTEGER NOT NULL,
+        placed_at TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'open'
+    )
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_share_orders_open ON share_orders (company_id, side, price, shares) WHERE status = 'open'")
+
+
+def listing_indexes(cur):
+    """Lets the laws listing seek passed bills in bill_number order; see pagination.py."""
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_bills_passed ON bills (passed)")
+
+
+MIGRATIONS = [
+    (1, "baseline schema", baseline),
+    (2, "users.senator column", users_senator_column),
+    (3, "hot path indexes", hot_path_indexes),
+    (4, "materialized company valuations", company_valuations),
+    (5, "ownership keyed by company_id", holdings_by_company_id),
+    (6, "money ledger", ledger),
+    (7, "ledger balance checkpoints", balance_checkpoints),
+    (8, "payout runs", payout_runs),
+    (9, "loan book", loan_book),
+    (10, "price history", price_history),
+    (11, "resource order book", resource_order_book),
+    (12, "share orders", share_orders),
+    (13, "listing indexes", listing_indexes),
+]
+
+
+def insert_default_tax_rate(cur):
+    cur.execute("INSERT INTO tax_rate (trade_rate, corporate_rate, government_balance) VALUES (0.05, 0.1, 0)")
+
+
+def current_version(cur):
+    cur.execute("CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)")
+    row = cur.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    return row[0] or 0
+
+
+async def migrate(db):
+    """Bring the database up to the latest schema version and return that version."""
+    version = await db.transaction(current_version)
+    for number, name, step in MIGRATIONS:
+        if number <= version:
+            continue
+
+        def apply(cur, number=number, step=step):
+            step(cur)
+            cur.execute("INSERT INTO schema_version (version) VALUES (?)", (number,))
+
+        await db.transaction(apply)
+        print(f"✅ Applied migration {number}: {name}")
+        version = number
+    return version
@@ -0,0 +1,69 @@
+"""Net worth of every user, computed in bulk for the wealth leaderboard.
+
+A user's net worth is their balance plus, for every stock they hold, shares × the
+company's price per share from the materialized valuations. Users, their holdings and
+the share prices are each read once, and the grouped sum runs in NumPy.
+"""
+import numpy as np
+
+from valuation import company_values
+
+SHARE_PRICES_SQL = """
+SELECT c.company_id, c.name, c.total_shares, v.price_per_share, v.version
+FROM companies c
+JOIN company_valuations v ON v.company_id = c.company_id
+"""
+
+# Only rows held by users; company holders are valued through their company.
+USER_HOLDINGS_SQL = """
+SELECT h.holder_id, h.company_id, h.shares
+FROM holdings h
+JOIN users u ON u.user_id = h.holder_id
+WHERE h.shares > 0
+"""
+
+
+async def share_prices(db):
+    """{company_id: price per share}, valuing companies that have never been refreshed live."""
+    rows = await db.fetchall(SHARE_PRICES_SQL)
+    prices = {company_id: price for company_id, _, _, price, version in rows if version > 0}
+    missing = [(company_id, name, total_shares) for company_id, name, total_shares, _, version in rows if version == 0]
+    if missing:
+        navs = await company_values(db, [name for _, name, _ in missing])
+        for company_id, name, total_shares in missing:
+            prices[company_id] = navs[name] / total_shares if total_shares > 0 else 0
+    return prices
+
+
+async def net_worths(db):
+    """Return parallel arrays (user_ids, net_worths) for every user."""
+    users = await db.fetchall("SELECT user_id, balance FROM users")
+    holdings = await db.fetchall(USER_HOLDINGS_SQL)
+    prices = await share_prices(db)
+
+    user_ids = np.array([user_id for user_id, _ in users], dtype=np.int64)
+    worths = np.array([balance or 0 for _, balance in users], dtype=float)
+    if holdings and len(users):
+        index = {user_id: i for i, (user_id, _) in enumerate(users)}
+        holder = np.array([index[owner_id] for owner_id, _, _ in holdings], dtype=np.int64)
+        value = np.array([shares * prices.get(company_id, 0) for _, company_id, shares in holdings], dtype=float)
+        worths += np.bincount(holder, weights=value, minlength=len(users))
+    return user_ids, worths
+
+
+def top_k(user_ids, worths, k):
+    """The k richest users as [(user_id, net_worth)], richest first."""
+    if k <= 0 or len(worths) == 0:
+        return []
+    if k < len(worths):
+        candidates = np.argpartition(-worths, k - 1)[:k]
+    else:
+        candidates = np.arange(len(worths))
+    ranked = candidates[np.argsort(-worths[candidates], kind="stable")]
+    return [(int(user_ids[i]), float(worths[i])) for i in ranked]
+
+
+async def richest_users(db, k=10):
+    """The k users with the highest net worth, richest first."""
+    user_ids, worths = await net_worths(db)
+    return top_k(user_ids, worths, k)
@@ -2,6 +2,26 @@ import discord
 import random
 from discord.ext import commands
 
+MARKET_NEWS_CHANNEL = 1345074664850067527
+EMBEDS_PER_MESSAGE = 10  # Discord's limit
+
+
+class NewsPublisher:
+    """Posts batches of embeds to a news channel, as few messages as Discord allows."""
+
+    def __init__(self, bot, channel_id=MARKET_NEWS_CHANNEL):
+        self.bot = bot
+        self.channel_id = channel_id
+
+    async def publish(self, embeds):
+        channel = self.bot.get_channel(self.channel_id)
+        if channel is None:
+            print(f"⚠️ News channel {self.channel_id} not found; dropped {len(embeds)} stories")
+            return
+        for i in range(0, len(embeds), EMBEDS_PER_MESSAGE):
+            await channel.send(embeds=embeds[i:i + EMBEDS_PER_MESSAGE])
+
+
 class News(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
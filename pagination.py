@@ -0,0 +1,127 @@
+"""Keyset pagination for the listing commands (``sm``, ``companies``, ``bills``, ``laws``).
+
+A ``Listing`` reads a page with one query. The query seeks the listing's sort key
+on an index to just past the previous page, reads ``page_size`` rows and joins in
+what the page shows. Rows before the page are never read or joined, so page 500
+costs the same as page 1, and only the page itself is held in memory.
+
+Commands ask for pages by number, so a listing also keeps bookmarks: the key each
+recently read page starts after, at most ``MAX_BOOKMARKS`` of them. Reading page n
+bookmarks page n + 1, so paging forward is always a single seek, and ``window``
+reads several consecutive pages with one seek the same way. Only a page that has
+never been reached has no bookmark; the jump there walks forward once from the
+nearest bookmark below it, on the index keys alone, and bookmarks it.
+
+Bookmarks survive writes. A seek from an old bookmark is still a correct keyset
+read, and an insert or delete before it only shifts that page by the rows
+added or removed. Reading a page bookmarks the next one afresh. ``tables`` names
+what a listing reads, so caches of its pages can follow writes to those tables
+alone (see ``Database.version``).
+"""
+from collections import OrderedDict
+
+MAX_BOOKMARKS = 256
+PAGE_SIZE = 5
+
+_END = object()  # Start of a page past the last row
+
+
+class Listing:
+    """Rows of ``table`` in ``key`` order, ``page_size`` at a time.
+
+    ``key`` is a tuple of columns of ``table`` that is unique per row and matches an
+    index, ``where`` may only filter on ``table`` and ``joins`` adds the rest of what a
+    page shows. ``tables`` are the tables all of that reads. Pages are lists of the
+    ``columns`` tuples.
+    """
+
+    def __init__(self, columns, table, key, tables, joins="", where="1", page_size=PAGE_SIZE):
+        self.tables = tables
+        self.page_size = page_size
+        self._width = len(key)
+        keys = ", ".join(key)
+        after = f"({keys}) > ({', '.join('?' * len(key))})"
+        select = f"SELECT {keys}, {columns} FROM {table} {joins}"
+        walk = f"SELECT {keys} FROM {table}"
+        self.first_sql = f"{select} WHERE {where} ORDER BY {keys} LIMIT ?"
+        self.after_sql = f"{select} WHERE {where} AND {after} ORDER BY {keys} LIMIT ?"
+        self.walk_first_sql = f"{walk} WHERE {where} ORDER BY {keys} LIMIT 1 OFFSET ?"
+        self.walk_after_sql = f"{walk} WHERE {where} AND {after} ORDER BY {keys} LIMIT 1 OFFSET ?"
+        self._bookmarks = OrderedDict()  # page number -> key that page starts after
+
+    def _remember(self, number, key):
+        self._bookmarks[number] = tuple(key)
+        self._bookmarks.move_to_end(number)
+        if len(self._bookmarks) > MAX_BOOKMARKS:
+            self._bookmarks.popitem(last=False)
+
+    async def _start(self, db, number):
+        """The key page ``number`` starts after: None for the first page, _END past the last."""
+        if number <= 1:
+            return None
+        if number in self._bookmarks:
+            self._bookmarks.move_to_end(number)
+            return self._bookmarks[number]
+        base = max((page for page in self._bookmarks if page < number), default=1)
+        skip = (number - base) * self.page_size - 1
+        if base == 1:
+            row = await db.fetchone(self.walk_first_sql, (skip,))
+        else:
+            row = await db.fetchone(self.walk_after_sql, (*self._bookmarks[base], skip))
+        if not row:
+            return _END
+        self._remember(number, row)
+        return tuple(row)
+
+    async def window(self, db, number, count):
+        """Pages ``number`` to ``number + count - 1``, read with one query; pages past the last are []."""
+        start = await self._start(db, number)
+        if start is _END:
+            return [[] for _ in range(count)]
+        if start is None:
+            rows = await db.fetchall(self.first_sql, (self.page_size * count,))
+        else:
+            rows = await db.fetchall(self.after_sql, (*start, self.page_size * count))
+        pages = []
+        for i, number in enumerate(range(max(number, 1), max(number, 1) + count)):
+            chunk = rows[i * self.page_size:(i + 1) * self.page_size]
+            if len(chunk) == self.page_size:
+                self._remember(number + 1, chunk[-1][:self._width])
+            pages.append([row[self._width:] for row in chunk])
+        return pages
+
+    async def page(self, db, number):
+        """Rows of page ``number``, counting from 1; [] past the last page."""
+        return (await self.window(db, number, 1))[0]
+
+
+MARKET = Listing(
+    "nm.order_id, nm.comp_id, c.name, nm.resource, nm.amount, nm.price_per_unit",
+    "national_market nm",
+    ("nm.resource", "nm.price_per_unit", "nm.listed_at", "nm.order_id"),
+    ("national_market", "companies"),
+    joins="JOIN companies c ON c.company_id = nm.comp_id",
+)
+
+COMPANIES = Listing(
+    "c.name, c.owner_id, c.ticker, c.shares_available, c.is_public, c.total_shares, v.nav, v.version",
+    "companies c",
+    ("c.company_id",),
+    ("companies", "company_valuations"),
+    joins="LEFT JOIN company_valuations v ON v.company_id = c.company_id",
+)
+
+BILLS = Listing(
+    "b.bill_number, b.bill_name, b.description, b.link, b.proposed_date",
+    "bills b",
+    ("b.bill_number",),
+    ("bills",),
+)
+
+LAWS = Listing(
+    "b.bill_number, b.bill_name, b.description, b.link, b.proposed_date",
+    "bills b",
+    ("b.bill_number",),
+    ("bills",),
+    where="b.passed = 1",
+)
@@ -0,0 +1,137 @@
+"""Button navigation for the paged listing commands.
+
+``paginate`` sends one page of a ``pagination.Listing`` with ◀ and ▶ buttons. The
+embeds live in ``PageCache``, keyed by (command, args, version, page) and evicted
+least recently used first, where version is ``db.version`` of the tables the
+listing reads. A miss reads a window of ``WINDOW`` pages around the one asked for
+with a single query and renders them all, so clicks within the window are answered
+without touching the database. Only a write to one of the listing's own tables
+makes the next click read the pages fresh; the background ledger and treasury
+flushes, for one, do not.
+
+Views stop listening after ``VIEW_TIMEOUT`` seconds and disable their buttons;
+discord.py then drops them, so open views cannot pile up.
+"""
+from collections import OrderedDict
+
+import discord
+
+WINDOW = 5
+VIEW_TIMEOUT = 180
+
+_MISSING = object()
+
+
+class PageCache:
+    def __init__(self, db, size=256, window=WINDOW):
+        self.db = db
+        self.size = size  # Rendered pages kept across all listings
+        self.window = window
+        self.hits = 0
+        self.misses = 0
+        self._embeds = OrderedDict()  # (key, version of the listing's tables, page) -> embed, or None past the last page
+
+    def _put(self, entry, embed):
+        self._embeds[entry] = embed
+        self._embeds.move_to_end(entry)
+        if len(self._embeds) > self.size:
+            self._embeds.popitem(last=False)
+
+    async def get(self, key, listing, build, page):
+        """The embed ``build(page, rows)`` renders for a page of ``listing``, or None past the last page.
+
+        ``key`` names the command and its arguments; pages are cached under it.
+        """
+        version = self.db.version(*listing.tables)  # Read before fetching so a concurrent write invalidates the result
+        embed = self._embeds.get((key, version, page), _MISSING)
+        if embed is not _MISSING:
+            self.hits += 1
+            self._embeds.move_to_end((key, version, page))
+            return embed
+
+        self.misses += 1
+        first = max(1, page - self.window // 2)
+        for number, rows in enumerate(await listing.window(self.db, first, self.window), start=first):
+            rendered = await build(number, rows) if rows else None
+            self._put((key, version, number), rendered)
+            if number == page:
+                embed = rendered
+        return embed
+
+    def invalidate(self):
+        self._embeds.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+class PageView(discord.ui.View):
+    """◀ ▶ buttons over the pages of one listing, for the user who asked for it."""
+
+    def __init__(self, pages, key, listing, build, page, author_id, timeout=VIEW_TIMEOUT):
+        super().__init__(timeout=timeout)
+        self.pages = pages
+        self.key = key
+        self.listing = listing
+        self.build = build
+        self.page = page
+        self.author_id = author_id
+        self.message = None
+
+    async def _has_next(self):
+        return await self.pages.get(self.key, self.listing, self.build, self.page + 1) is not None
+
+    async def refresh_buttons(self):
+        self.previous_page.disabled = self.page <= 1
+        self.next_page.disabled = not await self._has_next()
+
+    async def _show(self, interaction, page):
+        embed = await self.pages.get(self.key, self.listing, self.build, page)
+        if embed is None:
+            # The listing shrank since the buttons were drawn
+            await self.refresh_buttons()
+            await interaction.response.edit_message(view=self)
+            return
+        self.page = page
+        await self.refresh_buttons()
+        await interaction.response.edit_message(embed=embed, view=self)
+
+    async def interaction_check(self, interaction):
+        if interaction.user.id != self.author_id:
+            await interaction.response.send_message("⚠️ Run the command yourself to page through it.", ephemeral=True)
+            return False
+        return True
+
+    @discord.ui.button(label="◀", style=discord.ButtonStyle.secondary)
+    async def previous_page(self, interaction, button):
+        await self._show(interaction, self.page - 1)
+
+    @discord.ui.button(label="▶", style=discord.ButtonStyle.secondary)
+    async def next_page(self, interaction, button):
+        await self._show(interaction, self.page + 1)
+
+    async def on_timeout(self):
+        for item in self.children:
+            item.disabled = True
+        if self.message:
+            try:
+                await self.message.edit(view=self)
+            except discord.HTTPException:
+                pass  # Deleted, or the channel is gone
+
+
+async def paginate(ctx, pages, key, listing, build, page=1):
+    """Send page ``page`` of ``listing`` with navigation buttons; returns False if that page is empty."""
+    page = max(page, 1)
+    embed = await pages.get(key, listing, build, page)
+    if embed is None:
+        return False
+    view = PageView(pages, key, listing, build, page, ctx.author.id)
+    await view.refresh_buttons()
+    view.message = await ctx.send(embed=embed, view=view)
+    return True
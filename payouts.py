@@ -0,0 +1,139 @@
+"""Bulk payouts: UBI, airdrops and dividends.
+
+A run pays its recipients in keyset-ordered chunks of ``CHUNK_SIZE``. Each chunk is
+one short transaction that credits the recipients, writes their ledger rows, debits
+the payer and advances the run's ``last_key``, so other commands commit between
+chunks instead of waiting on one table-wide UPDATE.
+
+Runs are identified by ``run_id``. Starting a run id that already exists continues
+it from its ``last_key``, and a finished run pays nothing, so retrying after a crash
+never pays anyone twice. ``resume_payouts`` finishes interrupted runs at startup.
+"""
+import datetime
+import time
+
+from ledger import INSERT_SQL, MINT, company_account, user_account
+
+CHUNK_SIZE = 500
+
+# Each chunk query returns (key, amount, is_user) after :after, in key order.
+ALL_USERS_SQL = """
+SELECT user_id, :amount, 1 FROM users
+WHERE user_id > :after
+ORDER BY user_id LIMIT :limit
+"""
+
+DISTRICT_USERS_SQL = """
+SELECT user_id, :amount, 1 FROM users
+WHERE district = :district AND user_id > :after
+ORDER BY user_id LIMIT :limit
+"""
+
+# A holder is a user or a company; see valuation.HOLDINGS_SQL.
+HOLDERS_SQL = """
+SELECT h.holder_id, h.shares * :amount, EXISTS (SELECT 1 FROM users u WHERE u.user_id = h.holder_id)
+FROM holdings h
+WHERE h.company_id = :company_id AND h.holder_id > :after AND h.shares > 0
+ORDER BY h.holder_id LIMIT :limit
+"""
+
+
+def _now():
+    return datetime.datetime.now(datetime.timezone.utc).isoformat()
+
+
+def _chunk_sql(company_id, district):
+    if company_id is not None:
+        return HOLDERS_SQL
+    if district is not None:
+        return DISTRICT_USERS_SQL
+    return ALL_USERS_SQL
+
+
+def _pay_chunk(cur, run_id, chunk_size):
+    """Pay the next chunk of a run; returns (accounts paid, amount paid, finished)."""
+    row = cur.execute(
+        "SELECT kind, amount, company_id, district, last_key, finished_at FROM payout_runs WHERE run_id = ?", (run_id,)
+    ).fetchone()
+    kind, amount, company_id, district, last_key, finished_at = row
+    if finished_at:
+        return 0, 0.0, True
+
+    params = {"amount": amount, "company_id": company_id, "district": district, "after": last_key, "limit": chunk_size}
+    rows = cur.execute(_chunk_sql(company_id, district), params).fetchall()
+    payer = company_account(company_id) if company_id is not None else MINT
+    posted_at = _now()
+
+    cur.executemany("UPDATE users SET balance = balance + ? WHERE user_id = ?",
+                    [(credit, key) for key, credit, is_user in rows if is_user])
+    cur.executemany("UPDATE companies SET balance = balance + ? WHERE company_id = ?",
+                    [(credit, key) for key, credit, is_user in rows if not is_user])
+    cur.executemany(INSERT_SQL, [
+        (posted_at, user_account(key) if is_user else company_account(key), payer, credit, kind, run_id)
+        for key, credit, is_user in rows
+    ])
+    total = sum(credit for _, credit, _ in rows)
+    if company_id is not None:
+        cur.execute("UPDATE companies SET balance = balance - ? WHERE company_id = ?", (total, company_id))
+
+    finished = len(rows) < chunk_size
+    cur.execute(
+        "UPDATE payout_runs SET last_key = ?, paid = paid + ?, total = total + ?, finished_at = ? WHERE run_id = ?",
+        (rows[-1][0] if rows else last_key, len(rows), total, posted_at if finished else None, run_id)
+    )
+    return len(rows), total, finished
+
+
+async def run_payout(db, run_id, chunk_size=CHUNK_SIZE):
+    """Pay every remaining chunk of a started run and report its throughput.
+
+    Returns {"paid", "total", "seconds", "per_second"} for the accounts paid by this call.
+    """
+    paid, total = 0, 0.0
+    started = time.perf_counter()
+    finished = False
+    while not finished:
+        count, amount, finished = await db.transaction(_pay_chunk, run_id, chunk_size)
+        paid += count
+        total += amount
+    seconds = time.perf_counter() - started
+    stats = {"paid": paid, "total": total, "seconds": seconds, "per_second": paid / seconds if seconds > 0 else 0.0}
+    if paid:
+        print(f"💸 Payout {run_id}: {paid} accounts, ${total:,.2f} in {seconds:.2f}s ({stats['per_second']:,.0f}/s)")
+    return stats
+
+
+async def start_payout(db, run_id, kind, amount, company_id=None, district=None, chunk_size=CHUNK_SIZE):
+    """Create the run if it does not exist yet, then pay whatever it has left."""
+    await db.execute(
+        "INSERT OR IGNORE INTO payout_runs (run_id, kind, amount, company_id, district, started_at) VALUES (?, ?, ?, ?, ?, ?)",
+        (run_id, kind, amount, company_id, district, _now())
+    )
+    return await run_payout(db, run_id, chunk_size)
+
+
+async def distribute_ubi(db, amount, run_id=None):
+    """Pay every user ``amount``. The default run id is the current hour, so a retried job pays once."""
+    run_id = run_id or f"ubi-{datetime.datetime.now(datetime.timezone.utc):%Y-%m-%dT%H}"
+    return await start_payout(db, run_id, "ubi", amount)
+
+
+async def airdrop(db, run_id, amount, district=None):
+    """Pay ``amount`` to every user, or to every user of one district."""
+    return await start_payout(db, run_id, "airdrop", amount, district=district)
+
+
+async def pay_dividend(db, run_id, company_id, per_share):
+    """Pay ``per_share`` for every share held in a company, out of the company's balance.
+
+    Each holder is paid for the shares they hold when their chunk is paid.
+    """
+    return await start_payout(db, run_id, "dividend", per_share, company_id=company_id)
+
+
+async def resume_payouts(db):
+    """Finish every run that was interrupted; returns their run ids."""
+    rows = await db.fetchall("SELECT run_id FROM payout_runs WHERE finished_at IS NULL")
+    for (run_id,) in rows:
+        await run_payout(db, run_id)
+    return [run_id for (run_id,) in rows]
@@ -5,6 +5,9 @@ import random
 import datetime
 from discord.ext import commands, tasks
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from ledger import MINT, user_account
+from pagination import BILLS, LAWS
+from paginator import paginate
 
 OFFICIAL_DISTRICTS = [
     "Corinthia", "Vordane", "Drakenshire", "Eldoria", "Caelmont"
@@ -15,42 +18,10 @@ OFFICIAL_DISTRICTS = [
 class Politics(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.conn = sqlite3.connect("game.db", check_same_thread=False)
-        self.c = self.conn.cursor()
-        self.setup_politics()
+        self.db = bot.db
+        self.pages = bot.pages
         self.running = 0
 
-    def setup_politics(self):
-        """Create required database tables if they don't exist."""
-        self.c.execute("""
-        CREATE TABLE IF NOT EXISTS bills (
-            bill_number INTEGER PRIMARY KEY AUTOINCREMENT,
-            bill_name TEXT,
-            description TEXT,
-            link TEXT,
-            proposed_date TEXT,
-            votes INTEGER DEFAULT 0,
-            passed INTEGER DEFAULT 0,
-            senate_number INTEGER DEFAULT 0
-        )
-        """)
-        self.c.execute("""
-        CREATE TABLE IF NOT EXISTS elections (
-            voter INTEGER PRIMARY KEY DEFAULT 0,
-            candidate INTEGER DEFAULT 0,
-            district TEXT,
-            chancellor_vote INTEGER DEFAULT 0
-        )
-        """)
-        self.c.execute("""
-        CREATE TABLE IF NOT EXISTS parties(
-            party TEXT PRIMARY KEY,
-            party_head INTEGER,
-            description TEXT
-        )
-        """)
-        self.conn.commit()
-    
     @commands.command()
     async def join(self, ctx, district: str):
         """Allows users to join a district and ensures they have a user profile in the database."""
@@ -65,8 +36,7 @@ class Politics(commands.Cog):
             await ctx.send(embed=embed)
             return
 
-        self.c.execute("SELECT district FROM users WHERE user_id = ?", (user_id,))
-        row = self.c.fetchone()
+        row = await self.db.fetchone("SELECT district FROM users WHERE user_id = ?", (user_id,))
         
         if row:
             embed = discord.Embed(
@@ -78,8 +48,7 @@ class Politics(commands.Cog):
             return
 
         # Check if the district already has 7 members
-        self.c.execute("SELECT COUNT(*) FROM users WHERE district = ?", (district,))
-        count = self.c.fetchone()[0]
+        count = (await self.db.fetchone("SELECT COUNT(*) FROM users WHERE district = ?", (district,)))[0]
         if count >= 7:
             embed = discord.Embed(
             title="District Full",
@@ -90,8 +59,8 @@ class Politics(commands.Cog):
             return
 
         # Ensure user is added to the database with a default balance
-        self.c.execute("INSERT INTO users (user_id, balance, district, last_move) VALUES (?, ?, ?, ?)", (user_id, 1000, district, datetime.datetime.now().strftime("%Y-%m-%d")))
-        self.conn.commit()
+        await self.db.execute("INSERT INTO users (user_id, balance, district, last_move) VALUES (?, ?, ?, ?)", (user_id, 1000, district, datetime.datetime.now().strftime("%Y-%m-%d")))
+        self.bot.ledger.post(user_account(user_id), MINT, 1000, "starting balance", ctx.command.name)
         print(f"✅ New user {user_id} added to the database with $1000 balance.")
 
         role = discord.utils.get(ctx.guild.roles, name=district)
@@ -113,8 +82,7 @@ class Politics(commands.Cog):
             await ctx.send(f"{ctx.author.mention}, '{district}' is not a valid district. Please choose from: {', '.join(OFFICIAL_DISTRICTS)}.")
             return
 
-        self.c.execute("SELECT district, last_move FROM users WHERE user_id = ?", (user_id,))
-        row = self.c.fetchone()
+        row = await self.db.fetchone("SELECT district, last_move FROM users WHERE user_id = ?", (user_id,))
 
         if not row:
             await ctx.send(f"⚠️ {ctx.author.mention}, you are not registered in any district. Use the join command first.")
@@ -131,8 +99,7 @@ class Politics(commands.Cog):
             return
 
         # Check if the new district already has 7 members
-        self.c.execute("SELECT COUNT(*) FROM users WHERE district = ?", (district,))
-        count = self.c.fetchone()[0]
+        count = (await self.db.fetchone("SELECT COUNT(*) FROM users WHERE district = ?", (district,)))[0]
         if count >= 7:
             embed = discord.Embed(
             title="District Full",
@@ -153,8 +120,7 @@ class Politics(commands.Cog):
                 await ctx.send(embed=embed)
             return
 
-        self.c.execute("UPDATE users SET district = ?, last_move = ? WHERE user_id = ?", (district, datetime.datetime.now().strftime("%Y-%m-%d"), user_id))
-        self.conn.commit()
+        await self.db.execute("UPDATE users SET district = ?, last_move = ? WHERE user_id = ?", (district, datetime.datetime.now().strftime("%Y-%m-%d"), user_id))
 
         old_role = discord.utils.get(ctx.guild.roles, name=current_district)
         new_role = discord.utils.get(ctx.guild.roles, name=district)
@@ -175,8 +141,7 @@ class Politics(commands.Cog):
         user_id = ctx.author.id
         print("here")
         # Check if the user is already in a party
-        self.c.execute("SELECT party FROM users WHERE user_id = ?", (user_id,))
-        row = self.c.fetchone()
+        row = await self.db.fetchone("SELECT party FROM users WHERE user_id = ?", (user_id,))
 
         if row and row[0]:
             embed = discord.Embed(
@@ -188,8 +153,7 @@ class Politics(commands.Cog):
             return
 
         # Check if the party already exists
-        self.c.execute("SELECT party FROM parties WHERE party = ?", (party,))
-        row = self.c.fetchone()
+        row = await self.db.fetchone("SELECT party FROM parties WHERE party = ?", (party,))
 
         if row:
             embed = discord.Embed(
@@ -201,11 +165,13 @@ class Politics(commands.Cog):
             return
 
         # Add the party to the parties table
-        self.c.execute("INSERT INTO parties (party, party_head, description) VALUES (?, ?, ?)", (party, user_id, description))
-        
-        # Add the user to the users table with the new party
-        self.c.execute("UPDATE users SET party = ? WHERE user_id = ?", (party, user_id))
-        self.conn.commit()
+        def create_party(cur):
+            cur.execute("INSERT INTO parties (party, party_head, description) VALUES (?, ?, ?)", (party, user_id, description))
+
+            # Add the user to the users table with the new party
+            cur.execute("UPDATE users SET party = ? WHERE user_id = ?", (party, user_id))
+
+        await self.db.transaction(create_party)
 
         embed = discord.Embed(
             title="Party Created",
@@ -219,8 +185,7 @@ class Politics(commands.Cog):
         user_id = ctx.author.id
 
         # Check if the user is already in a party
-        self.c.execute("SELECT party FROM users WHERE user_id = ?", (user_id,))
-        row = self.c.fetchone()
+        row = await self.db.fetchone("SELECT party FROM users WHERE user_id = ?", (user_id,))
         if row and row[0]:
             embed = discord.Embed(
                 title="Party Join",
@@ -231,8 +196,7 @@ class Politics(commands.Cog):
             return
 
         # Check if the party exists
-        self.c.execute("SELECT party FROM parties WHERE party = ?", (part,))
-        row = self.c.fetchone()
+        row = await self.db.fetchone("SELECT party FROM parties WHERE party = ?", (part,))
         if not row:
             embed = discord.Embed(
                 title="Party Join",
@@ -243,8 +207,7 @@ class Politics(commands.Cog):
             return
 
         # Add the user to the party
-        self.c.execute("UPDATE users SET party = ? WHERE user_id = ?", (part, user_id))
-        self.conn.commit()
+        await self.db.execute("UPDATE users SET party = ? WHERE user_id = ?", (part, user_id))
 
         embed = discord.Embed(
             title="Party Join",
@@ -255,8 +218,7 @@ class Politics(commands.Cog):
         
     @commands.command(aliases=["pp"])
     async def print_parties(self,ctx):
-        self.c.execute("SELECT party, party_head, description FROM parties")
-        rows = self.c.fetchall()
+        rows = await self.db.fetchall("SELECT party, party_head, description FROM parties")
         if not rows:
             embed = discord.Embed(
             title="Parties",
@@ -280,8 +242,7 @@ class Politics(commands.Cog):
         member = member or ctx.author
         user_id = member.id
 
-        self.c.execute("SELECT balance, district, party, senator, chancellor FROM users WHERE user_id = ?", (user_id,))
-        row = self.c.fetchone()
+        row = await self.db.fetchone("SELECT balance, district, party, senator, chancellor FROM users WHERE user_id = ?", (user_id,))
 
         if not row:
             await ctx.send("⚠️ User not found in the database.")
@@ -293,8 +254,7 @@ class Politics(commands.Cog):
 
         party_info = "None"
         if party:
-            self.c.execute("SELECT party_head FROM parties WHERE party = ?", (party,))
-            party_row = self.c.fetchone()
+            party_row = await self.db.fetchone("SELECT party_head FROM parties WHERE party = ?", (party,))
             if party_row:
                 party_head = party_row[0]
             if party_head == user_id:
@@ -314,15 +274,12 @@ class Politics(commands.Cog):
     async def force_election_end(self, ctx):
         """Forces the end of still running elections. If there is no winner, the bot randomly selects one."""
         self.running = 0
-        self.c.execute("SELECT district FROM users WHERE senator = 0 GROUP BY district")
-        districts_without_senator = [row[0] for row in self.c.fetchall()]
+        districts_without_senator = [row[0] for row in await self.db.fetchall("SELECT district FROM users WHERE senator = 0 GROUP BY district")]
         
         for district in districts_without_senator:
-            self.c.execute("SELECT user_id FROM users WHERE district = ?", (district,))
-            voters = [row[0] for row in self.c.fetchall()]
+            voters = [row[0] for row in await self.db.fetchall("SELECT user_id FROM users WHERE district = ?", (district,))]
             if voters:
-                self.c.execute("SELECT candidate, COUNT(candidate) as vote_count FROM elections WHERE district = ? GROUP BY candidate ORDER BY vote_count DESC", (district,))
-                results = self.c.fetchall()
+                results = await self.db.fetchall("SELECT candidate, COUNT(candidate) as vote_count FROM elections WHERE district = ? GROUP BY candidate ORDER BY vote_count DESC", (district,))
                 
                 if results and results[0][1] > results[1][1]:
                     winner_id = results[0][0]
@@ -345,8 +302,7 @@ class Politics(commands.Cog):
         """gets a users district and assigns them senator role"""
         user_id = user.id
 
-        self.c.execute("SELECT district FROM users WHERE user_id = ?", (user_id,))
-        row = self.c.fetchone()
+        row = await self.db.fetchone("SELECT district FROM users WHERE user_id = ?", (user_id,))
         if not row:
             await ctx.send("⚠️ User not found in the database.")
             return
@@ -366,17 +322,15 @@ class Politics(commands.Cog):
         """Forces a user to join a district."""
         user_id = user.id
 
-        self.c.execute("SELECT district FROM users WHERE user_id = ?", (user_id,))
-        row = self.c.fetchone()
+        row = await self.db.fetchone("SELECT district FROM users WHERE user_id = ?", (user_id,))
 
         if row:
             old_district = row[0]
-            self.c.execute("UPDATE users SET district = ? WHERE user_id = ?", (district, user_id))
-            self.conn.commit()
+            await self.db.execute("UPDATE users SET district = ? WHERE user_id = ?", (district, user_id))
             await ctx.send(f"{user.mention} has been moved from **{old_district}** to **{district}**.")
         else:
-            self.c.execute("INSERT INTO users (user_id, balance, district) VALUES (?, ?, ?)", (user_id, 500, district))
-            self.conn.commit()
+            await self.db.execute("INSERT INTO users (user_id, balance, district) VALUES (?, ?, ?)", (user_id, 500, district))
+            self.bot.ledger.post(user_account(user_id), MINT, 500, "starting balance", ctx.command.name)
             await ctx.send(f"{user.mention} has been added to the district of **{district}** with a starting balance of $500.")
 
         old_role = discord.utils.get(ctx.guild.roles, name=row[0]) if row else None
@@ -398,9 +352,7 @@ class Politics(commands.Cog):
             return
 
         try:
-            self.conn.commit()  # Force save any uncommitted transactions
-            self.c.execute("SELECT senator FROM users WHERE user_id = ?", (proposer_id,))
-            row = self.c.fetchone()
+            row = await self.db.fetchone("SELECT senator FROM users WHERE user_id = ?", (proposer_id,))
             print(f"Senator Check Result: {row}")
         except sqlite3.OperationalError as e:
             print(f"Database error: {e}")
@@ -422,11 +374,10 @@ class Politics(commands.Cog):
             return
 
         proposed_date = datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%d")
-        self.c.execute("INSERT INTO bills (bill_name, description, link, proposed_date, votes) VALUES (?, ?, ?, ?, ?)",
-                    (bill_name, description, link, proposed_date, json.dumps({})))
-        self.conn.commit()
+        bill_number = await self.db.transaction(
+            lambda cur: cur.execute("INSERT INTO bills (bill_name, description, link, proposed_date, votes) VALUES (?, ?, ?, ?, ?)",
+                                    (bill_name, description, link, proposed_date, json.dumps({}))).lastrowid)
 
-        bill_number = self.c.lastrowid
         embed = discord.Embed(
             title="Bill Proposed",
             description=f"📜 **Bill Name:** {bill_name}\n🔢 **Bill Number:** {bill_number}\n📝 **Description:** {description}\n🔗 [Google Doc]({link})",
@@ -434,21 +385,8 @@ class Politics(commands.Cog):
         )
         await ctx.send(embed=embed)
 
-    @commands.command()
-    async def bills(self, ctx):
-        """Displays all currently proposed bills."""
-        self.c.execute("SELECT bill_number, bill_name, description, link, proposed_date FROM bills")
-        bills = self.c.fetchall()
-
-        if not bills:
-            embed = discord.Embed(
-                title="Proposed Bills",
-                description="📜 There are currently no proposed bills.",
-                color=discord.Color.blue()
-            )
-            await ctx.send(embed=embed)
-            return
-
+    async def bills_page(self, page, bills):
+        """Renders one page of the proposed bills."""
         bill_list = "\n\n".join([
             f"**#{bill[0]} {bill[1]}**\n📜 {bill[2]}\n🔗 [Bill Document]({bill[3]})\n📅 Proposed: {bill[4]}"
             for bill in bills
@@ -459,23 +397,11 @@ class Politics(commands.Cog):
             description=bill_list,
             color=discord.Color.blue()
         )
-        await ctx.send(embed=embed)
-
-    @commands.command()
-    async def laws(self, ctx):
-        """Displays all passed laws."""
-        self.c.execute("SELECT bill_number, bill_name, description, link, proposed_date FROM bills WHERE passed = 1")
-        laws = self.c.fetchall()
-
-        if not laws:
-            embed = discord.Embed(
-                title="Passed Laws",
-                description="📜 There are currently no passed laws.",
-                color=discord.Color.blue()
-            )
-            await ctx.send(embed=embed)
-            return
+        embed.set_footer(text=f"Page {page}")
+        return embed
 
+    async def laws_page(self, page, laws):
+        """Renders one page of the passed laws."""
         law_list = "\n\n".join([
             f"**#{law[0]} {law[1]}**\n📜 {law[2]}\n🔗 [Bill Document]({law[3]})\n📅 Passed on: {law[4]}"
             for law in laws
@@ -486,7 +412,30 @@ class Politics(commands.Cog):
             description=f"📢 **Current Laws:**\n\n{law_list}",
             color=discord.Color.blue()
         )
-        await ctx.send(embed=embed)
+        embed.set_footer(text=f"Page {page}")
+        return embed
+
+    @commands.command()
+    async def bills(self, ctx, page: int=1):
+        """Displays the currently proposed bills, a page at a time."""
+        if not await paginate(ctx, self.pages, ("bills",), BILLS, self.bills_page, page):
+            embed = discord.Embed(
+                title="Proposed Bills",
+                description="📜 There are currently no proposed bills.",
+                color=discord.Color.blue()
+            )
+            await ctx.send(embed=embed)
+
+    @commands.command()
+    async def laws(self, ctx, page: int=1):
+        """Displays the passed laws, a page at a time."""
+        if not await paginate(ctx, self.pages, ("laws",), LAWS, self.laws_page, page):
+            embed = discord.Embed(
+                title="Passed Laws",
+                description="📜 There are currently no passed laws.",
+                color=discord.Color.blue()
+            )
+            await ctx.send(embed=embed)
 
     @commands.command()
     @commands.has_role("RP Admin")
@@ -507,15 +456,16 @@ class Politics(commands.Cog):
                 await member.remove_roles(chancellor_role)
 
         # Step 2: Reset senator and chancellor status in the database
-        self.c.execute("UPDATE users SET senator = 0, chancellor = 0, vote_senate = 0, vote_chancellor = 0")
-        self.c.execute("DELETE FROM elections")
-        self.conn.commit()
+        def reset_elections(cur):
+            cur.execute("UPDATE users SET senator = 0, chancellor = 0, vote_senate = 0, vote_chancellor = 0")
+            cur.execute("DELETE FROM elections")
+
+        await self.db.transaction(reset_elections)
         await ctx.send("All previous election data has been cleared. Starting new elections...")
 
         # Step 3: Start new elections
         for district in OFFICIAL_DISTRICTS:
-            self.c.execute("SELECT user_id FROM users WHERE district = ?", (district,))
-            voters = [row[0] for row in self.c.fetchall()]
+            voters = [row[0] for row in await self.db.fetchall("SELECT user_id FROM users WHERE district = ?", (district,))]
 
             if not voters:
                 continue
@@ -558,8 +508,7 @@ class Politics(commands.Cog):
         #     await ctx.send(embed=embed)
         #     return
 
-        self.c.execute("SELECT vote_chancellor FROM users WHERE user_id = ?", (voter_id,))
-        row = self.c.fetchone()
+        row = await self.db.fetchone("SELECT vote_chancellor FROM users WHERE user_id = ?", (voter_id,))
         if row and row[0] != 0:
             embed = discord.Embed(
             title="Voter Fraud!",
@@ -570,10 +519,8 @@ class Politics(commands.Cog):
             return
 
 
-        self.c.execute("UPDATE users SET vote_chancellor = 1 WHERE user_id = ?", (voter_id,))
-        self.conn.commit()
-        self.c.execute("UPDATE elections SET chancellor_vote = ? WHERE voter = ?", (candidate.id, voter_id))
-        self.conn.commit()
+        await self.db.execute("UPDATE users SET vote_chancellor = 1 WHERE user_id = ?", (voter_id,))
+        await self.db.execute("UPDATE elections SET chancellor_vote = ? WHERE voter = ?", (candidate.id, voter_id))
 
         embed = discord.Embed(
             title="Chancellor Vote Recorded",
@@ -582,10 +529,8 @@ class Politics(commands.Cog):
         )
         await elections_announcements.send(embed=embed)
 
-        self.c.execute("SELECT COUNT(chancellor_vote) FROM elections WHERE chancellor_vote != 0")
-        total_votes = self.c.fetchone()[0]
-        self.c.execute("SELECT chancellor_vote, COUNT(chancellor_vote) as vote_count FROM elections WHERE chancellor_vote != 0 GROUP BY chancellor_vote ORDER BY vote_count DESC")
-        results = self.c.fetchall()
+        total_votes = (await self.db.fetchone("SELECT COUNT(chancellor_vote) FROM elections WHERE chancellor_vote != 0"))[0]
+        results = await self.db.fetchall("SELECT chancellor_vote, COUNT(chancellor_vote) as vote_count FROM elections WHERE chancellor_vote != 0 GROUP BY chancellor_vote ORDER BY vote_count DESC")
 
         if results and (results[0][1] > 5 / 2 or total_votes == 5):
             winner_id = results[0][0]
@@ -609,8 +554,7 @@ class Politics(commands.Cog):
         """Forces a user to become the Chancellor."""
         user_id = user.id
         chancellor_role = discord.utils.get(ctx.guild.roles, name="Chancellor")
-        self.c.execute("UPDATE users SET chancellor = 1 WHERE user_id = ?", (user_id,))
-        self.conn.commit()
+        await self.db.execute("UPDATE users SET chancellor = 1 WHERE user_id = ?", (user_id,))
         if chancellor_role:
             await user.add_roles(chancellor_role)
             embed = discord.Embed(
@@ -628,8 +572,7 @@ class Politics(commands.Cog):
         voter_id = ctx.author.id
         # Get the message author's district from the users table
         channel = self.bot.get_channel(1342194754921828465)
-        self.c.execute("SELECT district FROM users WHERE user_id = ?", (voter_id,))
-        row = self.c.fetchone()
+        row = await self.db.fetchone("SELECT district FROM users WHERE user_id = ?", (voter_id,))
         if not row:
             embed = discord.Embed(
             title="Voter Fraud!",
@@ -639,11 +582,9 @@ class Politics(commands.Cog):
             await ctx.send(embed=embed)
             return
         
-        self.c.execute("SELECT user_id FROM users WHERE district = ?", (row[0],))
-        users_in_district = self.c.fetchall()
+        users_in_district = await self.db.fetchall("SELECT user_id FROM users WHERE district = ?", (row[0],))
         for user in users_in_district:
-            self.c.execute("SELECT senator FROM users WHERE user_id = ?", (user[0],))
-            senator_row = self.c.fetchone()
+            senator_row = await self.db.fetchone("SELECT senator FROM users WHERE user_id = ?", (user[0],))
             if senator_row and senator_row[0] == 1:
                 embed = discord.Embed(
                 title="Election Over",
@@ -665,11 +606,9 @@ class Politics(commands.Cog):
             return
 
         # Check if the voter has already voted
-        self.c.execute("SELECT vote_senate FROM users WHERE user_id = ?", (voter_id,))
-        row = self.c.fetchone()
+        row = await self.db.fetchone("SELECT vote_senate FROM users WHERE user_id = ?", (voter_id,))
         if row and row[0] == 1:
-            self.c.execute("UPDATE elections SET candidate = ? WHERE voter = ?", (candidate.id, voter_id))
-            self.conn.commit()
+            await self.db.execute("UPDATE elections SET candidate = ? WHERE voter = ?", (candidate.id, voter_id))
             embed = discord.Embed(
             title="Vote Updated",
             description=f"{ctx.author.mention}, your vote has been updated to {candidate.mention}.",
@@ -679,10 +618,8 @@ class Politics(commands.Cog):
             return
 
         # Record the vote
-        self.c.execute("UPDATE users SET vote_senate = 1 WHERE user_id = ?", (voter_id,))
-        self.conn.commit()
-        self.c.execute("INSERT INTO elections (voter, candidate, district, chancellor_vote) VALUES (?, ?, ?, 0)", (voter_id, candidate.id, district))
-        self.conn.commit()
+        await self.db.execute("UPDATE users SET vote_senate = 1 WHERE user_id = ?", (voter_id,))
+        await self.db.execute("INSERT INTO elections (voter, candidate, district, chancellor_vote) VALUES (?, ?, ?, 0)", (voter_id, candidate.id, district))
 
         embed = discord.Embed(
             title="Vote Recorded",
@@ -692,12 +629,9 @@ class Politics(commands.Cog):
         await channel.send(embed=embed)
 
         # Check if a candidate has a majority of the votes or if everyone has voted
-        self.c.execute("SELECT COUNT(*) FROM users WHERE district = ?", (district,))
-        total_voters = self.c.fetchone()[0]
-        self.c.execute("SELECT COUNT(voter) FROM elections WHERE district = ?", (district,))
-        total_votes = self.c.fetchone()[0]
-        self.c.execute("SELECT candidate, COUNT(candidate) as vote_count FROM elections WHERE district = ? GROUP BY candidate ORDER BY vote_count DESC", (district,))
-        results = self.c.fetchall()
+        total_voters = (await self.db.fetchone("SELECT COUNT(*) FROM users WHERE district = ?", (district,)))[0]
+        total_votes = (await self.db.fetchone("SELECT COUNT(voter) FROM elections WHERE district = ?", (district,)))[0]
+        results = await self.db.fetchall("SELECT candidate, COUNT(candidate) as vote_count FROM elections WHERE district = ? GROUP BY candidate ORDER BY vote_count DESC", (district,))
 
         if results and (((results[0][1] > (total_voters / 2)) or total_votes == total_voters) and (total_voters != 1 and total_votes >= 3)):
             winner_id = results[0][0]
@@ -715,8 +649,7 @@ class Politics(commands.Cog):
         user_id = ctx.author.id
 
         # Check if the user is the owner of the party
-        self.c.execute("SELECT party_head FROM parties WHERE party = ?", (party,))
-        row = self.c.fetchone()
+        row = await self.db.fetchone("SELECT party_head FROM parties WHERE party = ?", (party,))
         if not row:
             await ctx.send(f"⚠️ Party **{party}** does not exist.")
             return
@@ -725,9 +658,11 @@ class Politics(commands.Cog):
             await ctx.send(f"⚠️ {ctx.author.mention}, only the party owner can delete the party.")
             return
 
-        self.c.execute("DELETE FROM parties WHERE party = ?", (party,))
-        self.c.execute("UPDATE users SET party = NULL WHERE party = ?", (party,))
-        self.conn.commit()
+        def remove_party(cur):
+            cur.execute("DELETE FROM parties WHERE party = ?", (party,))
+            cur.execute("UPDATE users SET party = NULL WHERE party = ?", (party,))
+
+        await self.db.transaction(remove_party)
         embed = discord.Embed(
             title="Party Deleted",
             description=f"✅ Party **{party}** has been deleted.",
@@ -736,20 +671,9 @@ class Politics(commands.Cog):
         await ctx.send(embed=embed)
 
     async def assign_senator(self, ctx, user_id, district):
-        """Assigns the senator role to the election winner and ensures the database schema is correct."""
-        
-        # Ensure the senator column exists
-        try:
-            self.c.execute("SELECT senator FROM users LIMIT 1;")  # Try accessing the column
-        except sqlite3.OperationalError:
-            # If the column doesn't exist, add it
-            self.c.execute("ALTER TABLE users ADD COLUMN senator INTEGER DEFAULT 0;")
-            self.conn.commit()
-            print("✅ Added 'senator' column to 'users' table.")
-
+        """Assigns the senator role to the election winner."""
         # Update the database to set the senator
-        self.c.execute("UPDATE users SET senator = 1 WHERE user_id = ?", (user_id,))
-        self.conn.commit()
+        await self.db.execute("UPDATE users SET senator = 1 WHERE user_id = ?", (user_id,))
 
         # Assign the Discord role
         member = ctx.guild.get_member(user_id)
@@ -770,8 +694,8 @@ class Politics(commands.Cog):
             await ctx.send("⚠️ Tax rates must be non-negative values.")
             return
         
-        self.c.execute("UPDATE tax_rate SET corporate_rate = ?, trade_rate = ?", (corporate_rate, trade_rate))
-        self.conn.commit()
+        await self.db.execute("UPDATE tax_rate SET corporate_rate = ?, trade_rate = ?", (corporate_rate, trade_rate))
+        self.bot.treasury.invalidate()
         
         embed = discord.Embed(
             title="Tax Rates Updated",
@@ -783,9 +707,8 @@ class Politics(commands.Cog):
     async def vote_bills(self):
         """Automatically announces voting every Sunday for all proposed bills of the current week."""
         today = datetime.datetime.now(datetime.timezone.utc)
-        self.c.execute("SELECT bill_number, bill_name, description, link FROM bills WHERE proposed_date >= ?", 
-                    ((today - datetime.timedelta(days=today.weekday())).strftime("%Y-%m-%d"),))
-        bills = self.c.fetchall()
+        bills = await self.db.fetchall("SELECT bill_number, bill_name, description, link FROM bills WHERE proposed_date >= ?",
+                                       ((today - datetime.timedelta(days=today.weekday())).strftime("%Y-%m-%d"),))
 
         if not bills:
             return  # No bills proposed this week
@@ -806,14 +729,12 @@ class Politics(commands.Cog):
     async def leave_party(self,ctx):
         user_id = ctx.author.id
 
-        self.c.execute("SELECT party FROM users WHERE user_id = ?", (user_id,))
-        row = self.c.fetchone()
+        row = await self.db.fetchone("SELECT party FROM users WHERE user_id = ?", (user_id,))
         if not row or not row[0]:
             await ctx.send("⚠️ You are not in a party.")
             return
 
-        self.c.execute("UPDATE users SET party = NULL WHERE user_id = ?", (user_id,))
-        self.conn.commit()
+        await self.db.execute("UPDATE users SET party = NULL WHERE user_id = ?", (user_id,))
         embed = discord.Embed(
             title="Party Left",
             description=f"✅ You have left the party **{row[0]}**.",
@@ -839,8 +760,7 @@ class Politics(commands.Cog):
             await ctx.send(embed=embed)
             return
         # Check if the voter is a Senator
-        self.c.execute("SELECT senator FROM users WHERE user_id = ?", (voter_id,))
-        row = self.c.fetchone()
+        row = await self.db.fetchone("SELECT senator FROM users WHERE user_id = ?", (voter_id,))
         if not row or row[0] == 0:
             await ctx.send(f"{ctx.author.mention}, only Senators can vote on bills.")
             return
@@ -850,13 +770,11 @@ class Politics(commands.Cog):
             return
 
         if vote.lower() == "aye":
-            self.c.execute("UPDATE bills SET votes = votes + 1 WHERE bill_number = ?", (bill_number,))
+            await self.db.execute("UPDATE bills SET votes = votes + 1 WHERE bill_number = ?", (bill_number,))
         else:
-            self.c.execute("UPDATE bills SET votes = votes + 0 WHERE bill_number = ?", (bill_number,))
+            await self.db.execute("UPDATE bills SET votes = votes + 0 WHERE bill_number = ?", (bill_number,))
 
-        self.conn.commit()
-        self.c.execute("SELECT bill_name FROM bills WHERE bill_number = ?", (bill_number,))
-        bill_name = self.c.fetchone()[0]
+        bill_name = (await self.db.fetchone("SELECT bill_name FROM bills WHERE bill_number = ?", (bill_number,)))[0]
         
         embed = discord.Embed(
             title="Vote Recorded",
@@ -866,14 +784,11 @@ class Politics(commands.Cog):
         await ctx.send(embed=embed)
         
         # Check if the bill has a majority vote
-        self.c.execute("SELECT COUNT(*) FROM users WHERE senator = 1")
-        total_senators = self.c.fetchone()[0]
-        self.c.execute("SELECT votes FROM bills WHERE bill_number = ?", (bill_number,))
-        bill_votes = self.c.fetchone()[0]
+        total_senators = (await self.db.fetchone("SELECT COUNT(*) FROM users WHERE senator = 1"))[0]
+        bill_votes = (await self.db.fetchone("SELECT votes FROM bills WHERE bill_number = ?", (bill_number,)))[0]
 
         if bill_votes > total_senators / 2:
-            self.c.execute("UPDATE bills SET passed = 1 WHERE bill_number = ?", (bill_number,))
-            self.conn.commit()
+            await self.db.execute("UPDATE bills SET passed = 1 WHERE bill_number = ?", (bill_number,))
             embed = discord.Embed(
             title="Bill Passed",
             description=f"📜 **{bill_name} (#{bill_number})** has been passed by the Senate and is now law!",
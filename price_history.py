@@ -0,0 +1,92 @@
+"""Price history: raw ticks plus OHLC candles rolled up as the ticks arrive.
+
+A series is a string key like a ledger account: ``resource:<district>`` for a district's
+resource price, ``share:<company_id>`` for a company's price per share. ``record``
+stores a batch of ticks and upserts the 1h, 1d and 1w candle each tick falls into
+inside the same transaction, so candles never need rebuilding from raw ticks.
+
+Raw ticks are kept for ``RETENTION_DAYS`` and then pruned; candles are kept for good.
+``price_candles`` is keyed on (series, resolution, bucket), so a month of daily
+candles is one range read of that key.
+"""
+import datetime
+
+RETENTION_DAYS = 30
+RESOLUTIONS = ("1h", "1d", "1w")
+
+TICK_SQL = "INSERT OR REPLACE INTO price_ticks (series, at, price) VALUES (?, ?, ?)"
+
+# Ticks arrive in time order, so the newest tick in a bucket is its close.
+CANDLE_SQL = """
+INSERT INTO price_candles (series, resolution, bucket, open, high, low, close, ticks)
+VALUES (?, ?, ?, ?, ?, ?, ?, 1)
+ON CONFLICT (series, resolution, bucket) DO UPDATE SET
+    high = MAX(high, excluded.high),
+    low = MIN(low, excluded.low),
+    close = excluded.close,
+    ticks = ticks + 1
+"""
+
+CANDLES_SQL = """
+SELECT bucket, open, high, low, close FROM price_candles
+WHERE series = ? AND resolution = ? AND bucket >= ? AND bucket <= ?
+ORDER BY bucket
+"""
+
+
+def resource_series(district):
+    return f"resource:{district}"
+
+
+def share_series(company_id):
+    return f"share:{company_id}"
+
+
+def _now():
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+def bucket(at, resolution):
+    """Start of the ``resolution`` candle containing datetime ``at``; weeks start on Monday."""
+    if resolution == "1h":
+        return at.replace(minute=0, second=0, microsecond=0)
+    day = at.replace(hour=0, minute=0, second=0, microsecond=0)
+    if resolution == "1d":
+        return day
+    return day - datetime.timedelta(days=day.weekday())
+
+
+def write_ticks(cur, ticks, at):
+    """Store [(series, price)] observed at datetime ``at`` and fold them into their candles.
+
+    For callers already inside a transaction; ``record`` wraps it in one.
+    """
+    stamp = at.isoformat()
+    cur.executemany(TICK_SQL, [(series, stamp, price) for series, price in ticks])
+    cur.executemany(CANDLE_SQL, [
+        (series, resolution, bucket(at, resolution).isoformat(), price, price, price, price)
+        for resolution in RESOLUTIONS
+        for series, price in ticks
+    ])
+
+
+async def record(db, ticks, at=None):
+    """Record a batch of [(series, price)] ticks taken at ``at`` (default: now)."""
+    if ticks:
+        await db.transaction(write_ticks, list(ticks), at or _now())
+
+
+async def prune(db, retention_days=RETENTION_DAYS):
+    """Delete raw ticks older than the retention window; returns how many were removed."""
+    cutoff = (_now() - datetime.timedelta(days=retention_days)).isoformat()
+    return await db.execute("DELETE FROM price_ticks WHERE at < ?", (cutoff,))
+
+
+async def candles(db, series, resolution="1d", start=None, end=None):
+    """[(bucket, open, high, low, close)] for a series between two datetimes, oldest first.
+
+    Defaults to the last 30 days up to now.
+    """
+    end = end or _now()
+    start = start or end - datetime.timedelta(days=30)
+    return await db.fetchall(CANDLES_SQL, (series, resolution, bucket(start, resolution).isoformat(), end.isoformat()))
@@ -0,0 +1,76 @@
+"""Resource price models.
+
+A model takes the current prices as a NumPy array and returns the next prices, one
+per ``resources`` row, in a single vectorized step. ``reprice`` reads every row with one
+query, runs a model and writes the result back with one ``executemany``, so the cost
+of a tick grows with the number of rows and not with a Python loop per district.
+
+Models are registered in ``MODELS`` by name:
+
+- ``random_walk``: an independent uniform move per row, the original behaviour.
+- ``mean_reverting``: geometric Brownian motion whose log price is pulled back
+  towards ``BASE_PRICE``.
+- ``supply_demand``: a resource with more units listed on the national market than
+  the average resource falls, a scarce one rises, plus a little noise.
+"""
+import numpy as np
+
+PRICE_FLOOR = 5.0  # Prices never drop below $5
+BASE_PRICE = 100.0  # resources.price_per_unit default
+
+# (district, price, units of the district's resource listed on the national market)
+MARKET_SQL = """
+SELECT r.district, r.price_per_unit,
+       COALESCE((SELECT SUM(nm.amount) FROM national_market nm WHERE nm.resource = r.resource), 0)
+FROM resources r
+"""
+
+
+def random_walk(prices, listed, rng, low=-0.10, high=0.15):
+    """Move every price by a uniform -10% to +15%."""
+    return prices * (1 + rng.uniform(low, high, prices.shape))
+
+
+def mean_reverting(prices, listed, rng, anchor=BASE_PRICE, speed=0.1, sigma=0.08):
+    """Close ``speed`` of the log distance to ``anchor``, plus a normal shock of ``sigma``."""
+    log_prices = np.log(prices)
+    step = speed * (np.log(anchor) - log_prices) + sigma * rng.standard_normal(prices.shape)
+    return np.exp(log_prices + step)
+
+
+def supply_demand(prices, listed, rng, elasticity=0.05, sigma=0.03):
+    """Price against market supply: ``elasticity`` per doubling of listings relative to the average resource."""
+    supply = np.log2((listed + 1) / (listed.mean() + 1))
+    return prices * np.exp(-elasticity * supply + sigma * rng.standard_normal(prices.shape))
+
+
+MODELS = {
+    "random_walk": random_walk,
+    "mean_reverting": mean_reverting,
+    "supply_demand": supply_demand,
+}
+
+
+def top_movers(changes, k=5):
+    """Indices of the ``k`` largest absolute changes, largest first, without sorting the whole array."""
+    if len(changes) <= k:
+        return np.argsort(-np.abs(changes))
+    top = np.argpartition(-np.abs(changes), k)[:k]
+    return top[np.argsort(-np.abs(changes[top]))]
+
+
+def _reprice(cur, model, rng):
+    rows = cur.execute(MARKET_SQL).fetchall()
+    if not rows:
+        return [], np.empty(0), np.empty(0)
+    districts = [row[0] for row in rows]
+    old = np.array([row[1] for row in rows], dtype=float)
+    listed = np.array([row[2] for row in rows], dtype=float)
+    new = np.maximum(PRICE_FLOOR, MODELS[model](np.maximum(old, PRICE_FLOOR), listed, rng))
+    cur.executemany("UPDATE resources SET price_per_unit = ? WHERE district = ?", zip(new.tolist(), districts))
+    return districts, old, new
+
+
+async def reprice(db, model="random_walk", rng=None):
+    """Step every resource price with a model in one transaction; returns (districts, old prices, new prices)."""
+    return await db.transaction(_reprice, model, rng or np.random.default_rng())
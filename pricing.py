@@ -0,0 +1,34 @@
+"""Share order pricing.
+
+Every share in an order is priced off the same company valuation, so the total
+for an N-share order is a closed form of (value, total_shares, N) and costs the
+same to compute for 1 share or 10,000.
+
+``SLIPPAGE`` optionally moves the price against the trader as the order fills:
+the k-th share (counting from 0) is priced at ``price * (1 ± SLIPPAGE * k / total_shares)``.
+It is 0 today, which prices every share at the current NAV per share.
+"""
+
+SLIPPAGE = 0.0
+
+
+def share_price(value, total_shares):
+    """NAV per share, or 0 for a company without shares."""
+    return value / total_shares if total_shares > 0 else 0
+
+
+def _filled(amount, total_shares, slippage):
+    """Sum over k < amount of (1 + slippage * k / total_shares)."""
+    if total_shares <= 0:
+        return amount
+    return amount + slippage * amount * (amount - 1) / (2 * total_shares)
+
+
+def buy_cost(value, total_shares, amount, slippage=SLIPPAGE):
+    """Total paid for buying ``amount`` shares of a company worth ``value``."""
+    return share_price(value, total_shares) * _filled(amount, total_shares, slippage)
+
+
+def sell_proceeds(value, total_shares, amount, slippage=SLIPPAGE):
+    """Total received, before tax, for selling ``amount`` shares of a company worth ``value``."""
+    return max(0, share_price(value, total_shares) * _filled(amount, total_shares, -slippage))
@@ -0,0 +1,88 @@
+"""Registry of the lookups commands run constantly, and a check that each one stays on an index.
+
+When adding a hot query to a cog, register it here with representative parameters,
+plus the aliases of any CTEs it is expected to scan.
+``check_query_plans`` runs ``EXPLAIN QUERY PLAN`` on every entry and reports the ones
+that fall back to a full table scan, so a missing or unusable index shows up at
+startup (and via the ``query_plans`` admin command) instead of as a slow bot.
+"""
+from checkpoints import DAILY_MOVES_SQL, LAST_CHECKPOINT_SQL, TAIL_SQL
+from loans import DUE_SQL
+from market import ASKS_SQL, BEST_ASK_SQL, DEPTH_SQL
+from pagination import BILLS, COMPANIES, LAWS, MARKET
+from payouts import ALL_USERS_SQL, DISTRICT_USERS_SQL, HOLDERS_SQL
+from price_history import CANDLES_SQL
+from valuation import BASE_VALUE_SQL, HOLDINGS_SQL, REACHABLE_SQL, UPSTREAM_SQL
+
+REACHABLE = "c.company_id IN (SELECT company_id FROM reachable)"
+
+HOT_QUERIES = [
+    ("user by id", "SELECT balance FROM users WHERE user_id = ?", (0,)),
+    ("users in district", "SELECT user_id FROM users WHERE district = ?", ("Corinthia",)),
+    ("company by ticker", "SELECT company_id, name FROM companies WHERE ticker = ?", ("TICK",)),
+    ("company by name", "SELECT company_id, balance FROM companies WHERE name = ?", ("name",)),
+    ("companies by owner", "SELECT name FROM companies WHERE owner_id = ?", (0,)),
+    ("holders of company", "SELECT owner_id, shares FROM ownership WHERE company_name = ?", ("name",)),
+    ("holders by id", "SELECT holder_id, shares FROM holdings WHERE company_id = ?", (0,)),
+    ("largest holder", "SELECT owner_id FROM ownership WHERE company_name = ? ORDER BY shares DESC LIMIT 1", ("name",)),
+    ("shares outstanding", "SELECT SUM(shares) FROM ownership WHERE company_name = ?", ("name",)),
+    ("portfolio", "SELECT company_name, shares FROM ownership WHERE owner_id = ?", (0,)),
+    ("holding", "SELECT shares FROM ownership WHERE owner_id = ? AND company_name = ?", (0, "name")),
+    ("listing", "SELECT amount FROM national_market WHERE comp_id = ? AND resource = ?", (0, "Metal")),
+    ("listings of resource", "SELECT AVG(price_per_unit) FROM national_market WHERE resource = ?", ("Metal",)),
+    ("asks to sweep", ASKS_SQL, ("Metal", 100.0, 0)),
+    ("best ask", BEST_ASK_SQL, ("Metal",)),
+    ("market depth", DEPTH_SQL, ("Metal", 10)),
+    ("company stockpile", "SELECT stockpile FROM company_resources WHERE comp_id = ? AND resource = ?", (0, "Metal")),
+    ("company stockpiles", "SELECT resource, stockpile FROM company_resources WHERE comp_id = ?", (0,)),
+    ("resource price", "SELECT price_per_unit FROM resources WHERE resource = ?", ("Metal",)),
+    ("district resource", "SELECT resource, stockpile FROM resources WHERE district = ?", ("Vordane",)),
+    ("company base value", REACHABLE_SQL + BASE_VALUE_SQL.format(where=REACHABLE), ('["name"]',), ("r", "reachable")),
+    ("company holdings", REACHABLE_SQL + HOLDINGS_SQL.format(where=REACHABLE), ('["name"]',), ("r", "reachable")),
+    ("dirty valuations", UPSTREAM_SQL, (), ("a", "affected")),
+    ("materialized value",
+     "SELECT c.name, v.nav FROM companies c JOIN company_valuations v ON v.company_id = c.company_id WHERE c.name = ?",
+     ("name",)),
+    ("balance checkpoint", LAST_CHECKPOINT_SQL, ("government", "2026-01-01")),
+    ("ledger tail", TAIL_SQL, {"account": "government", "since": "", "at": "2026-01-01"}),
+    ("ledger daily moves", DAILY_MOVES_SQL, {"account": "government", "since": "", "at": "2026-01-01"}, ("moves",)),
+    ("payout chunk: users", ALL_USERS_SQL, {"amount": 1, "after": 0, "limit": 500}),
+    ("payout chunk: district", DISTRICT_USERS_SQL, {"amount": 1, "district": "Vordane", "after": 0, "limit": 500}),
+    ("payout chunk: holders", HOLDERS_SQL, {"amount": 1, "company_id": 0, "after": 0, "limit": 500}),
+    ("due loan installments", DUE_SQL, ("2026-01-01",)),
+    ("open loans between", "SELECT loan_id, balance, accrued FROM loans WHERE lender = ? AND borrower = ? AND status = 'open' ORDER BY loan_id",
+     ("user:0", "user:1")),
+    ("price candles", CANDLES_SQL, ("resource:Vordane", "1d", "2026-01-01", "2026-02-01")),
+    ("market page", MARKET.after_sql, ("Metal", 100.0, "2026-01-01", 0, 5)),
+    ("market page start", MARKET.walk_after_sql, ("Metal", 100.0, "2026-01-01", 0, 4)),
+    ("companies page", COMPANIES.after_sql, (0, 5)),
+    ("companies page start", COMPANIES.walk_after_sql, (0, 4)),
+    ("bills page", BILLS.after_sql, (0, 5)),
+    ("laws page", LAWS.after_sql, (0, 5)),
+    ("laws page start", LAWS.walk_after_sql, (0, 4)),
+    ("district votes",
+     "SELECT candidate, COUNT(*) FROM elections WHERE district = ? GROUP BY candidate", ("Corinthia",)),
+]
+
+
+def plan_scans(detail_rows, allowed=()):
+    """Return the plan steps that read a whole table rather than searching an index."""
+    scans = []
+    for *_, detail in detail_rows:
+        if not detail.startswith("SCAN") or "CONSTANT ROW" in detail or "VIRTUAL TABLE" in detail:
+            continue
+        if detail.split()[1] in allowed:
+            continue
+        scans.append(detail)
+    return scans
+
+
+async def check_query_plans(db):
+    """Explain every registered hot query; returns ``[(name, scan_steps)]`` for the ones that scan."""
+    regressions = []
+    for name, sql, params, *allowed in HOT_QUERIES:
+        rows = await db.explain(sql, params)
+        scans = plan_scans(rows, *allowed)
+        if scans:
+            regressions.append((name, scans))
+    return regressions
@@ -1,63 +1,26 @@
-import sqlite3
+import datetime
 import random
 import discord
 from discord.ext import commands, tasks
+from ledger import company_account
+from market import BEST_ASK_SQL, DEPTH_SQL, sweep_asks
+from pagination import MARKET
+from paginator import paginate
+
 
 class Resources(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.conn = sqlite3.connect("game.db", check_same_thread=False)
-        self.c = self.conn.cursor()
-        self.setup_resources()
-
-    def setup_resources(self):
-        """Create resources table and initialize district resource production."""
-        self.c.execute("""
-        CREATE TABLE IF NOT EXISTS resources (
-            district TEXT PRIMARY KEY,
-            resource TEXT,
-            stockpile INTEGER DEFAULT 100000,
-            price_per_unit REAL DEFAULT 100.0
-        )
-        """)
-        self.c.execute("""
-        CREATE TABLE IF NOT EXISTS company_resources (
-            comp_id INTEGER DEFAULT 0,
-            district TEXT,
-            resource TEXT,
-            stockpile INTEGER DEFAULT 0,
-            FOREIGN KEY (comp_id) REFERENCES companies (company_id)
-        )
-        """)
-        self.c.execute("""
-        CREATE TABLE IF NOT EXISTS national_market(
-            comp_id INTEGER DEFAULT 0,
-            resource TEXT,
-            amount INTEGER DEFAULT 0,
-            price_per_unit REAL DEFAULT 0.0,
-            FOREIGN KEY (comp_id) REFERENCES companies (company_id)
-        )
-        """)
-        self.conn.commit()
-
-        # Initial resource assignments
-        initial_resources = {
-            "Corinthia": "Factories",
-            "Vordane": "Metal",
-            "Drakenshire": "Military Strength",
-            "Eldoria": "Silicon",
-            "Caelmont": "Luxury Goods"
-        }
-
-        for district, resource in initial_resources.items():
-            self.c.execute("INSERT OR IGNORE INTO resources (district, resource) VALUES (?, ?)", (district, resource))
-        self.conn.commit()
+        self.db = bot.db
+        self.directory = bot.directory
+        self.treasury = bot.treasury
+        self.ledger = bot.ledger
+        self.pages = bot.pages
 
     @commands.command(aliases=["cr"])
     async def check_resources(self, ctx):
         """Displays current resource stockpiles and prices."""
-        self.c.execute("SELECT * FROM resources")
-        rows = self.c.fetchall()
+        rows = await self.db.fetchall("SELECT * FROM resources")
 
         if not rows:
             await ctx.send("⚠️ No resource data available.")
@@ -76,21 +39,14 @@ class Resources(commands.Cog):
     @commands.command(aliases=["cor"])
     async def company_owned_resources(self, ctx, company: str):
         """Shows all reosources by a company"""
-        self.c.execute("SELECT name FROM companies WHERE ticker = ?", (company,))
-        ticker_result = self.c.fetchone()
-        
-        if ticker_result:
-            company = ticker_result[0]
+        company = self.directory.resolve(company)
             
-        self.c.execute("SELECT company_id FROM companies WHERE name = ?", (company,))
-        company_row = self.c.fetchone()
-        if not company_row:
+        company_id = self.directory.company_id(company)
+        if not company_id:
             await ctx.send("⚠️ Company not found.")
             return
-        company_id = company_row[0]
         
-        self.c.execute("SELECT * FROM company_resources WHERE comp_id = ?", (company_id,))
-        rows = self.c.fetchall()
+        rows = await self.db.fetchall("SELECT * FROM company_resources WHERE comp_id = ?", (company_id,))
         
         if not rows:
             await ctx.send("⚠️ No resource data available for this company.")
@@ -99,8 +55,7 @@ class Resources(commands.Cog):
         embed = discord.Embed(title=f"🏢 {company}", color=discord.Color.green())
         for row in rows:
             _, district, resource, stockpile = row
-            self.c.execute("SELECT price_per_unit FROM resources WHERE district = ?", (district,))
-            price_row = self.c.fetchone()
+            price_row = await self.db.fetchone("SELECT price_per_unit FROM resources WHERE district = ?", (district,))
             if not price_row:
                 await ctx.send(f"⚠️ Price not found for district {district}.")
                 return
@@ -117,31 +72,20 @@ class Resources(commands.Cog):
     async def harvest_resource(self, ctx, company_name: str, amount: int):
         """Allows a company to harvest resources from its assigned district at a cost that starts at 1/3rd the price of the material but becomes exponentially more expensive per resource harvested."""
         # Get the company ID from the company name
-        self.c.execute("SELECT name FROM companies WHERE ticker = ?", (company_name,))
-        ticker_result = self.c.fetchone()
-        
-        if ticker_result:
-            company_name = ticker_result[0]
+        company_name = self.directory.resolve(company_name)
             
-        self.c.execute("SELECT company_id FROM companies WHERE name = ?", (company_name,))
-        company_row = self.c.fetchone()
-        if not company_row:
+        company_id = self.directory.company_id(company_name)
+        if not company_id:
             await ctx.send("⚠️ Company doesnt exist.")
             return
-            
-        company_id = company_row[0]
         
         # Get the district assigned to the company
-        self.c.execute("SELECT owner_id FROM companies WHERE company_id = ?", (company_id,))
-        owner_row = self.c.fetchone()
-        if not owner_row:
+        owner_id = self.directory.owner(company_name)
+        if not owner_id:
             await ctx.send("⚠️ Owner doesnt own the company.")
             return
-            
-        owner_id = owner_row[0]
 
-        self.c.execute("SELECT district FROM users WHERE user_id = ?", (owner_id,))
-        district_row = self.c.fetchone()
+        district_row = await self.db.fetchone("SELECT district FROM users WHERE user_id = ?", (owner_id,))
         if not district_row:
             await ctx.send("⚠️ District not found for the user.")
             return
@@ -149,51 +93,58 @@ class Resources(commands.Cog):
         district = district_row[0]
 
         # Get the resource assigned to the district
-        self.c.execute("SELECT resource FROM resources WHERE district = ?", (district,))
-        resource_row = self.c.fetchone()
+        resource_row = await self.db.fetchone("SELECT resource FROM resources WHERE district = ?", (district,))
         if not resource_row:
             await ctx.send("⚠️ Resource not found in district.")
             return 
         
         resource = resource_row[0]
 
-        # Get the current stockpile and price of the resource in the district
-        self.c.execute("SELECT stockpile, price_per_unit FROM resources WHERE district = ?", (district,))
-        resource_row = self.c.fetchone()
+        # Get the price of the resource in the district; the stockpile is checked when the harvest settles
+        resource_row = await self.db.fetchone("SELECT price_per_unit FROM resources WHERE district = ?", (district,))
         if not resource_row:
             await ctx.send("⚠️ Resource not found in district.")
             return
         
-        stockpile, price_per_unit = resource_row
+        price_per_unit = resource_row[0]
 
-        if stockpile < amount:
+        cost = price_per_unit * amount * (1 + 0.1 * (amount - 1) / 2)
+
+        def harvest(cur):
+            # Both guards are checked before anything is written, so a failed harvest leaves no trace
+            stockpile = cur.execute("SELECT stockpile FROM resources WHERE district = ?", (district,)).fetchone()[0]
+            if stockpile < amount:
+                return "stockpile", stockpile
+            company_balance = cur.execute("SELECT balance FROM companies WHERE company_id = ?", (company_id,)).fetchone()[0]
+            if cost > company_balance:
+                return "balance", company_balance
+
+            # Deduct the cost from the company's balance
+            cur.execute("UPDATE companies SET balance = balance - ? WHERE company_id = ?", (cost, company_id))
+
+            # Deduct the resources from the district stockpile and add to the company's stockpile
+            cur.execute("UPDATE resources SET stockpile = stockpile - ? WHERE district = ?", (amount, district))
+            company_stockpile = cur.execute("SELECT stockpile FROM company_resources WHERE comp_id = ? AND resource = ?", (company_id, resource)).fetchone()
+            if company_stockpile:
+                cur.execute("UPDATE company_resources SET stockpile = stockpile + ? WHERE comp_id = ? AND resource = ?", (amount, company_id, resource))
+            else:
+                cur.execute("INSERT INTO company_resources (comp_id, resource, stockpile, district) VALUES (?, ?, ?, ?)", (company_id, resource, amount, district))
+            return None
+
+        shortfall = await self.db.transaction(harvest)
+        if shortfall and shortfall[0] == "stockpile":
             embed = discord.Embed(title="⚠️ Not enough resources", color=discord.Color.red())
-            embed.add_field(name="Available Stockpile", value=f"{stockpile} units", inline=True)
+            embed.add_field(name="Available Stockpile", value=f"{shortfall[1]} units", inline=True)
             embed.add_field(name="Requested Amount", value=f"{amount} units", inline=True)
             await ctx.send(embed=embed)
             return
-
-        cost = price_per_unit * amount * (1 + 0.1 * (amount - 1) / 2)
-        # Deduct the cost from the company's balance
-        if cost > (self.c.execute("SELECT balance FROM companies WHERE company_id = ?", (company_id,)).fetchone()[0]):
+        if shortfall:
             embed = discord.Embed(title="⚠️ Not enough balance", color=discord.Color.red())
-            embed.add_field(name="Available Balance", value=f"${self.c.execute('SELECT balance FROM companies WHERE company_id = ?', (company_id,)).fetchone()[0]:.2f}", inline=True)
+            embed.add_field(name="Available Balance", value=f"${shortfall[1]:.2f}", inline=True)
             embed.add_field(name="Required Amount", value=f"${cost:.2f}", inline=True)
             await ctx.send(embed=embed)
             return
-        
-        self.c.execute("UPDATE companies SET balance = balance - ? WHERE company_id = ?", (cost, company_id))
-        self.c.execute("UPDATE tax_rate SET government_balance = government_balance + ?", (cost,))
-  
-        # Deduct the resources from the district stockpile and add to the company's stockpile
-        self.c.execute("UPDATE resources SET stockpile = stockpile - ? WHERE district = ?", (amount, district))
-        self.c.execute("SELECT stockpile FROM company_resources WHERE comp_id = ? AND resource = ?", (company_id, resource))
-        company_stockpile = self.c.fetchone()
-        if company_stockpile:
-            self.c.execute("UPDATE company_resources SET stockpile = stockpile + ? WHERE comp_id = ? AND resource = ?", (amount, company_id, resource))
-        else:
-            self.c.execute("INSERT INTO company_resources (comp_id, resource, stockpile, district) VALUES (?, ?, ?, ?)", (company_id, resource, amount, district))
-        self.conn.commit()
+        self.treasury.collect(cost, company_account(company_id), "harvest", ctx.command.name)
         embed = discord.Embed(title="✅ Resource Harvested", color=discord.Color.green())
         embed.add_field(name="Company", value=company_name, inline=True)
         embed.add_field(name="Amount", value=f"{amount} units", inline=True)
@@ -202,199 +153,166 @@ class Resources(commands.Cog):
         
     @commands.command(aliases=["lm"])
     async def list_on_market(self, ctx, company: str, resource: str, amount: int, price: float):
+        """Places a sell order on the national market. Each listing is its own order, filled best price first."""
         if amount <= 0 or price <= 0:
             await ctx.send("⚠️ Amount and price must be greater than 0.")
             return
         
-        self.c.execute("SELECT name FROM companies WHERE ticker = ?", (company,))
-        ticker_result = self.c.fetchone()
-        
-        if ticker_result:
-            company = ticker_result[0]
+        company = self.directory.resolve(company)
         
-        self.c.execute("SELECT owner_id FROM companies WHERE name = ?", (company,))
-        owner_row = self.c.fetchone()
-        if not owner_row or owner_row[0] != ctx.author.id:
+        if self.directory.owner(company) != ctx.author.id:
             await ctx.send("⚠️ You are not the owner of this company.")
             return
         
-        self.c.execute("SELECT company_id FROM companies WHERE name = ?", (company,))
-        company_row = self.c.fetchone()
-        if not company_row:
+        company_id = self.directory.company_id(company)
+        if not company_id:
             await ctx.send("⚠️ Company not found.")
             return
         
-        company_id = company_row[0]
-        
         # Check if the company has enough of the resource to list
-        self.c.execute("SELECT stockpile FROM company_resources WHERE comp_id = ? AND resource = ?", (company_id, resource))
-        company_stockpile = self.c.fetchone()
+        company_stockpile = await self.db.fetchone("SELECT stockpile FROM company_resources WHERE comp_id = ? AND resource = ?", (company_id, resource))
         if not company_stockpile or company_stockpile[0] < amount:
             await ctx.send("⚠️ Not enough resources to list.")
             return
 
         price_per_unit = price
-        # Update the company's resource stockpile
-        self.c.execute("UPDATE company_resources SET stockpile = stockpile - ? WHERE comp_id = ? AND resource = ?", (amount, company_id, resource))
-        # Insert or update the national market with the listed resource
-        self.c.execute("SELECT comp_id FROM national_market WHERE comp_id = ? AND resource = ?", (company_id, resource))
-        market_row = self.c.fetchone()
-        if market_row:
-            self.c.execute("UPDATE national_market SET amount = amount + ?, price_per_unit = ? WHERE comp_id = ? AND resource = ?", (amount, price_per_unit, company_id, resource))
-        else:
-            self.c.execute("INSERT INTO national_market (comp_id, resource, amount, price_per_unit) VALUES (?, ?, ?, ?)", (company_id, resource, amount, price_per_unit))
-        
-        self.conn.commit()
+        listed_at = datetime.datetime.now(datetime.timezone.utc).isoformat()
+        # Move the units from the company's stockpile into a new sell order
+        def list_resource(cur):
+            cur.execute("UPDATE company_resources SET stockpile = stockpile - ? WHERE comp_id = ? AND resource = ?", (amount, company_id, resource))
+            return cur.execute(
+                "INSERT INTO national_market (comp_id, resource, amount, price_per_unit, listed_at) VALUES (?, ?, ?, ?, ?)",
+                (company_id, resource, amount, price_per_unit, listed_at)
+            ).lastrowid
+
+        order_id = await self.db.transaction(list_resource)
 
         embed = discord.Embed(title="✅ Resource Listed on Market", color=discord.Color.green())
         embed.add_field(name="Company", value=company, inline=True)
         embed.add_field(name="Resource", value=resource, inline=True)
         embed.add_field(name="Amount", value=f"{amount} units", inline=True)
         embed.add_field(name="Price per Unit", value=f"${price_per_unit:.2f}", inline=True)
+        embed.add_field(name="Order", value=f"#{order_id}", inline=True)
         await ctx.send(embed=embed)
         
     @commands.command(aliases=["bm"])
-    async def buy_from_market(self, ctx, company: str, company_selling: str, resource: str, amount: int):
-        self.c.execute("SELECT name FROM companies WHERE ticker = ?", (company,))
-        ticker_result = self.c.fetchone()
-        
-        if ticker_result:
-            company = ticker_result[0]
-            
-        self.c.execute("SELECT name FROM companies WHERE ticker = ?", (company_selling,))
-        ticker_result = self.c.fetchone()
-        
-        if ticker_result:
-            company_selling = ticker_result[0]
-        
-        self.c.execute("SELECT company_id FROM companies WHERE name = ?", (company,))
-        company_row = self.c.fetchone()
-        if not company_row:
-            raise commands.CommandError("⚠️ District not found for the resource.")
+    async def buy_from_market(self, ctx, company: str, resource: str, amount: int, max_price: float = None):
+        """Buys a resource from the cheapest sellers first, up to an optional price per unit."""
+        if amount <= 0 or (max_price is not None and max_price <= 0):
+            await ctx.send("⚠️ Amount and price must be greater than 0.")
             return
-        company_id = company_row[0]
-        
-        self.c.execute("SELECT company_id FROM companies WHERE name = ?", (company_selling,))
-        selling_company_row = self.c.fetchone()
-        if not selling_company_row:
-            await ctx.send("⚠️ Selling company not found.")
+
+        company = self.directory.resolve(company)
+        company_id = self.directory.company_id(company)
+        if not company_id:
+            await ctx.send("⚠️ Company not found.")
             return
-        selling_company_id = selling_company_row[0]
-        
-        # Check if the selling company has enough of the resource to sell
-        self.c.execute("SELECT amount, price_per_unit FROM national_market WHERE comp_id = ? AND resource = ?", (selling_company_id, resource))
-        market_row = self.c.fetchone()
-        if not market_row or market_row[0] < amount:
-            await ctx.send("⚠️ Not enough resources available on the market.")
+
+        if self.directory.owner(company) != ctx.author.id:
+            await ctx.send("⚠️ You are not the owner of this company.")
             return
-        available_amount, price_per_unit = market_row
-        # Check if the buying company has enough balance to buy
-        self.c.execute("SELECT balance FROM companies WHERE company_id = ?", (company_id,))
-        balance_row = self.c.fetchone()
-        if not balance_row or balance_row[0] < amount * price_per_unit:
+
+        tax_rate = await self.treasury.rate("corporate_rate")
+        result = await self.db.transaction(sweep_asks, company_id, resource, amount, max_price, tax_rate)
+        if result is None:
             await ctx.send("⚠️ Not enough balance to buy the resources.")
             return
-        
-        # Get the district from the resource being bought
-        self.c.execute("SELECT district FROM resources WHERE resource = ?", (resource,))
-        district_row = self.c.fetchone()
-        if not district_row:
-            await ctx.send("⚠️ District not found for the resource.")
+        if not result:
+            await ctx.send("⚠️ No sell orders for that resource at that price.")
             return
-        district = district_row[0]
-        
-        balance = balance_row[0]
-        total_cost = amount * price_per_unit
 
-        self.c.execute("SELECT corporate_rate FROM tax_rate")
-        tax_rate = self.c.fetchone()[0]
+        paid = {}
+        for seller_id, units, price in result:
+            paid[seller_id] = paid.get(seller_id, 0) + units * price
+        for seller_id, total in paid.items():
+            self.ledger.post(company_account(seller_id), company_account(company_id), total, "market purchase", ctx.command.name)
+        total_cost = sum(paid.values())
         taxed_amount = total_cost * tax_rate
-        total_cost_2 = total_cost + taxed_amount
-    
-        # Update the balances and stockpiles
-        self.c.execute("UPDATE companies SET balance = balance - ? WHERE company_id = ?", (total_cost_2, company_id))
-        self.c.execute("UPDATE companies SET balance = balance + ? WHERE company_id = ?", (total_cost, selling_company_id))
-        self.c.execute("UPDATE national_market SET amount = amount - ? WHERE comp_id = ? AND resource = ?", (amount, selling_company_id, resource))
-        self.c.execute("DELETE FROM national_market WHERE amount = 0")
-        self.c.execute("UPDATE tax_rate SET government_balance = government_balance + ?", (taxed_amount,))
-        self.c.execute("SELECT stockpile FROM company_resources WHERE comp_id = ? AND resource = ?", (company_id, resource))
-        company_stockpile = self.c.fetchone()
-        if company_stockpile:
-            self.c.execute("UPDATE company_resources SET stockpile = stockpile + ? WHERE comp_id = ? AND resource = ?", (amount, company_id, resource))
-        else:
-            self.c.execute("INSERT INTO company_resources (comp_id, resource, stockpile, district) VALUES (?, ?, ?, ?)", (company_id, resource, amount, district))
-        self.conn.commit()
-        
+        self.treasury.collect(taxed_amount, company_account(company_id), "corporate tax", ctx.command.name)
+        units = sum(units for _, units, _ in result)
+
         embed = discord.Embed(title="✅ Resource Purchased", color=discord.Color.green())
         embed.add_field(name="Buying Company", value=company, inline=True)
-        embed.add_field(name="Selling Company", value=company_selling, inline=True)
+        embed.add_field(name="Sellers", value=", ".join(self.directory.name(seller_id) or str(seller_id) for seller_id in paid), inline=True)
         embed.add_field(name="Resource", value=resource, inline=True)
-        embed.add_field(name="Units", value=f"{amount}", inline=True)
+        embed.add_field(name="Units", value=f"{units} of {amount}", inline=True)
+        embed.add_field(name="Average Price", value=f"${total_cost / units:.2f}", inline=True)
         embed.add_field(name="Tax", value=f"${taxed_amount:.2f}", inline=True)
         embed.add_field(name="Total Cost", value=f"${total_cost:.2f}", inline=True)
         await ctx.send(embed=embed)
-        
-    @commands.command(aliases=["sm"])
-    async def show_market(self,ctx, page: int=1):
-        items_per_page = 5
-        offset = (page - 1) * items_per_page
 
-        self.c.execute("SELECT * FROM national_market LIMIT ? OFFSET ?", (items_per_page, offset))
-        rows = self.c.fetchall()
-
-        if not rows:
-            await ctx.send("⚠️ No resources listed on the market.")
+    @commands.command(aliases=["md"])
+    async def market_depth(self, ctx, resource: str, levels: int = 10):
+        """Shows the best ask and the units offered at each of the lowest price levels for a resource."""
+        best = await self.db.fetchone(BEST_ASK_SQL, (resource,))
+        if not best:
+            await ctx.send("⚠️ No sell orders for that resource.")
             return
-
+        rows = await self.db.fetchall(DEPTH_SQL, (resource, min(max(levels, 1), 25)))
+        price, amount, seller_id = best
+        lines = [f"${level_price:>10,.2f}  {units:>8} units  ({orders} orders)" for level_price, units, orders in rows]
+        embed = discord.Embed(title=f"📊 {resource} Order Book", description="```" + "\n".join(lines) + "```", color=discord.Color.blue())
+        embed.add_field(name="Best Ask", value=f"${price:.2f} × {amount} from {self.directory.name(seller_id)}", inline=False)
+        await ctx.send(embed=embed)
+        
+    async def market_page(self, page, rows):
+        """Renders one page of the national market listing."""
         embed = discord.Embed(title="🌍 **National Market**", color=discord.Color.green())
-        for i, row in enumerate(rows, start=offset + 1):
-            comp_id, resource, amount, price_per_unit = row
-            self.c.execute("SELECT name FROM companies WHERE company_id = ?", (comp_id,))
-            company_name = self.c.fetchone()[0]
+        for i, row in enumerate(rows, start=(page - 1) * MARKET.page_size + 1):
+            order_id, _, company_name, resource, amount, price_per_unit = row
             embed.add_field(
-            name=f"{i}. 🏢 {company_name}",
+            name=f"{i}. 🏢 {company_name} (order #{order_id})",
             value=f"🔹 **Resource:** {resource}\n📦 **Amount:** {amount} units\n💰 **Price per Unit:** ${price_per_unit:.2f}",
             inline=False
             )
-        await ctx.send(embed=embed)          
+        embed.set_footer(text=f"Page {page}")
+        return embed
+
+    @commands.command(aliases=["sm"])
+    async def show_market(self,ctx, page: int=1):
+        if not await paginate(ctx, self.pages, ("sm",), MARKET, self.market_page, page):
+            await ctx.send("⚠️ No resources listed on the market.")
         
     @commands.command(aliases=["dm"])
     async def delist_resource(self, ctx, company: str, resource: str, amount: int):
-        """removes a resource from the market and adds it back to the company's stockpile"""
-        self.c.execute("SELECT name FROM companies WHERE ticker = ?", (company,))
-        ticker_result = self.c.fetchone()
+        """removes a resource from the market and adds it back to the company's stockpile, highest priced orders first"""
+        company = self.directory.resolve(company)
         
-        if ticker_result:
-            company = ticker_result[0]
-        
-        self.c.execute("SELECT company_id FROM companies WHERE name = ?", (company,))
-        company_row = self.c.fetchone()
-        if not company_row:
+        company_id = self.directory.company_id(company)
+        if not company_id:
             await ctx.send("⚠️ Company not found.")
             return
-        company_id = company_row[0]
         
         # Check if the company has enough of the resource to list
-        self.c.execute("SELECT amount FROM national_market WHERE comp_id = ? AND resource = ?", (company_id, resource))
-        company_stockpile = self.c.fetchone()
-        if not company_stockpile or company_stockpile[0] < amount:
+        company_stockpile = await self.db.fetchone("SELECT SUM(amount) FROM national_market WHERE comp_id = ? AND resource = ?", (company_id, resource))
+        if not company_stockpile[0] or company_stockpile[0] < amount:
             await ctx.send("⚠️ Not enough resources to delist.")
             return
 
         # Update the company's resource stockpile
-        self.c.execute("UPDATE company_resources SET stockpile = stockpile + ? WHERE comp_id = ? AND resource = ?", (amount, company_id, resource))
-        # Insert or update the national market with the listed resource
-        self.c.execute("UPDATE national_market SET amount = amount - ? WHERE comp_id = ? AND resource = ?", (amount, company_id, resource))
-        self.c.execute("DELETE FROM national_market WHERE amount = 0")
-        
-        self.conn.commit()
+        def delist(cur):
+            cur.execute("UPDATE company_resources SET stockpile = stockpile + ? WHERE comp_id = ? AND resource = ?", (amount, company_id, resource))
+            remaining = amount
+            orders = cur.execute(
+                "SELECT order_id, amount FROM national_market WHERE comp_id = ? AND resource = ? ORDER BY price_per_unit DESC, order_id DESC",
+                (company_id, resource)
+            ).fetchall()
+            for order_id, listed in orders:
+                if remaining <= 0:
+                    break
+                take = min(remaining, listed)
+                cur.execute("UPDATE national_market SET amount = amount - ? WHERE order_id = ?", (take, order_id))
+                remaining -= take
+            cur.execute("DELETE FROM national_market WHERE comp_id = ? AND resource = ? AND amount <= 0", (company_id, resource))
+
+        await self.db.transaction(delist)
 
         embed = discord.Embed(title="✅ Resource Delisted from Market", color=discord.Color.green())
         embed.add_field(name="Company", value=company, inline=True)
         embed.add_field(name="Resource", value=resource, inline=True)
         embed.add_field(name="Amount", value=f"{amount} units", inline=True)
-        await ctx.send(embed=embed)    
-    
+        await ctx.send(embed=embed)
+
     @harvest_resource.error
     async def harvest_resource_error(self, ctx, error):
         
@@ -0,0 +1,293 @@
+"""Limit order book for the shares of public companies.
+
+Open bids and asks rest in ``share_orders`` and, per company, in two in-memory heaps:
+bids by (-price, order_id) and asks by (price, order_id), so the best order is always
+on top and ties go to the oldest. Matching a new order pops resting orders off the
+opposite heap, O(log n) per fill, without touching the database.
+
+Placing an order escrows what it could pay, in the same transaction that records
+it: cash for a bid (moved to the ``escrow`` ledger account), shares for an ask
+(taken out of holdings). Every match the book finds can therefore settle. A fill
+executes at the resting order's price. The seller pays capital gains tax on the
+proceeds, and a bid that matched below its limit gets the difference back. An
+order never fills against the same account's orders on the other side.
+
+Fills queue in memory. ``flush`` settles them all in one transaction; it is run by a
+scheduled job, on shutdown and before any cancel or amend. ``load`` rebuilds the
+heaps from the open rows at startup. Fills not flushed before a crash are lost with
+the heaps, and their orders reload unfilled with their escrow intact.
+"""
+import datetime
+import heapq
+
+from ledger import ESCROW
+
+BID = "bid"
+ASK = "ask"
+COMMAND = "share_orders"
+
+OPEN_ORDERS_SQL = """
+SELECT order_id, account, company_id, side, price, shares FROM share_orders
+WHERE status = 'open'
+ORDER BY order_id
+"""
+
+
+def _cash(account):
+    """(table, key column, key) holding the cash of a user or company account."""
+    kind, _, key = account.partition(":")
+    return ("users", "user_id", int(key)) if kind == "user" else ("companies", "company_id", int(key))
+
+
+def _holder_id(account):
+    return int(account.partition(":")[2])
+
+
+def _pay(cur, account, amount):
+    table, column, key = _cash(account)
+    cur.execute(f"UPDATE {table} SET balance = balance + ? WHERE {column} = ?", (amount, key))
+
+
+def _give_shares(cur, account, company_id, shares):
+    cur.execute(
+        "INSERT INTO holdings (holder_id, company_id, shares) VALUES (?, ?, ?) "
+        "ON CONFLICT (holder_id, company_id) DO UPDATE SET shares = shares + excluded.shares",
+        (_holder_id(account), company_id, shares)
+    )
+
+
+def _open(cur, account, company_id, side, price, shares, placed_at):
+    """Escrow an order's cash or shares and record it; raises ValueError if the account cannot cover it."""
+    if side == BID:
+        table, column, key = _cash(account)
+        row = cur.execute(f"SELECT balance FROM {table} WHERE {column} = ?", (key,)).fetchone()
+        if not row or row[0] < price * shares:
+            raise ValueError("not enough balance to cover the bid")
+        _pay(cur, account, -price * shares)
+    else:
+        holder_id = _holder_id(account)
+        row = cur.execute("SELECT shares FROM holdings WHERE holder_id = ? AND company_id = ?", (holder_id, company_id)).fetchone()
+        if not row or row[0] < shares:
+            raise ValueError("not enough shares to cover the ask")
+        cur.execute("UPDATE holdings SET shares = shares - ? WHERE holder_id = ? AND company_id = ?", (shares, holder_id, company_id))
+        cur.execute("DELETE FROM holdings WHERE holder_id = ? AND company_id = ? AND shares <= 0", (holder_id, company_id))
+    return cur.execute(
+        "INSERT INTO share_orders (company_id, account, side, price, shares, placed_at) VALUES (?, ?, ?, ?, ?, ?)",
+        (company_id, account, side, price, shares, placed_at)
+    ).lastrowid
+
+
+def _release(cur, order, shares):
+    """Hand back the escrow of ``shares`` unfilled shares of an order."""
+    if order["side"] == BID:
+        _pay(cur, order["account"], order["price"] * shares)
+    else:
+        _give_shares(cur, order["account"], order["company_id"], shares)
+
+
+def _close(cur, order_id, order):
+    cur.execute("UPDATE share_orders SET status = 'cancelled' WHERE order_id = ?", (order_id,))
+    _release(cur, order, order["shares"])
+
+
+def _shrink(cur, order_id, order, released):
+    cur.execute("UPDATE share_orders SET shares = ? WHERE order_id = ?", (order["shares"], order_id))
+    _release(cur, order, released)
+
+
+def _replace(cur, order_id, order, price, shares, placed_at):
+    _close(cur, order_id, order)
+    return _open(cur, order["account"], order["company_id"], order["side"], price, shares, placed_at)
+
+
+def _settle(cur, fills, tax_rate):
+    cur.executemany(
+        "UPDATE share_orders SET shares = shares - ?, status = CASE WHEN shares - ? <= 0 THEN 'filled' ELSE status END "
+        "WHERE order_id = ?",
+        [(shares, shares, order_id) for bid_id, ask_id, _, _, _, _, shares, _ in fills for order_id in (bid_id, ask_id)]
+    )
+    for _, _, company_id, buyer, seller, limit, shares, price in fills:
+        _give_shares(cur, buyer, company_id, shares)
+        _pay(cur, seller, shares * price * (1 - tax_rate))
+        if limit > price:
+            _pay(cur, buyer, shares * (limit - price))
+
+
+class ShareBook:
+    def __init__(self, db, ledger, treasury):
+        self.db = db
+        self.ledger = ledger
+        self.treasury = treasury
+        self._orders = {}  # order_id -> open order, as last matched in memory
+        self._books = {}  # company_id -> {BID: heap, ASK: heap}; cancelled entries are skipped lazily
+        self._fills = []  # (bid_id, ask_id, company_id, buyer, seller, bid limit, shares, price) not yet settled
+
+    async def load(self):
+        """Rebuild the heaps from the open orders; returns how many were loaded."""
+        rows = await self.db.fetchall(OPEN_ORDERS_SQL)
+        self._orders.clear()
+        self._books.clear()
+        for order_id, account, company_id, side, price, shares in rows:
+            self._rest(order_id, {"account": account, "company_id": company_id, "side": side, "price": price, "shares": shares})
+        return len(rows)
+
+    def _rest(self, order_id, order):
+        book = self._books.setdefault(order["company_id"], {BID: [], ASK: []})
+        heapq.heappush(book[order["side"]], (-order["price"] if order["side"] == BID else order["price"], order_id))
+        self._orders[order_id] = order
+
+    def _best(self, company_id, side):
+        """(order_id, order) at the top of one side of a company's book, or None."""
+        heap = self._books.get(company_id, {}).get(side)
+        while heap and heap[0][1] not in self._orders:
+            heapq.heappop(heap)
+        return (heap[0][1], self._orders[heap[0][1]]) if heap else None
+
+    def _match(self, order_id, order):
+        opposite = ASK if order["side"] == BID else BID
+        fills = []
+        skipped = []  # The account's own resting orders, set aside so it cannot trade with itself
+        while order["shares"] > 0:
+            best = self._best(order["company_id"], opposite)
+            if not best:
+                break
+            resting_id, resting = best
+            if (resting["price"] > order["price"]) if order["side"] == BID else (resting["price"] < order["price"]):
+                break
+            if resting["account"] == order["account"]:
+                skipped.append(heapq.heappop(self._books[order["company_id"]][opposite]))
+                continue
+            shares = min(order["shares"], resting["shares"])
+            order["shares"] -= shares
+            resting["shares"] -= shares
+            bid_id, bid, ask_id, ask = (order_id, order, resting_id, resting) if order["side"] == BID else (resting_id, resting, order_id, order)
+            fills.append((bid_id, ask_id, order["company_id"], bid["account"], ask["account"], bid["price"], shares, resting["price"]))
+            if resting["shares"] == 0:
+                del self._orders[resting_id]
+        for entry in skipped:
+            heapq.heappush(self._books[order["company_id"]][opposite], entry)
+        if order["shares"] > 0:
+            self._rest(order_id, order)
+        self._fills.extend(fills)
+        return fills
+
+    async def place(self, account, company_id, side, price, shares):
+        """Escrow, record and match a limit order.
+
+        Returns (order_id, [(shares, price)] filled at once), or None if the account
+        cannot cover the order. Whatever does not fill rests in the book.
+        """
+        placed_at = datetime.datetime.now(datetime.timezone.utc).isoformat()
+        try:
+            order_id = await self.db.transaction(_open, account, company_id, side, price, shares, placed_at)
+        except ValueError:
+            return None
+        if side == BID:
+            self.ledger.post(ESCROW, account, price * shares, "share bid escrow", COMMAND)
+        order = {"account": account, "company_id": company_id, "side": side, "price": price, "shares": shares}
+        fills = self._match(order_id, order)
+        return order_id, [(fill[6], fill[7]) for fill in fills]
+
+    def order(self, order_id):
+        """The open order as of the latest match, or None if it is filled, cancelled or unknown."""
+        return self._orders.get(order_id)
+
+    async def cancel(self, order_id, account=None):
+        """Cancel an open order (only ``account``'s, if given) and refund its escrow; returns the order or None."""
+        order = self._orders.get(order_id)
+        if not order or (account is not None and order["account"] != account):
+            return None
+        del self._orders[order_id]  # Nothing can match it from here on
+        try:
+            await self.flush()  # Its earlier fills settle before the refund of the rest
+            await self.db.transaction(_close, order_id, order)
+        except Exception:
+            self._rest(order_id, order)  # Still open in the table with its escrow held, so keep it matchable
+            raise
+        if order["side"] == BID:
+            self.ledger.post(order["account"], ESCROW, order["price"] * order["shares"], "share bid refund", COMMAND)
+        return order
+
+    async def amend(self, order_id, account, price, shares):
+        """Change an open order's price or to a positive size.
+
+        Shrinking an order at the same price keeps its place in the queue and returns
+        (order_id, []). Any other change replaces it with a new order at the back of the
+        queue and returns (new order_id, fills) like ``place``. Returns None if the
+        order is not ``account``'s open order or the new size cannot be covered, in which
+        case the order is left as it was.
+        """
+        order = self._orders.get(order_id)
+        if not order or order["account"] != account:
+            return None
+        if price == order["price"] and shares <= order["shares"]:
+            released = order["shares"] - shares
+            if released == 0:
+                return order_id, []
+            order["shares"] = shares
+            try:
+                await self.flush()
+                await self.db.transaction(_shrink, order_id, order, released)
+            except Exception:
+                order["shares"] += released
+                raise
+            if order["side"] == BID:
+                self.ledger.post(account, ESCROW, order["price"] * released, "share bid refund", COMMAND)
+            return order_id, []
+
+        del self._orders[order_id]
+        placed_at = datetime.datetime.now(datetime.timezone.utc).isoformat()
+        try:
+            await self.flush()
+            new_id = await self.db.transaction(_replace, order_id, order, price, shares, placed_at)
+        except ValueError:
+            self._rest(order_id, order)
+            return None
+        except Exception:
+            self._rest(order_id, order)
+            raise
+        if order["side"] == BID:
+            self.ledger.post(account, ESCROW, order["price"] * order["shares"], "share bid refund", COMMAND)
+            self.ledger.post(ESCROW, account, price * shares, "share bid escrow", COMMAND)
+        new_order = {**order, "price": price, "shares": shares}
+        fills = self._match(new_id, new_order)
+        return new_id, [(fill[6], fill[7]) for fill in fills]
+
+    async def cancel_company(self, company_id):
+        """Cancel every open order for a company's shares, e.g. before it is deleted."""
+        order_ids = [order_id for order_id, order in self._orders.items() if order["company_id"] == company_id]
+        for order_id in order_ids:
+            await self.cancel(order_id)
+        self._books.pop(company_id, None)
+        return len(order_ids)
+
+    def depth(self, company_id, side, levels=5):
+        """[(price, shares, orders)] for the best ``levels`` prices on one side, best first."""
+        totals = {}
+        seen = set()  # An amend that failed can leave an order in its heap twice
+        for _, order_id in self._books.get(company_id, {}).get(side, []):
+            order = self._orders.get(order_id)
+            if order and order_id not in seen:
+                seen.add(order_id)
+                shares, count = totals.get(order["price"], (0, 0))
+                totals[order["price"]] = (shares + order["shares"], count + 1)
+        best = heapq.nlargest(levels, totals) if side == BID else heapq.nsmallest(levels, totals)
+        return [(price, *totals[price]) for price in best]
+
+    async def flush(self):
+        """Settle every fill matched since the last flush in one transaction; returns how many."""
+        fills, self._fills = self._fills, []
+        if not fills:
+            return 0
+        tax_rate = await self.treasury.rate("capital_gains_rate")
+        try:
+            await self.db.transaction(_settle, fills, tax_rate)
+        except Exception:
+            self._fills[:0] = fills  # Keep them, in order, for the next flush
+            raise
+        for _, _, _, buyer, seller, limit, shares, price in fills:
+            self.ledger.post(seller, ESCROW, shares * price, "share sale", COMMAND)
+            self.treasury.collect(shares * price * tax_rate, seller, "capital gains tax", COMMAND)
+            if limit > price:
+                self.ledger.post(buyer, ESCROW, shares * (limit - price), "share bid refund", COMMAND)
+        return len(fills)
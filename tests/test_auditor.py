@@ -0,0 +1,100 @@
+import asyncio
+import os
+import sqlite3
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from auditor import audit, repair
+from database import Database
+from migrations import migrate
+
+
+async def _migrated(path):
+    db = Database(str(path))
+    await db.configure()
+    await migrate(db)
+    return db
+
+
+def _break_invariants(path):
+    """One violation of each kind, written without foreign keys the way old data or a bug would leave them."""
+    conn = sqlite3.connect(path)
+    conn.executemany("INSERT INTO users (user_id, balance) VALUES (?, ?)", [(1, 100.0), (2, 100.0)])
+    # Alpha: 50 shares out, but holdings account for 30 once the bad rows go
+    conn.execute("INSERT INTO companies (company_id, name, shares_available, total_shares) VALUES (1, 'Alpha', 50, 100)")
+    # Beta: 10 shares out, escrowed by an open ask, so it is consistent
+    conn.execute("INSERT INTO companies (company_id, name, shares_available, total_shares, is_public) VALUES (2, 'Beta', 90, 100, 1)")
+    conn.execute("INSERT INTO share_orders (company_id, account, side, price, shares, placed_at) VALUES (2, 'user:1', 'ask', 5.0, 10, '2026-01-01')")
+    conn.executemany("INSERT INTO holdings (holder_id, company_id, shares) VALUES (?, ?, ?)",
+                     [(1, 1, 30), (2, 1, 0), (999, 1, 20)])
+    conn.execute("INSERT INTO company_resources (comp_id, district, resource, stockpile) VALUES (1, 'Vordane', 'Metal', -5)")
+    conn.execute("INSERT INTO company_resources (comp_id, district, resource, stockpile) VALUES (777, 'Vordane', 'Metal', 40)")
+    conn.execute("INSERT INTO national_market (comp_id, resource, amount, price_per_unit, listed_at) VALUES (777, 'Metal', 10, 5.0, '2026-01-01')")
+    conn.execute("UPDATE resources SET stockpile = -3 WHERE district = 'Corinthia'")
+    conn.execute("INSERT INTO loans (lender, borrower, principal, rate, date_issued, term_days, balance, accrued_through) "
+                 "VALUES ('user:1', 'user:12345', 50, 5, '2026-01-01', 28, 50, '2026-01-01')")
+    conn.execute("INSERT INTO loans (lender, borrower, principal, rate, date_issued, term_days, balance, accrued_through) "
+                 "VALUES ('user:1', 'company:2', 50, 5, '2026-01-01', 28, 50, '2026-01-01')")
+    conn.commit()
+    conn.close()
+
+
+def test_audit_reports_and_repair_fixes_every_violation(tmp_path):
+    path = tmp_path / "game.db"
+
+    async def setup():
+        db = await _migrated(path)
+        await db.close()
+
+    async def run():
+        db = await _migrated(path)
+        try:
+            found = await audit(db)
+            fixed = await repair(db)
+            after = await audit(db)
+            alpha = await db.fetchone("SELECT total_shares, shares_available FROM companies WHERE company_id = 1")
+            beta = await db.fetchone("SELECT total_shares, shares_available FROM companies WHERE company_id = 2")
+            holdings = await db.fetchall("SELECT holder_id, company_id, shares FROM holdings")
+            stockpiles = await db.fetchall("SELECT comp_id, stockpile FROM company_resources ORDER BY comp_id")
+            district = await db.fetchone("SELECT stockpile FROM resources WHERE district = 'Corinthia'")
+            listings = await db.fetchall("SELECT comp_id FROM national_market")
+            loans = await db.fetchall("SELECT borrower FROM loans")
+            return found, fixed, after, alpha, beta, holdings, stockpiles, district, listings, loans
+        finally:
+            await db.close()
+
+    asyncio.run(setup())
+    _break_invariants(path)
+    found, fixed, after, alpha, beta, holdings, stockpiles, district, listings, loans = asyncio.run(run())
+
+    assert sorted(found["empty_holdings"]) == [(2, 1, 0), (999, 1, 20)]
+    assert "share_mismatch" not in found  # The dangling 20 shares make up the count until they are removed
+    assert sorted(found["negative_stockpiles"]) == [("company", 1, "Metal", -5), ("district", "Corinthia", "Factories", -3)]
+    assert found["orphaned_resources"] == [(777, "Metal", 40)]
+    assert found["orphaned_listings"] == [(777, "Metal", 10)]
+    assert [row[2] for row in found["dangling_loans"]] == ["user:12345"]
+    assert "closed_cycles" not in found
+
+    # Share counts are reconciled after the bad holdings go, against what is left
+    assert fixed == {"empty_holdings": 2, "share_mismatch": 1, "negative_stockpiles": 2,
+                     "orphaned_resources": 1, "orphaned_listings": 1, "dangling_loans": 1}
+    assert after == {}
+    assert tuple(alpha) == (100, 70)
+    assert tuple(beta) == (100, 90)
+    assert [tuple(row) for row in holdings] == [(1, 1, 30)]
+    assert [tuple(row) for row in stockpiles] == [(1, 0)]
+    assert district[0] == 0
+    assert listings == []
+    assert [row[0] for row in loans] == ["company:2"]
+
+
+def test_clean_database_passes(tmp_path):
+    async def run():
+        db = await _migrated(tmp_path / "game.db")
+        try:
+            return await audit(db), await repair(db)
+        finally:
+            await db.close()
+
+    assert asyncio.run(run()) == ({}, {})
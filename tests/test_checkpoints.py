@@ -0,0 +1,99 @@
+import asyncio
+import datetime
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from checkpoints import balance_at, balance_history, take_checkpoint
+from database import Database
+from ledger import INSERT_SQL, MINT, Ledger, user_account
+from migrations import migrate
+
+ALICE = user_account(1)
+BOB = user_account(2)
+
+
+def _brute_force(entries, account, at):
+    return sum((amount if debit == account else -amount)
+               for posted_at, debit, credit, amount, *_ in entries
+               if account in (debit, credit) and posted_at <= at.isoformat())
+
+
+def test_balance_at_matches_the_full_ledger_across_checkpoints(tmp_path):
+    now = datetime.datetime.now(datetime.timezone.utc)
+    days = [now - datetime.timedelta(days=n) for n in (5, 4, 3, 2)]
+    entries = [
+        (days[0].isoformat(), ALICE, MINT, 1000.0, "grant", None),
+        (days[1].isoformat(), BOB, ALICE, 250.0, "transfer", None),
+        (days[2].isoformat(), ALICE, BOB, 40.0, "transfer", None),
+        (days[3].isoformat(), MINT, ALICE, 90.0, "fine", None),
+    ]
+
+    async def run():
+        db = Database(str(tmp_path / "game.db"))
+        try:
+            await db.configure()
+            await migrate(db)
+            ledger = Ledger(db)
+            await db.executemany(INSERT_SQL, entries)
+            results = {}
+            checkpointed = await take_checkpoint(db, ledger)
+            for moment in days + [now - datetime.timedelta(days=6)]:
+                results[moment] = (await balance_at(db, ALICE, moment), await balance_at(db, BOB, moment))
+
+            # Movements after the checkpoint are read from the ledger tail
+            ledger.post(ALICE, BOB, 10.0, "transfer")
+            await ledger.flush()
+            tail = (await balance_at(db, ALICE), await balance_at(db, BOB))
+            second = await take_checkpoint(db, ledger)
+            after = (await balance_at(db, ALICE), await balance_at(db, BOB))
+            stored = await db.fetchall("SELECT account, balance FROM balance_checkpoints ORDER BY taken_at, account")
+            return checkpointed, results, tail, second, after, stored
+        finally:
+            await db.close()
+
+    checkpointed, results, tail, second, after, stored = asyncio.run(run())
+    assert checkpointed >= 3  # Alice, Bob, the mint and any account with a seeded opening balance
+    for moment, (alice, bob) in results.items():
+        assert alice == pytest.approx(_brute_force(entries, ALICE, moment))
+        assert bob == pytest.approx(_brute_force(entries, BOB, moment))
+    assert results[days[3]] == (pytest.approx(1000 - 250 + 40 - 90), pytest.approx(210.0))
+    assert tail == (pytest.approx(710.0), pytest.approx(200.0))
+    assert second == 2  # Only Alice and Bob moved since
+    assert after == tail
+    assert [tuple(row) for row in stored[-2:]] == [(ALICE, pytest.approx(710.0)), (BOB, pytest.approx(200.0))]
+
+
+def test_balance_history_closes_each_day(tmp_path):
+    now = datetime.datetime.now(datetime.timezone.utc)
+    today = now.date()
+
+    def noon(days_ago):
+        return datetime.datetime.combine(today - datetime.timedelta(days=days_ago), datetime.time(12), datetime.timezone.utc)
+
+    entries = [
+        (noon(10).isoformat(), ALICE, MINT, 100.0, "grant", None),  # Before the window: the opening balance
+        (noon(2).isoformat(), ALICE, MINT, 50.0, "grant", None),
+        ((noon(2) + datetime.timedelta(hours=1)).isoformat(), MINT, ALICE, 30.0, "fine", None),
+        (min(noon(0), now - datetime.timedelta(seconds=1)).isoformat(), ALICE, MINT, 5.0, "grant", None),
+    ]
+
+    async def run():
+        db = Database(str(tmp_path / "game.db"))
+        try:
+            await db.configure()
+            await migrate(db)
+            await db.executemany(INSERT_SQL, entries)
+            return await balance_history(db, ALICE, days=3)
+        finally:
+            await db.close()
+
+    history = asyncio.run(run())
+    assert history == [
+        ((today - datetime.timedelta(days=2)).isoformat(), pytest.approx(120.0)),
+        ((today - datetime.timedelta(days=1)).isoformat(), pytest.approx(120.0)),
+        (today.isoformat(), pytest.approx(125.0)),
+    ]
@@ -0,0 +1,76 @@
+import asyncio
+import os
+import sqlite3
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database
+from migrations import MIGRATIONS, baseline, migrate
+
+
+def test_existing_database_moves_ownership_to_holdings(tmp_path):
+    """A database from before versioning keeps its share ownership, re-keyed on company_id behind the view."""
+    # What the bot created on load before migrations existed, with some history in it. Foreign
+    # keys were not enforced then, so ownership could outlive its company.
+    legacy = sqlite3.connect(tmp_path / "game.db")
+    baseline(legacy.cursor())
+    legacy.executemany("INSERT INTO companies (owner_id, name, balance) VALUES (?, ?, ?)",
+                       [(1, "Alpha", 1000.0), (2, "Beta", 300.0)])
+    legacy.executemany("INSERT INTO ownership (owner_id, company_name, shares) VALUES (?, ?, ?)",
+                       [(1, "Alpha", 60), (2, "Alpha", 40), (2, "Beta", 100), (3, "Gone", 25)])
+    legacy.commit()
+    legacy.close()
+
+    async def run():
+        db = Database(str(tmp_path / "game.db"))
+        try:
+            await db.configure()
+            version = await migrate(db)
+            ids = dict(await db.fetchall("SELECT name, company_id FROM companies"))
+            holdings = sorted(await db.fetchall("SELECT holder_id, company_id, shares FROM holdings"))
+            view = sorted(await db.fetchall("SELECT owner_id, company_name, shares FROM ownership"))
+
+            # The view still takes name-keyed writes
+            def legacy_writes(cur):
+                cur.execute("INSERT INTO ownership (owner_id, company_name, shares) VALUES (3, 'Beta', 5)")
+                cur.execute("UPDATE ownership SET shares = shares - 10 WHERE owner_id = 1 AND company_name = 'Alpha'")
+                cur.execute("DELETE FROM ownership WHERE owner_id = 2 AND company_name = 'Alpha'")
+
+            await db.execute("UPDATE company_valuations SET dirty = 0")
+            await db.transaction(legacy_writes)
+            written = sorted(await db.fetchall("SELECT holder_id, company_id, shares FROM holdings"))
+
+            # Holdings go with their company
+            await db.execute("DELETE FROM companies WHERE name = 'Beta'")
+            cascaded = sorted(await db.fetchall("SELECT holder_id, company_id, shares FROM holdings"))
+            return version, ids, holdings, view, written, cascaded
+        finally:
+            await db.close()
+
+    version, ids, holdings, view, written, cascaded = asyncio.run(run())
+    alpha, beta = ids["Alpha"], ids["Beta"]
+    assert version == MIGRATIONS[-1][0]
+    assert holdings == sorted([(1, alpha, 60), (2, alpha, 40), (2, beta, 100)])  # The row for a deleted company is dropped
+    assert view == sorted([(1, "Alpha", 60), (2, "Alpha", 40), (2, "Beta", 100)])
+    assert written == sorted([(1, alpha, 50), (2, beta, 100), (3, beta, 5)])
+    assert cascaded == [(1, alpha, 50)]
+
+
+def test_holding_writes_mark_the_holder_dirty(tmp_path):
+    """A company buying shares changes its NAV, so its valuation is marked dirty."""
+    async def run():
+        db = Database(str(tmp_path / "game.db"))
+        try:
+            await db.configure()
+            await migrate(db)
+            await db.executemany("INSERT INTO companies (name) VALUES (?)", [("Alpha",), ("Beta",)])
+            ids = dict(await db.fetchall("SELECT name, company_id FROM companies"))
+            await db.execute("UPDATE company_valuations SET dirty = 0")
+            await db.execute("INSERT INTO holdings (holder_id, company_id, shares) VALUES (?, ?, 10)", (ids["Alpha"], ids["Beta"]))
+            return ids, dict(await db.fetchall("SELECT company_id, dirty FROM company_valuations"))
+        finally:
+            await db.close()
+
+    ids, dirty = asyncio.run(run())
+    assert dirty == {ids["Alpha"]: 1, ids["Beta"]: 0}
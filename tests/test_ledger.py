@@ -0,0 +1,84 @@
+import asyncio
+import os
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database
+from ledger import MINT, Ledger, company_account, user_account
+from migrations import migrate
+
+ENTRIES_SQL = "SELECT debit, credit, amount, reason, command FROM ledger WHERE reason != 'opening balance' ORDER BY entry_id"
+
+
+def test_posts_are_buffered_and_written_in_order(tmp_path):
+    async def run():
+        db = Database(str(tmp_path / "game.db"))
+        try:
+            await db.configure()
+            await migrate(db)
+            ledger = Ledger(db)
+            ledger.post(user_account(1), MINT, 500.0, "ubi")
+            ledger.post(company_account(3), user_account(1), 120.0, "transfer", "send_to_company")
+            ledger.post(user_account(1), company_account(3), -20.0, "refund")  # Stored the other way round
+            ledger.post(user_account(2), MINT, 0, "nothing")  # Not stored
+            buffered = await db.fetchall(ENTRIES_SQL)
+            written = await ledger.flush()
+            return buffered, written, await db.fetchall(ENTRIES_SQL), await ledger.flush()
+        finally:
+            await db.close()
+
+    buffered, written, entries, again = asyncio.run(run())
+    assert buffered == []
+    assert written == 3
+    assert [tuple(entry) for entry in entries] == [
+        ("user:1", MINT, 500.0, "ubi", None),
+        ("company:3", "user:1", 120.0, "transfer", "send_to_company"),
+        ("company:3", "user:1", 20.0, "refund", None),
+    ]
+    assert again == 0
+
+
+def test_full_buffer_flushes_itself(tmp_path):
+    async def run():
+        db = Database(str(tmp_path / "game.db"))
+        try:
+            await db.configure()
+            await migrate(db)
+            ledger = Ledger(db, batch_size=3)
+            for i in range(4):
+                ledger.post(user_account(i), MINT, 1.0, "grant")
+            await ledger._flushing
+            flushed = len(await db.fetchall(ENTRIES_SQL))
+            await ledger.flush()
+            return flushed, len(await db.fetchall(ENTRIES_SQL))
+        finally:
+            await db.close()
+
+    assert asyncio.run(run()) == (4, 4)
+
+
+def test_failed_flush_keeps_entries_in_order(tmp_path):
+    async def run():
+        db = Database(str(tmp_path / "game.db"))
+        try:
+            await db.configure()
+            await migrate(db)
+            ledger = Ledger(db)
+            ledger.post(user_account(1), MINT, 1.0, "first")
+            await db.execute("ALTER TABLE ledger RENAME TO ledger_offline")
+            with pytest.raises(sqlite3.OperationalError):
+                await ledger.flush()
+            ledger.post(user_account(1), MINT, 2.0, "second")
+            await db.execute("ALTER TABLE ledger_offline RENAME TO ledger")
+            written = await ledger.flush()
+            return written, await db.fetchall(ENTRIES_SQL)
+        finally:
+            await db.close()
+
+    written, entries = asyncio.run(run())
+    assert written == 2
+    assert [entry[3] for entry in entries] == ["first", "second"]
@@ -0,0 +1,95 @@
+import asyncio
+import datetime
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database
+from loans import accrue_interest, collect_due, issue_loan, repay, schedule
+from migrations import migrate
+
+ISSUED = datetime.date(2026, 3, 2)
+LENDER, BORROWER, BROKE = "user:1", "user:2", "company:10"
+
+
+def test_schedule_splits_the_principal_over_the_term():
+    installments = schedule(100.0, ISSUED, term_days=20)
+    assert [due for _, due, _ in installments] == ["2026-03-09", "2026-03-16", "2026-03-22"]
+    assert [part for _, _, part in installments] == [33.33, 33.33, pytest.approx(33.34)]
+    assert sum(part for _, _, part in installments) == pytest.approx(100.0)
+
+
+async def _book(path):
+    """A lender, a borrower who can pay and a company that cannot, each with a 1000 loan at 36.5% a year."""
+    db = Database(str(path))
+    await db.configure()
+    await migrate(db)
+    await db.executemany("INSERT INTO users (user_id, balance) VALUES (?, ?)", [(1, 0.0), (2, 500.0)])
+    await db.execute("INSERT INTO companies (company_id, name, balance) VALUES (10, 'Broke', 5.0)")
+
+    def issue(cur):
+        return [issue_loan(cur, LENDER, borrower, 1000.0, 36.5, 28, ISSUED) for borrower in (BORROWER, BROKE)]
+
+    return db, await db.transaction(issue)
+
+
+def test_accrual_and_collection_move_real_balances(tmp_path):
+    async def run():
+        db, (loan, broke_loan) = await _book(tmp_path / "game.db")
+        try:
+            day_7 = (ISSUED + datetime.timedelta(days=7)).isoformat()
+            accrued = await accrue_interest(db, day_7)
+            again = await accrue_interest(db, day_7)
+            collected = await collect_due(db, day_7)
+            loans = {row[0]: tuple(row[1:]) for row in await db.fetchall("SELECT loan_id, balance, accrued, status FROM loans")}
+            paid = await db.fetchall("SELECT loan_id, installment FROM loan_schedule WHERE paid_at IS NOT NULL")
+            users = dict(await db.fetchall("SELECT user_id, balance FROM users"))
+            company = (await db.fetchone("SELECT balance FROM companies WHERE company_id = 10"))[0]
+            entries = await db.fetchall("SELECT debit, credit, amount, reason FROM ledger WHERE command = 'collect_loans' ORDER BY entry_id")
+            return loan, broke_loan, accrued, again, collected, loans, paid, users, company, entries
+        finally:
+            await db.close()
+
+    loan, broke_loan, accrued, again, collected, loans, paid, users, company, entries = asyncio.run(run())
+    assert (accrued, again) == (2, 0)
+    assert collected == {"collected": 1, "overdue": 1, "amount": pytest.approx(257.0)}
+    assert loans[loan] == (pytest.approx(750.0), pytest.approx(0.0), "open")
+    assert loans[broke_loan] == (pytest.approx(1000.0), pytest.approx(7.0), "open")  # Retried next run
+    assert [tuple(row) for row in paid] == [(loan, 1)]
+    assert users == {1: pytest.approx(257.0), 2: pytest.approx(243.0)}
+    assert company == pytest.approx(5.0)
+    assert [tuple(entry) for entry in entries] == [
+        (LENDER, BORROWER, pytest.approx(250.0), "loan repayment"),
+        (LENDER, BORROWER, pytest.approx(7.0), "loan interest"),
+    ]
+
+
+def test_repayment_is_capped_and_closes_the_loan(tmp_path):
+    async def run():
+        db, (loan, _) = await _book(tmp_path / "game.db")
+        try:
+            await accrue_interest(db, (ISSUED + datetime.timedelta(days=1)).isoformat())
+            # More than the borrower has: only the 500 they hold is applied
+            capped = await repay(db, LENDER, BORROWER, 5000.0)
+            partly = tuple(await db.fetchone("SELECT balance, accrued, status FROM loans WHERE loan_id = ?", (loan,)))
+            await db.execute("UPDATE users SET balance = 1000 WHERE user_id = 2")
+            rest = await repay(db, LENDER, BORROWER, 5000.0)
+            closed = tuple(await db.fetchone("SELECT balance, status FROM loans WHERE loan_id = ?", (loan,)))
+            unpaid = (await db.fetchone("SELECT COUNT(*) FROM loan_schedule WHERE loan_id = ? AND paid_at IS NULL", (loan,)))[0]
+            users = dict(await db.fetchall("SELECT user_id, balance FROM users"))
+            nothing = await repay(db, LENDER, BORROWER, 10.0)
+            return capped, partly, rest, closed, unpaid, users, nothing
+        finally:
+            await db.close()
+
+    capped, partly, rest, closed, unpaid, users, nothing = asyncio.run(run())
+    assert capped == pytest.approx(500.0)
+    assert partly == (pytest.approx(501.0), pytest.approx(0.0), "open")  # Interest (1.0) is paid first
+    assert rest == pytest.approx(501.0)
+    assert closed == (pytest.approx(0.0), "repaid")
+    assert unpaid == 0
+    assert users == {1: pytest.approx(1001.0), 2: pytest.approx(499.0)}
+    assert nothing == 0.0
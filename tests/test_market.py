@@ -0,0 +1,90 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database
+from market import sweep_asks
+from migrations import migrate
+
+BUYER, SELLER, OTHER = 1, 2, 3
+
+
+async def _market(path, buyer_balance):
+    db = Database(str(path))
+    await db.configure()
+    await migrate(db)
+    await db.executemany("INSERT INTO companies (company_id, name, balance) VALUES (?, ?, ?)",
+                         [(BUYER, "Buyer", buyer_balance), (SELLER, "Seller", 0.0), (OTHER, "Other", 0.0)])
+    await db.executemany(
+        "INSERT INTO national_market (order_id, comp_id, resource, amount, price_per_unit, listed_at) VALUES (?, ?, 'Metal', ?, ?, ?)",
+        [
+            (1, SELLER, 10, 5.0, "2026-01-02"),
+            (2, OTHER, 10, 5.0, "2026-01-01"),  # Same price, listed earlier: filled first
+            (3, SELLER, 5, 4.0, "2026-01-03"),  # Best price
+            (4, BUYER, 5, 1.0, "2026-01-01"),  # The buyer's own ask is never matched
+            (5, OTHER, 10, 9.0, "2026-01-01"),  # Over the limit
+        ]
+    )
+    return db
+
+
+async def _state(db):
+    return (
+        dict(await db.fetchall("SELECT company_id, balance FROM companies")),
+        dict(await db.fetchall("SELECT order_id, amount FROM national_market")),
+        [tuple(row) for row in await db.fetchall("SELECT comp_id, resource, stockpile, district FROM company_resources")],
+    )
+
+
+def test_sweep_fills_best_price_then_oldest(tmp_path):
+    async def run():
+        db = await _market(tmp_path / "game.db", 1000.0)
+        try:
+            fills = await db.transaction(sweep_asks, BUYER, "Metal", 20, 6.0, 0.1)
+            return fills, await _state(db)
+        finally:
+            await db.close()
+
+    fills, (balances, orders, stockpiles) = asyncio.run(run())
+    assert fills == [(SELLER, 5, 4.0), (OTHER, 10, 5.0), (SELLER, 5, 5.0)]
+    assert balances == {BUYER: pytest.approx(1000 - 95 * 1.1), SELLER: pytest.approx(45.0), OTHER: pytest.approx(50.0)}
+    assert orders == {1: 5, 4: 5, 5: 10}  # Filled orders are gone, the last one is partly filled
+    assert stockpiles == [(BUYER, "Metal", 20, "Vordane")]
+
+
+def test_sweep_stops_at_the_limit_and_adds_to_the_stockpile(tmp_path):
+    async def run():
+        db = await _market(tmp_path / "game.db", 1000.0)
+        try:
+            await db.execute("INSERT INTO company_resources (comp_id, district, resource, stockpile) VALUES (?, 'Vordane', 'Metal', 7)", (BUYER,))
+            fills = await db.transaction(sweep_asks, BUYER, "Metal", 100, 5.0, 0.0)
+            return fills, await _state(db)
+        finally:
+            await db.close()
+
+    fills, (balances, orders, stockpiles) = asyncio.run(run())
+    assert sum(units for _, units, _ in fills) == 25
+    assert balances[BUYER] == pytest.approx(1000 - 20 - 100)
+    assert orders == {4: 5, 5: 10}
+    assert stockpiles == [(BUYER, "Metal", 32, "Vordane")]
+
+
+def test_unaffordable_sweep_writes_nothing(tmp_path):
+    async def run():
+        db = await _market(tmp_path / "game.db", 50.0)
+        try:
+            before = await _state(db)
+            fills = await db.transaction(sweep_asks, BUYER, "Metal", 20, 6.0, 0.1)
+            empty = await db.transaction(sweep_asks, BUYER, "Metal", 20, 0.5, 0.1)
+            return fills, empty, before, await _state(db)
+        finally:
+            await db.close()
+
+    fills, empty, before, after = asyncio.run(run())
+    assert fills is None
+    assert empty == []
+    assert after == before
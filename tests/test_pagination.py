@@ -0,0 +1,113 @@
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database
+from migrations import migrate
+from pagination import Listing
+
+
+def _bills():
+    return Listing("b.bill_number, b.bill_name", "bills b", ("b.bill_number",), ("bills",), page_size=5)
+
+
+def _laws():
+    return Listing("b.bill_number, b.bill_name", "bills b", ("b.bill_number",), ("bills",), where="b.passed = 1", page_size=5)
+
+
+def _market():
+    return Listing(
+        "nm.order_id, c.name, nm.price_per_unit",
+        "national_market nm",
+        ("nm.resource", "nm.price_per_unit", "nm.listed_at", "nm.order_id"),
+        ("national_market", "companies"),
+        joins="JOIN companies c ON c.company_id = nm.comp_id",
+        page_size=4,
+    )
+
+
+def _chunks(rows, size):
+    return [rows[i:i + size] for i in range(0, len(rows), size)]
+
+
+async def _migrated(path):
+    db = Database(str(path))
+    await db.configure()
+    await migrate(db)
+    return db
+
+
+def test_pages_match_offset_paging_in_any_order_of_reads(tmp_path):
+    async def run():
+        db = await _migrated(tmp_path / "game.db")
+        try:
+            await db.executemany("INSERT INTO bills (bill_name, passed) VALUES (?, ?)",
+                                 [(f"Bill {n}", n % 3 == 0) for n in range(1, 24)])
+            every = [tuple(row) for row in await db.fetchall("SELECT bill_number, bill_name FROM bills ORDER BY bill_number")]
+            passed = [tuple(row) for row in await db.fetchall("SELECT bill_number, bill_name FROM bills WHERE passed = 1 ORDER BY bill_number")]
+
+            jumped = _bills()
+            jumps = {n: await jumped.page(db, n) for n in (4, 2, 5, 1, 3, 6)}  # Page 4 before anything is bookmarked
+            walked = _bills()
+            walk = [await walked.page(db, n) for n in range(1, 7)]
+            windowed = await _bills().window(db, 2, 3)
+            laws = _laws()
+            law_pages = [await laws.page(db, n) for n in (2, 1, 3)]
+            return every, passed, jumps, walk, windowed, law_pages
+        finally:
+            await db.close()
+
+    every, passed, jumps, walk, windowed, law_pages = asyncio.run(run())
+    expected = _chunks(every, 5) + [[]]
+    assert [[tuple(row) for row in page] for page in walk] == expected
+    assert {n: [tuple(row) for row in page] for n, page in jumps.items()} == {n: expected[n - 1] for n in range(1, 7)}
+    assert [[tuple(row) for row in page] for page in windowed] == expected[1:4]
+    assert [[tuple(row) for row in page] for page in law_pages] == [_chunks(passed, 5)[1], _chunks(passed, 5)[0], []]
+
+
+def test_composite_keys_break_ties_and_join_each_page(tmp_path):
+    async def run():
+        db = await _migrated(tmp_path / "game.db")
+        try:
+            await db.executemany("INSERT INTO companies (company_id, name) VALUES (?, ?)", [(1, "Alpha"), (2, "Beta")])
+            await db.executemany(
+                "INSERT INTO national_market (order_id, comp_id, resource, amount, price_per_unit, listed_at) VALUES (?, ?, ?, 1, ?, ?)",
+                [(n, 1 + n % 2, "Metal" if n % 3 else "Food", float(n % 4), f"2026-01-0{1 + n % 2}") for n in range(1, 16)]
+            )
+            expected = [tuple(row) for row in await db.fetchall(
+                "SELECT nm.order_id, c.name, nm.price_per_unit FROM national_market nm JOIN companies c ON c.company_id = nm.comp_id "
+                "ORDER BY nm.resource, nm.price_per_unit, nm.listed_at, nm.order_id"
+            )]
+            listing = _market()
+            pages = [await listing.page(db, n) for n in (3, 1, 2, 4, 5)]
+            return expected, pages
+        finally:
+            await db.close()
+
+    expected, pages = asyncio.run(run())
+    chunks = _chunks(expected, 4)
+    assert [[tuple(row) for row in page] for page in pages] == [chunks[2], chunks[0], chunks[1], chunks[3], []]
+
+
+def test_bookmarks_survive_writes(tmp_path):
+    """After a write, a page read from an old bookmark is still a correct keyset read past it."""
+    async def run():
+        db = await _migrated(tmp_path / "game.db")
+        try:
+            await db.executemany("INSERT INTO bills (bill_number, bill_name) VALUES (?, ?)", [(n * 10, f"Bill {n}") for n in range(1, 16)])
+            listing = _bills()
+            first = [await listing.page(db, n) for n in (1, 2)]
+            # One bill before page 2's bookmark is removed and one is added after it
+            await db.execute("DELETE FROM bills WHERE bill_number = 20")
+            await db.execute("INSERT INTO bills (bill_number, bill_name) VALUES (125, 'Late bill')")
+            later = [await listing.page(db, n) for n in (2, 3, 4)]
+            return first, later
+        finally:
+            await db.close()
+
+    first, later = asyncio.run(run())
+    assert [row[0] for row in first[1]] == [60, 70, 80, 90, 100]
+    # Page 2 still starts after bill 50, where it was bookmarked; what follows is read fresh
+    assert [[row[0] for row in page] for page in later] == [[60, 70, 80, 90, 100], [110, 120, 125, 130, 140], [150]]
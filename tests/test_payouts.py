@@ -0,0 +1,103 @@
+import asyncio
+import os
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database
+from migrations import migrate
+from payouts import airdrop, distribute_ubi, pay_dividend, resume_payouts, start_payout
+
+USERS = [(user_id, 100.0, "Vordane" if user_id % 2 else "Corinthia") for user_id in range(1, 8)]
+
+
+async def _seeded(path):
+    db = Database(str(path))
+    await db.configure()
+    await migrate(db)
+    await db.executemany("INSERT INTO users (user_id, balance, district) VALUES (?, ?, ?)", USERS)
+    return db
+
+
+async def _balances(db):
+    return dict(await db.fetchall("SELECT user_id, balance FROM users"))
+
+
+def test_rerunning_a_run_pays_nobody_twice(tmp_path):
+    async def run():
+        db = await _seeded(tmp_path / "game.db")
+        try:
+            first = await start_payout(db, "ubi-test", "ubi", 50.0, chunk_size=3)
+            again = await distribute_ubi(db, 50.0, run_id="ubi-test")
+            district = await airdrop(db, "drop-vordane", 10.0, district="Vordane")
+            entries = await db.fetchall("SELECT debit, credit, amount, reason, command FROM ledger WHERE command = 'ubi-test'")
+            run_row = await db.fetchone("SELECT paid, total, finished_at FROM payout_runs WHERE run_id = 'ubi-test'")
+            return first, again, district, await _balances(db), entries, run_row
+        finally:
+            await db.close()
+
+    first, again, district, balances, entries, run_row = asyncio.run(run())
+    assert (first["paid"], first["total"]) == (7, pytest.approx(350.0))
+    assert (again["paid"], again["total"]) == (0, 0.0)
+    assert district["paid"] == 4
+    assert balances == {user_id: pytest.approx(150.0 + (10.0 if user_id % 2 else 0)) for user_id, _, _ in USERS}
+    assert sorted(entry[0] for entry in entries) == sorted(f"user:{user_id}" for user_id, _, _ in USERS)
+    assert {(entry[1], entry[2], entry[3]) for entry in entries} == {("mint", 50.0, "ubi")}
+    assert run_row[0] == 7 and run_row[1] == pytest.approx(350.0) and run_row[2]
+
+
+def test_interrupted_run_resumes_where_it_stopped(tmp_path):
+    """A chunk that fails rolls back alone; resuming pays the rest, each user once."""
+    async def run():
+        db = await _seeded(tmp_path / "game.db")
+        try:
+            # Stand-in for a crash partway through: the chunk paying user 5 fails
+            await db.execute("CREATE TRIGGER crash BEFORE UPDATE ON users WHEN NEW.user_id = 5 BEGIN SELECT RAISE(ABORT, 'crash'); END")
+            with pytest.raises(sqlite3.IntegrityError):
+                await start_payout(db, "ubi-crash", "ubi", 50.0, chunk_size=3)
+            partial = await _balances(db)
+            progress = await db.fetchone("SELECT last_key, paid FROM payout_runs WHERE run_id = 'ubi-crash'")
+            await db.execute("DROP TRIGGER crash")
+
+            resumed = await resume_payouts(db)
+            return partial, tuple(progress), resumed, await _balances(db), await resume_payouts(db)
+        finally:
+            await db.close()
+
+    partial, progress, resumed, balances, nothing_left = asyncio.run(run())
+    assert progress == (3, 3)  # The first chunk of 3 committed
+    assert partial == {user_id: pytest.approx(150.0 if user_id <= 3 else 100.0) for user_id, _, _ in USERS}
+    assert resumed == ["ubi-crash"]
+    assert balances == {user_id: pytest.approx(150.0) for user_id, _, _ in USERS}
+    assert nothing_left == []
+
+
+def test_dividend_pays_user_and_company_holders_from_the_company(tmp_path):
+    async def run():
+        db = await _seeded(tmp_path / "game.db")
+        try:
+            await db.executemany("INSERT INTO companies (company_id, name, balance) VALUES (?, ?, ?)",
+                                 [(100, "Alpha", 1000.0), (200, "Beta", 0.0)])
+            await db.executemany("INSERT INTO holdings (holder_id, company_id, shares) VALUES (?, 100, ?)",
+                                 [(1, 30), (2, 20), (200, 50)])
+            stats = await pay_dividend(db, "div-alpha", 100, 2.0)
+            again = await pay_dividend(db, "div-alpha", 100, 2.0)
+            companies = dict(await db.fetchall("SELECT company_id, balance FROM companies"))
+            entries = sorted(await db.fetchall("SELECT debit, credit, amount FROM ledger WHERE command = 'div-alpha'"))
+            return stats, again, companies, await _balances(db), entries
+        finally:
+            await db.close()
+
+    stats, again, companies, balances, entries = asyncio.run(run())
+    assert (stats["paid"], stats["total"]) == (3, pytest.approx(200.0))
+    assert again["paid"] == 0
+    assert companies == {100: pytest.approx(800.0), 200: pytest.approx(100.0)}
+    assert balances[1] == pytest.approx(160.0) and balances[2] == pytest.approx(140.0) and balances[3] == pytest.approx(100.0)
+    assert [tuple(entry) for entry in entries] == [
+        ("company:200", "company:100", 100.0),
+        ("user:1", "company:100", 60.0),
+        ("user:2", "company:100", 40.0),
+    ]
@@ -0,0 +1,40 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pricing import buy_cost, sell_proceeds, share_price
+
+
+def _summed(value, total_shares, amount, slippage):
+    """The per-share loop the closed form replaces."""
+    price = share_price(value, total_shares)
+    return sum(price * (1 + slippage * k / total_shares) for k in range(amount))
+
+
+def test_share_price():
+    assert share_price(1000.0, 100) == 10.0
+    assert share_price(1000.0, 0) == 0
+
+
+@pytest.mark.parametrize("amount", [1, 2, 37, 1000])
+@pytest.mark.parametrize("slippage", [0.0, 0.05, 0.5])
+def test_closed_form_matches_the_per_share_sum(amount, slippage):
+    assert buy_cost(5000.0, 1000, amount, slippage) == pytest.approx(_summed(5000.0, 1000, amount, slippage))
+    assert sell_proceeds(5000.0, 1000, amount, slippage) == pytest.approx(_summed(5000.0, 1000, amount, -slippage))
+
+
+def test_without_slippage_every_share_trades_at_nav():
+    assert buy_cost(2500.0, 100, 40) == pytest.approx(1000.0)
+    assert sell_proceeds(2500.0, 100, 40) == pytest.approx(1000.0)
+
+
+def test_sell_proceeds_never_go_negative():
+    assert sell_proceeds(100.0, 10, 1000, slippage=1.0) == 0
+
+
+def test_companies_without_shares_cost_nothing():
+    assert buy_cost(100.0, 0, 5, slippage=0.5) == 0
+    assert sell_proceeds(100.0, 0, 5, slippage=0.5) == 0
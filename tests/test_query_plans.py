@@ -0,0 +1,24 @@
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database
+from migrations import migrate
+from query_plans import check_query_plans
+
+
+def test_hot_queries_use_indexes(tmp_path):
+    """Every registered hot query is served by an index on a freshly migrated database."""
+    async def run():
+        db = Database(str(tmp_path / "game.db"))
+        try:
+            await db.configure()
+            await migrate(db)
+            return await check_query_plans(db)
+        finally:
+            await db.close()
+
+    assert asyncio.run(run()) == []
+
@@ -0,0 +1,125 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from auditor import audit
+from database import Database
+from ledger import ESCROW, Ledger
+from migrations import migrate
+from share_orders import ASK, BID, ShareBook
+from treasury import Treasury
+
+COMPANY = 1
+SELLER, BUYER = "user:1", "user:2"
+
+
+async def _book(path):
+    """Seller holds all 100 shares of a public company; the buyer has 1000 in cash. Tax is 10%."""
+    db = Database(str(path))
+    await db.configure()
+    await migrate(db)
+    await db.execute("UPDATE tax_rate SET capital_gains_rate = 0.1")
+    await db.executemany("INSERT INTO users (user_id, balance) VALUES (?, ?)", [(1, 0.0), (2, 1000.0)])
+    await db.execute("INSERT INTO companies (company_id, name, shares_available, total_shares, is_public) VALUES (?, 'Alpha', 0, 100, 1)", (COMPANY,))
+    await db.execute("INSERT INTO holdings (holder_id, company_id, shares) VALUES (1, ?, 100)", (COMPANY,))
+    ledger = Ledger(db)
+    return db, ledger, ShareBook(db, ledger, Treasury(db, ledger))
+
+
+async def _state(db):
+    return (
+        dict(await db.fetchall("SELECT user_id, balance FROM users")),
+        dict(await db.fetchall("SELECT holder_id, shares FROM holdings WHERE company_id = ?", (COMPANY,))),
+        {row[0]: tuple(row[1:]) for row in await db.fetchall("SELECT order_id, shares, status FROM share_orders")},
+    )
+
+
+async def _escrow(db, ledger):
+    await ledger.flush()
+    row = await db.fetchone(
+        "SELECT COALESCE(SUM(CASE WHEN debit = ? THEN amount ELSE -amount END), 0) FROM ledger WHERE ? IN (debit, credit)",
+        (ESCROW, ESCROW)
+    )
+    return row[0]
+
+
+def test_orders_match_at_the_resting_price_and_settle_on_flush(tmp_path):
+    async def run():
+        db, ledger, book = await _book(tmp_path / "game.db")
+        try:
+            cheap, _ = await book.place(SELLER, COMPANY, ASK, 10.0, 30)
+            dear, _ = await book.place(SELLER, COMPANY, ASK, 12.0, 20)
+            bid, fills = await book.place(BUYER, COMPANY, BID, 11.0, 40)
+            matched = await _state(db)  # Escrowed, not settled yet
+            settled = await book.flush()
+            depth = book.depth(COMPANY, BID), book.depth(COMPANY, ASK)
+            unaffordable = await book.place(BUYER, COMPANY, BID, 100.0, 10)
+            return (cheap, dear, bid, fills, matched, settled, await _state(db), depth, unaffordable,
+                    await _escrow(db, ledger), await audit(db))
+        finally:
+            await db.close()
+
+    cheap, dear, bid, fills, matched, settled, (users, holdings, orders), depth, unaffordable, escrow, violations = asyncio.run(run())
+    assert fills == [(30, 10.0)]
+    assert matched[0] == {1: 0.0, 2: pytest.approx(560.0)}
+    assert matched[1] == {1: 50}
+    assert settled == 1
+    assert users == {1: pytest.approx(270.0), 2: pytest.approx(590.0)}  # 300 less tax; the buyer gets 1 a share back
+    assert holdings == {1: 50, 2: 30}
+    assert orders == {cheap: (0, "filled"), dear: (20, "open"), bid: (10, "open")}
+    assert depth == ([(11.0, 10, 1)], [(12.0, 20, 1)])
+    assert unaffordable is None
+    assert escrow == pytest.approx(110.0)  # What the resting bid still holds
+    assert violations == {}
+
+
+def test_cancel_amend_and_no_self_trades(tmp_path):
+    async def run():
+        db, ledger, book = await _book(tmp_path / "game.db")
+        try:
+            ask, _ = await book.place(SELLER, COMPANY, ASK, 12.0, 20)
+            bid, _ = await book.place(BUYER, COMPANY, BID, 10.0, 10)
+
+            not_theirs = await book.cancel(bid, SELLER)
+            shrunk = await book.amend(ask, SELLER, 12.0, 5)
+            too_big = await book.amend(ask, SELLER, 12.0, 500)
+            after_shrink = await _state(db)
+
+            # Repricing replaces the bid; it crosses the ask and fills there
+            repriced, fills = await book.amend(bid, BUYER, 12.0, 10)
+            await book.flush()
+
+            # The seller's own bid would cross nothing but their own ask, so it rests
+            await book.place(SELLER, COMPANY, ASK, 15.0, 5)
+            own_bid, own_fills = await book.place(SELLER, COMPANY, BID, 16.0, 3)
+            cancelled = await book.cancel(own_bid, SELLER)
+
+            reloaded = ShareBook(db, ledger, book.treasury)
+            count = await reloaded.load()
+            return (ask, bid, not_theirs, shrunk, too_big, after_shrink, repriced, fills, own_fills, cancelled, await _state(db),
+                    count, reloaded.depth(COMPANY, BID), reloaded.depth(COMPANY, ASK), await _escrow(db, ledger), await audit(db))
+        finally:
+            await db.close()
+
+    (ask, bid, not_theirs, shrunk, too_big, after_shrink, repriced, fills, own_fills, cancelled, (users, holdings, orders),
+     count, bids, asks, escrow, violations) = asyncio.run(run())
+    assert not_theirs is None
+    assert shrunk == (ask, [])
+    assert too_big is None  # The seller only has 80 more shares
+    assert after_shrink[1] == {1: 95}
+    assert after_shrink[2][ask] == (5, "open")
+    assert repriced != bid and fills == [(5, 12.0)]
+    assert own_fills == []
+    assert cancelled["shares"] == 3
+    assert orders[bid] == (10, "cancelled")
+    assert orders[repriced] == (5, "open")
+    assert users == {1: pytest.approx(54.0), 2: pytest.approx(880.0)}
+    assert holdings == {1: 90, 2: 5}
+    assert count == 2
+    assert bids == [(12.0, 5, 1)] and asks == [(15.0, 5, 1)]
+    assert escrow == pytest.approx(60.0)
+    assert violations == {}
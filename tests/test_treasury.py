@@ -0,0 +1,100 @@
+import asyncio
+import os
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database
+from ledger import GOVERNMENT, Ledger, user_account
+from migrations import migrate
+from treasury import Treasury
+
+
+def test_rates_are_cached_until_invalidated(tmp_path):
+    async def run():
+        db = Database(str(tmp_path / "game.db"))
+        try:
+            await db.configure()
+            await migrate(db)
+            treasury = Treasury(db, Ledger(db))
+            before = await treasury.rate("trade_rate")
+            await db.execute("UPDATE tax_rate SET trade_rate = 0.2")
+            cached = await treasury.rate("trade_rate")
+            treasury.invalidate()
+            return before, cached, await treasury.rate("trade_rate")
+        finally:
+            await db.close()
+
+    before, cached, fresh = asyncio.run(run())
+    assert cached == before
+    assert fresh == pytest.approx(0.2)
+
+
+def test_revenue_is_batched_into_one_write(tmp_path):
+    """Collections add up in memory, count towards the balance right away and land with one flush."""
+    async def run():
+        db = Database(str(tmp_path / "game.db"))
+        try:
+            await db.configure()
+            await migrate(db)
+            ledger = Ledger(db)
+            treasury = Treasury(db, ledger)
+            start = (await db.fetchone("SELECT government_balance FROM tax_rate"))[0]
+
+            treasury.collect(12.5, user_account(1), "trade tax")
+            treasury.collect(7.5, user_account(2), "trade tax")
+            treasury.collect(-5.0, user_account(1), "refund")
+            stored = (await db.fetchone("SELECT government_balance FROM tax_rate"))[0]
+            seen = await treasury.balance()
+
+            written = await treasury.flush()
+            nothing = await treasury.flush()
+            flushed = (await db.fetchone("SELECT government_balance FROM tax_rate"))[0]
+            await ledger.flush()
+            entries = await db.fetchall("SELECT debit, credit, amount FROM ledger WHERE reason IN ('trade tax', 'refund') ORDER BY entry_id")
+            return start, stored, seen, written, nothing, flushed, treasury.pending, entries
+        finally:
+            await db.close()
+
+    start, stored, seen, written, nothing, flushed, pending, entries = asyncio.run(run())
+    assert stored == start
+    assert seen == pytest.approx(start + 15.0)
+    assert written == pytest.approx(15.0)
+    assert nothing == 0.0
+    assert flushed == pytest.approx(start + 15.0)
+    assert pending == 0.0
+    assert [tuple(entry) for entry in entries] == [
+        (GOVERNMENT, "user:1", 12.5),
+        (GOVERNMENT, "user:2", 7.5),
+        ("user:1", GOVERNMENT, 5.0),
+    ]
+
+
+def test_failed_flush_keeps_the_revenue(tmp_path):
+    async def run():
+        db = Database(str(tmp_path / "game.db"))
+        try:
+            await db.configure()
+            await migrate(db)
+            treasury = Treasury(db, Ledger(db))
+            start = (await db.fetchone("SELECT government_balance FROM tax_rate"))[0]
+            treasury.collect(30.0, user_account(1), "trade tax")
+
+            await db.execute("ALTER TABLE tax_rate RENAME TO tax_rate_offline")
+            with pytest.raises(sqlite3.OperationalError):
+                await treasury.flush()
+            kept = treasury.pending
+            await db.execute("ALTER TABLE tax_rate_offline RENAME TO tax_rate")
+
+            written = await treasury.flush()
+            return start, kept, written, (await db.fetchone("SELECT government_balance FROM tax_rate"))[0]
+        finally:
+            await db.close()
+
+    start, kept, written, balance = asyncio.run(run())
+    assert kept == pytest.approx(30.0)
+    assert written == pytest.approx(30.0)
+    assert balance == pytest.approx(start + 30.0)
@@ -0,0 +1,89 @@
+import asyncio
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from auditor import audit
+from database import Database
+from migrations import migrate
+from valuation import company_values, solve
+
+
+def test_solve_values_chains_and_open_cycles():
+    """A chain passes value up; A and B holding half of each other solve V = base + H·V/total."""
+    navs = solve([10.0, 20.0, 40.0], [100, 100, 100], [0, 1], [1, 2], [50, 100])
+    assert navs == pytest.approx([10 + 0.5 * 60, 60, 40])
+
+    navs = solve([10.0, 20.0], [100, 100], [0, 1], [1, 0], [50, 50])
+    a, b = navs
+    assert a == pytest.approx(10 + 0.5 * b)
+    assert b == pytest.approx(20 + 0.5 * a)
+
+
+def test_solve_values_closed_cycles_without_their_cross_holdings():
+    """Companies holding all of each other get their own assets plus what they hold outside the cycle."""
+    # A and B hold each other outright, A holds half of C, and D holds half of A
+    navs = solve([10.0, 20.0, 8.0, 5.0], [100, 100, 100, 100], [0, 1, 0, 3], [1, 0, 2, 0], [100, 100, 50, 50])
+    assert np.all(np.isfinite(navs))
+    assert navs == pytest.approx([10 + 4, 20, 8, 5 + 0.5 * 14])
+
+
+def test_closed_cycles_are_valued_and_audited(tmp_path):
+    """company_values stays finite for a closed cycle and the auditor names its members."""
+    async def run():
+        db = Database(str(tmp_path / "game.db"))
+        try:
+            await db.configure()
+            await migrate(db)
+
+            def seed(cur):
+                cur.executemany("INSERT INTO companies (name, balance, shares_available, total_shares) VALUES (?, ?, 0, 100)",
+                                [("Alpha", 1000.0), ("Beta", 500.0), ("Gamma", 300.0)])
+                ids = dict(cur.execute("SELECT name, company_id FROM companies"))
+                cur.executemany("INSERT INTO holdings (holder_id, company_id, shares) VALUES (?, ?, 100)",
+                                [(ids["Alpha"], ids["Beta"]), (ids["Beta"], ids["Alpha"]), (ids["Gamma"], ids["Gamma"])])
+                return ids
+
+            ids = await db.transaction(seed)
+            values = await company_values(db, ["Alpha", "Beta", "Gamma"])
+            violations = await audit(db)
+            return ids, values, violations
+        finally:
+            await db.close()
+
+    ids, values, violations = asyncio.run(run())
+    assert values == {"Alpha": pytest.approx(1000.0), "Beta": pytest.approx(500.0), "Gamma": pytest.approx(300.0)}
+    members = sorted(company_id for _, company_id, _ in violations["closed_cycles"])
+    assert members == sorted(ids.values())
+    cycles = {cycle for cycle, _, _ in violations["closed_cycles"]}
+    assert len(cycles) == 2
+
+
+def test_open_cycles_are_not_audited(tmp_path):
+    """A cycle with shares held outside it has a finite value and is not reported."""
+    async def run():
+        db = Database(str(tmp_path / "game.db"))
+        try:
+            await db.configure()
+            await migrate(db)
+
+            def seed(cur):
+                cur.executemany("INSERT INTO companies (name, balance, shares_available, total_shares) VALUES (?, ?, 50, 100)",
+                                [("Alpha", 1000.0), ("Beta", 500.0)])
+                ids = dict(cur.execute("SELECT name, company_id FROM companies"))
+                cur.executemany("INSERT INTO holdings (holder_id, company_id, shares) VALUES (?, ?, 50)",
+                                [(ids["Alpha"], ids["Beta"]), (ids["Beta"], ids["Alpha"])])
+
+            await db.transaction(seed)
+            return await company_values(db, ["Alpha", "Beta"]), await audit(db)
+        finally:
+            await db.close()
+
+    values, violations = asyncio.run(run())
+    assert values["Alpha"] == pytest.approx(1000 + 0.5 * values["Beta"])
+    assert values["Beta"] == pytest.approx(500 + 0.5 * values["Alpha"])
+    assert "closed_cycles" not in violations
@@ -0,0 +1,70 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database
+from migrations import migrate
+from valuation import company_values, materialized_values, refresh_valuations
+
+
+def test_refresh_recomputes_dirty_companies_and_their_holders(tmp_path):
+    """A balance change marks the company dirty; the refresh revalues it and every company holding it."""
+    async def run():
+        db = Database(str(tmp_path / "game.db"))
+        try:
+            await db.configure()
+            await migrate(db)
+
+            def seed(cur):
+                cur.executemany("INSERT INTO companies (name, balance) VALUES (?, ?)",
+                                [("Alpha", 1000.0), ("Beta", 400.0), ("Gamma", 50.0)])
+                ids = dict(cur.execute("SELECT name, company_id FROM companies"))
+                cur.execute("INSERT INTO holdings (holder_id, company_id, shares) VALUES (?, ?, 50)", (ids["Alpha"], ids["Beta"]))
+                return ids
+
+            ids = await db.transaction(seed)
+            first = await refresh_valuations(db)
+            initial = await materialized_values(db)
+            again = await refresh_valuations(db)
+
+            await db.execute("UPDATE companies SET balance = balance + 600 WHERE company_id = ?", (ids["Beta"],))
+            dirty = dict(await db.fetchall("SELECT company_id, dirty FROM company_valuations WHERE dirty > 0"))
+            refreshed = await refresh_valuations(db)
+            after = await materialized_values(db)
+            live = await company_values(db)
+            versions = dict(await db.fetchall("SELECT company_id, version FROM company_valuations"))
+            prices = dict(await db.fetchall("SELECT company_id, price_per_share FROM company_valuations"))
+            return ids, first, initial, again, dirty, refreshed, after, live, versions, prices
+        finally:
+            await db.close()
+
+    ids, first, initial, again, dirty, refreshed, after, live, versions, prices = asyncio.run(run())
+    assert first == 3
+    assert initial == {"Alpha": pytest.approx(1200.0), "Beta": pytest.approx(400.0), "Gamma": pytest.approx(50.0)}
+    assert again == 0
+
+    assert dirty == {ids["Beta"]: 1}
+    assert refreshed == 2  # Beta, and Alpha which holds half of it
+    assert after == {"Alpha": pytest.approx(1500.0), "Beta": pytest.approx(1000.0), "Gamma": pytest.approx(50.0)}
+    assert after == pytest.approx(live)
+    assert versions == {ids["Alpha"]: 2, ids["Beta"]: 2, ids["Gamma"]: 1}
+    assert prices[ids["Beta"]] == pytest.approx(10.0)
+
+
+def test_unvalued_companies_are_computed_live(tmp_path):
+    """A company created since the last refresh is valued live instead of reading 0."""
+    async def run():
+        db = Database(str(tmp_path / "game.db"))
+        try:
+            await db.configure()
+            await migrate(db)
+            await db.execute("INSERT INTO companies (name, balance) VALUES ('Delta', 250.0)")
+            return await materialized_values(db, ["Delta", "Nobody"])
+        finally:
+            await db.close()
+
+    assert asyncio.run(run()) == {"Delta": pytest.approx(250.0), "Nobody": 0}
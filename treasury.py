@@ -0,0 +1,61 @@
+"""Tax rates and government revenue without touching the tax_rate row on every trade.
+
+Almost every trade read a rate from ``tax_rate`` and then added its tax to
+``government_balance`` on that same single row. The rates are now read once and kept
+in memory until ``invalidate`` (after set_tax or reload_tax_table). Revenue from
+committed trades adds up in memory. ``flush`` writes it with one
+``government_balance = government_balance + ?``, run by a scheduled job and on
+shutdown. Every collection is also posted to the ledger against the account that paid it.
+"""
+from ledger import GOVERNMENT
+
+RATES_SQL = "SELECT trade_rate, corporate_rate, capital_gains_rate FROM tax_rate"
+
+
+class Treasury:
+    def __init__(self, db, ledger):
+        self.db = db
+        self.ledger = ledger
+        self._rates = None
+        self.pending = 0.0  # Revenue collected but not yet written to government_balance
+
+    async def rates(self):
+        """{rate name: rate} for trade_rate, corporate_rate and capital_gains_rate."""
+        if self._rates is None:
+            row = await self.db.fetchone(RATES_SQL)
+            self._rates = dict(zip(("trade_rate", "corporate_rate", "capital_gains_rate"), row or (0, 0, 0)))
+        return self._rates
+
+    async def rate(self, name):
+        return (await self.rates())[name]
+
+    def invalidate(self):
+        """Drop the cached rates; call after any write to the rate columns."""
+        self._rates = None
+
+    def collect(self, amount, account, reason, command=None):
+        """Move ``amount`` from ``account`` to the government (or back, when negative).
+
+        Call only once the trade has committed.
+        """
+        self.pending += amount
+        self.ledger.post(GOVERNMENT, account, amount, reason, command)
+
+    async def flush(self):
+        """Write the revenue collected so far; returns the amount written."""
+        amount, self.pending = self.pending, 0.0
+        if not amount:
+            return 0.0
+        try:
+            await self.db.execute("UPDATE tax_rate SET government_balance = government_balance + ?", (amount,))
+        except Exception:
+            self.pending += amount  # Keep it for the next flush
+            raise
+        return amount
+
+    async def balance(self):
+        """The government balance including revenue not flushed yet, or None if there is no tax row."""
+        row = await self.db.fetchone("SELECT government_balance FROM tax_rate")
+        if row is None:
+            return None
+        return row[0] + self.pending
@@ -0,0 +1,281 @@
+"""Company valuation over the whole cross-holding graph.
+
+A company is worth its own assets (balance, resource stockpiles and market listings
+at the district price) plus its stake in every company it holds shares of, valued
+at that company's full NAV per share:
+
+    V = base + H · (V / total_shares)
+
+where ``H[i, j]`` is the number of shares company i holds in company j. Everything
+is solved at once with NumPy, so holding chains of any depth and cycles (A holds B,
+B holds A) are valued consistently instead of stopping at the held company's balance.
+
+A closed cycle, a group of companies that hold all of each other's shares, has no
+finite solution. Its members are valued without their stakes in one another: their
+own assets plus what they hold outside the group. The auditor reports these groups
+(``closed_cycles`` in auditor.py).
+
+Listings and leaderboards read the materialized ``company_valuations`` table instead;
+``refresh_valuations`` keeps it current by recomputing only dirty companies.
+"""
+import datetime
+import json
+
+import numpy as np
+
+from price_history import share_series, write_ticks
+
+# Systems up to this many companies are solved directly; larger ones iterate over the edge list.
+DIRECT_SOLVE_LIMIT = 1500
+TOLERANCE = 1e-9
+MAX_ITERATIONS = 500
+# A company counts as wholly held by a group once this fraction of its shares is.
+CLOSED_FRACTION = 1 - 1e-9
+
+# Companies whose value depends on the seed set: the seeds plus everything they hold, transitively.
+REACHABLE_SQL = """
+WITH RECURSIVE reachable(company_id) AS (
+    SELECT company_id FROM companies WHERE name IN (SELECT value FROM json_each(?))
+    UNION
+    SELECT h.company_id
+    FROM reachable r
+    JOIN holdings h ON h.holder_id = r.company_id
+)
+"""
+
+# Companies holding any dirty company, transitively; their NAV moves with it.
+UPSTREAM_SQL = """
+WITH RECURSIVE affected(company_id) AS (
+    SELECT company_id FROM company_valuations WHERE dirty > 0
+    UNION
+    SELECT holder.company_id
+    FROM affected a
+    JOIN holdings h ON h.company_id = a.company_id
+    JOIN companies holder ON holder.company_id = h.holder_id
+)
+SELECT c.company_id, c.name, c.total_shares, v.dirty
+FROM affected a
+JOIN companies c ON c.company_id = a.company_id
+JOIN company_valuations v ON v.company_id = c.company_id
+"""
+
+# A company's own assets, excluding its stakes in other companies.
+BASE_VALUE_SQL = """
+SELECT c.company_id, c.name, c.total_shares,
+       c.balance
+       + COALESCE((SELECT SUM(cr.stockpile * (SELECT r.price_per_unit FROM resources r WHERE r.resource = cr.resource LIMIT 1))
+                   FROM company_resources cr WHERE cr.comp_id = c.company_id), 0)
+       + COALESCE((SELECT SUM(nm.amount * (SELECT r.price_per_unit FROM resources r WHERE r.resource = nm.resource LIMIT 1))
+                   FROM national_market nm WHERE nm.comp_id = c.company_id), 0)
+FROM companies c
+WHERE {where}
+"""
+
+# Shares held by one company in another. holdings.holder_id holds either a user id or a
+# company_id; joining on companies keeps only the company holders.
+HOLDINGS_SQL = """
+SELECT h.holder_id, h.company_id, h.shares
+FROM holdings h
+JOIN companies c ON c.company_id = h.holder_id
+WHERE h.shares > 0 AND {where}
+"""
+
+
+def solve(base, total_shares, holder, held, shares):
+    """Solve V = base + H·(V / total_shares) for every company.
+
+    ``base`` and ``total_shares`` are per-company arrays; ``holder``, ``held`` and
+    ``shares`` are parallel edge arrays of company indexes and share counts.
+    Returns the NAV array.
+    """
+    base = np.asarray(base, dtype=float)
+    n = len(base)
+    if n == 0 or len(holder) == 0:
+        return base.copy()
+    holder = np.asarray(holder, dtype=np.int64)
+    held = np.asarray(held, dtype=np.int64)
+    total_shares = np.asarray(total_shares, dtype=float)
+    per_share = np.divide(1.0, total_shares, out=np.zeros(n), where=total_shares > 0)
+    weights = np.asarray(shares, dtype=float) * per_share[held]
+
+    # Closed cycles have no finite value; drop their members' stakes in each other
+    kept = ~_closed_edges(n, holder, held, weights)
+    holder, held, weights = holder[kept], held[kept], weights[kept]
+
+    if n <= DIRECT_SOLVE_LIMIT:
+        # (I - H·diag(1/total_shares)) V = base
+        system = np.eye(n)
+        np.subtract.at(system, (holder, held), weights)
+        try:
+            values = np.linalg.solve(system, base)
+            if np.all(np.isfinite(values)):
+                return values
+        except np.linalg.LinAlgError:
+            pass  # Holdings exceed total_shares somewhere; fall back to iterating
+
+    return _iterate(base, holder, held, weights)
+
+
+def _components(n, holder, held):
+    """Strongly connected component of every company in the holding graph; returns (labels, count)."""
+    forward = [[] for _ in range(n)]
+    backward = [[] for _ in range(n)]
+    for a, b in zip(holder.tolist(), held.tolist()):
+        forward[a].append(b)
+        backward[b].append(a)
+
+    # Kosaraju: finish order on the graph, then collect components on the reversed graph
+    order = []
+    seen = [False] * n
+    for start in range(n):
+        if seen[start]:
+            continue
+        seen[start] = True
+        stack = [(start, iter(forward[start]))]
+        while stack:
+            node, children = stack[-1]
+            for child in children:
+                if not seen[child]:
+                    seen[child] = True
+                    stack.append((child, iter(forward[child])))
+                    break
+            else:
+                stack.pop()
+                order.append(node)
+
+    labels = np.full(n, -1, dtype=np.int64)
+    count = 0
+    for start in reversed(order):
+        if labels[start] >= 0:
+            continue
+        labels[start] = count
+        stack = [start]
+        while stack:
+            for parent in backward[stack.pop()]:
+                if labels[parent] < 0:
+                    labels[parent] = count
+                    stack.append(parent)
+        count += 1
+    return labels, count
+
+
+def _closed_edges(n, holder, held, weights):
+    """Mask of the edges inside closed cycles.
+
+    A closed cycle is a strongly connected group of companies each of whose shares
+    are all held by members of the group.
+    """
+    closed = np.zeros(len(holder), dtype=bool)
+    if len(holder) == 0 or not np.any(np.bincount(held, weights=weights, minlength=n) >= CLOSED_FRACTION):
+        return closed  # Nobody is wholly held by companies, so no group can be closed
+    labels, count = _components(n, holder, held)
+    inside = labels[holder] == labels[held]
+    held_inside = np.bincount(held[inside], weights=weights[inside], minlength=n)
+    group_closed = np.ones(count, dtype=bool)
+    group_closed[labels[held_inside < CLOSED_FRACTION]] = False
+    return inside & group_closed[labels[holder]]
+
+
+def _iterate(base, holder, held, weights):
+    """Fixed-point iteration over the edge list.
+
+    Converges once closed cycles are cut, unless holdings exceed total_shares;
+    iteration is capped so that case still returns a value.
+    """
+    n = len(base)
+    values = base.copy()
+    for _ in range(MAX_ITERATIONS):
+        updated = base + np.bincount(holder, weights=weights * values[held], minlength=n)
+        if np.max(np.abs(updated - values)) <= TOLERANCE * max(1.0, np.max(np.abs(updated))):
+            return updated
+        values = updated
+    return values
+
+
+async def company_values(db, company_names=None):
+    """Value companies by name; returns {name: nav} with 0 for unknown names.
+
+    Only the requested companies and the companies they hold (transitively) are
+    loaded. Passing None values every company.
+    """
+    if company_names is None:
+        prefix, where, params = "", "1", ()
+    else:
+        company_names = list(dict.fromkeys(company_names))
+        if not company_names:
+            return {}
+        prefix = REACHABLE_SQL
+        where = "c.company_id IN (SELECT company_id FROM reachable)"
+        params = (json.dumps(company_names),)
+
+    companies = await db.fetchall(prefix + BASE_VALUE_SQL.format(where=where), params)
+    edges = await db.fetchall(prefix + HOLDINGS_SQL.format(where=where), params)
+
+    index = {company_id: i for i, (company_id, *_) in enumerate(companies)}
+    edges = [(index[owner], index[held], shares) for owner, held, shares in edges if held in index]
+    holder = np.array([edge[0] for edge in edges], dtype=np.int64)
+    held = np.array([edge[1] for edge in edges], dtype=np.int64)
+    shares = np.array([edge[2] for edge in edges], dtype=float)
+    navs = solve([row[3] for row in companies], [row[2] for row in companies], holder, held, shares)
+
+    values = {name: float(nav) for (_, name, *_), nav in zip(companies, navs)}
+    if company_names is None:
+        return values
+    return {name: values.get(name, 0) for name in company_names}
+
+
+async def refresh_valuations(db):
+    """Recompute the materialized NAV of every dirty company and everything holding it.
+
+    Returns the number of companies refreshed. A company changed again while this
+    runs keeps its dirty count and is picked up by the next refresh. Each new price
+    per share is recorded as a tick in the price history.
+    """
+    affected = await db.fetchall(UPSTREAM_SQL)
+    if not affected:
+        return 0
+    navs = await company_values(db, [name for _, name, _, _ in affected])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    updates = []
+    for company_id, name, total_shares, dirty in affected:
+        nav = navs[name]
+        updates.append((nav, nav / total_shares if total_shares > 0 else 0, now.isoformat(), dirty, company_id))
+
+    def store(cur):
+        cur.executemany(
+            "UPDATE company_valuations SET nav = ?, price_per_share = ?, last_updated = ?, version = version + 1, "
+            "dirty = CASE WHEN dirty = ? THEN 0 ELSE dirty END WHERE company_id = ?",
+            updates
+        )
+        write_ticks(cur, [(share_series(company_id), price) for _, price, _, _, company_id in updates], now)
+
+    await db.transaction(store)
+    return len(updates)
+
+
+async def materialized_values(db, company_names=None):
+    """Read NAVs from company_valuations; returns {name: nav} with 0 for unknown names.
+
+    Values lag writes by at most one refresh. Companies that have never been
+    valued (created since the last refresh) are computed live.
+    """
+    if company_names is None:
+        rows = await db.fetchall(
+            "SELECT c.name, v.nav, v.version FROM companies c JOIN company_valuations v ON v.company_id = c.company_id"
+        )
+    else:
+        company_names = list(dict.fromkeys(company_names))
+        if not company_names:
+            return {}
+        rows = await db.fetchall(
+            "SELECT c.name, v.nav, v.version FROM companies c JOIN company_valuations v ON v.company_id = c.company_id "
+            "WHERE c.name IN (SELECT value FROM json_each(?))",
+            (json.dumps(company_names),)
+        )
+    values = {name: nav for name, nav, version in rows if version > 0}
+    missing = [name for name, _, version in rows if version == 0]
+    if missing:
+        values.update(await company_values(db, missing))
+    if company_names is None:
+        return values
+    return {name: values.get(name, 0) for name in company_names}